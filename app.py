@@ -1,19 +1,19 @@
 import os
+import shutil
 from flask import Flask, render_template, request, jsonify, redirect, url_for, flash
-from collections import defaultdict
 from datetime import datetime
 from flask_bcrypt import Bcrypt
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
-from insights import generate_insights
-from nlp.analysis import analyze_text
-from nlp.task_extractor import extract_tasks
-from nlp.scorer import custom_productivity_score
+from insights import generate_insights, INSIGHT_PERIODS
+from search import search_entries, SEARCH_PAGE_SIZE
+from related import related_entries
+from nlp.executor import nlp_executor, NLPBusyError, NLPTimeoutError
+from nlp.cache import nlp_cache
 from flask_mail import Mail, Message
-from nlp.summarizer import generate_rule_based_summary
-from database.db import get_entries_for_period
-import threading
+from database.summary_cache import summary_cache, SUMMARY_PERIODS
 from werkzeug.utils import secure_filename
-from nlp.media_analyzer import transcribe_audio_local
+from nlp.transcriber import transcriber
+from jobs import job_workers, JobFailed
 from prompts import generate_prompt
 import subprocess
 
@@ -30,13 +30,12 @@ app.config['MAIL_DEFAULT_SENDER'] = os.getenv('MAIL_USERNAME')
 
 mail = Mail(app) 
 from database.db import (
-    init_db, add_entry, add_task, update_task_status,
-    get_all_entries_sorted_asc, get_pending_tasks, 
-    get_tasks_with_entry_info, get_chart_data, get_tasks_for_entry_ids,
-    execute_aggregation, get_entries_and_tasks_for_date,
-    delete_entries_and_tasks
+    add_entry_with_tasks, get_entry_for_job, update_task_status,
+    get_rollup_chart_data, get_entries_and_tasks_for_date,
+    delete_entries_and_tasks, get_nlp_cache_collection, connection,
+    get_dashboard_data, get_entry_history
 )
-from models import User
+from models import User, user_cache
 
 app.config['SECRET_KEY'] = 'a_very_secret_and_long_random_string_for_security'
 
@@ -44,12 +43,23 @@ bcrypt = Bcrypt(app)
 login_manager = LoginManager(app)
 @login_manager.user_loader
 def load_user(user_id):
-    """Required by Flask-Login to load the current user from the database."""
-    return User.find_by_id(user_id)
+    """Required by Flask-Login to load the current user (cached per process, see models.UserCache)."""
+    return User.get_cached(user_id)
 login_manager.login_view = 'login' 
 login_manager.login_message_category = 'info'
 
-init_db() 
+# No init_db() here: each process connects on its first query (see database/connection.py),
+# which keeps the app safe to import in a gunicorn --preload master before it forks.
+
+# Share analysis results across workers when the persistent NLP cache tier is enabled
+if os.getenv('NLP_CACHE_PERSIST', 'False').lower() in ['true', '1', 't']:
+    nlp_cache.attach_collection(collection_factory=get_nlp_cache_collection)
+
+# Refresh summaries in the background: nightly for all active users, and shortly after each write.
+# Threads do not survive a fork, so under gunicorn --preload use cron with --once instead.
+if os.getenv('PRECOMPUTE_SCHEDULER', 'False').lower() in ['true', '1', 't']:
+    from database.precompute import PrecomputeScheduler
+    PrecomputeScheduler().start()
 
 @app.route("/login", methods=['GET', 'POST'])
 def login():
@@ -83,6 +93,7 @@ def register():
 @app.route("/logout")
 @login_required
 def logout():
+    user_cache.invalidate(current_user.get_id())
     logout_user()
     return redirect(url_for('login'))
 
@@ -92,50 +103,7 @@ def logout():
 @login_required
 def index():
     user_id = current_user.get_id()
-    raw_entries = get_all_entries_sorted_asc(user_id)
-    pending_tasks = get_pending_tasks(user_id)
-    recent_tasks = get_tasks_with_entry_info(user_id, completed_status=None, limit=5)
-    completed_tasks = get_tasks_with_entry_info(user_id, completed_status=True, limit=5)
-    chart_data = get_chart_data(user_id, limit=30)
-    
-    grouped = defaultdict(list)
-    for entry in raw_entries:
-        grouped[entry['date']].append(entry)
-
-    entries_by_day = []
-    mood_score_map = {"negative": -1, "neutral": 0, "positive": 1}
-    all_entry_ids = [entry['_id'] for entry in raw_entries]
-    all_tasks = get_tasks_for_entry_ids(user_id, all_entry_ids)
-    
-    tasks_by_entry_id = defaultdict(list)
-    for task in all_tasks:
-        tasks_by_entry_id[task['entry_id']].append(task['task_text'])
-
-    for date, items in grouped.items():
-        moods = [e['mood'] for e in items]
-        prod_scores = [e['productivity'] for e in items]
-        mood_numeric = [mood_score_map.get(m, 0) for m in moods]
-        avg_mood_score = sum(mood_numeric) / len(mood_numeric) if mood_numeric else 0
-        avg_prod_score = sum(prod_scores) / len(prod_scores) if prod_scores else 0
-        numbered_entries = list(enumerate(items, start=1))
-        tasks_for_day = [{"entry_id": entry['_id'], "tasks": tasks_by_entry_id.get(entry['_id'], [])} for entry in items]
-        entries_by_day.append({
-            "date": date, "avg_mood_score": round(avg_mood_score, 2),
-            "avg_productivity": round(avg_prod_score, 2), "entries": numbered_entries,
-            "tasks_for_day": tasks_for_day
-        })
-    entries_by_day.sort(key=lambda x: x["date"], reverse=True)
-
-    weekly_mood = {}  
-    for date, items in grouped.items():
-        moods = [e['mood'] for e in items]
-        mood_numeric = [mood_score_map.get(m, 0) for m in moods]
-        if mood_numeric: weekly_mood[date] = round(sum(mood_numeric) / len(mood_numeric), 2)
-
-    return render_template("index.html", entries_by_day=entries_by_day,
-                           pending_tasks=pending_tasks, recent_tasks=recent_tasks,
-                           completed_tasks=completed_tasks, chart_data=chart_data,
-                           weekly_mood=weekly_mood)
+    return render_template("index.html", **get_dashboard_data(user_id))
 
 @app.route("/submit_journal_ajax", methods=["POST"])
 @login_required
@@ -143,15 +111,17 @@ def submit_journal_ajax():
     user_id = current_user.get_id()
     data = request.get_json()
     text = data["journal"]
-    analysis = analyze_text(text)
-    prod_score = custom_productivity_score(text)
+    try:
+        result = nlp_executor.analyze(text, inline=app.debug or None)
+    except NLPBusyError as e:
+        return jsonify({"error": str(e)}), 503
+    except NLPTimeoutError as e:
+        return jsonify({"error": str(e)}), 504
+    prod_score = result['productivity']
     
-    entry_id = add_entry(user_id, datetime.now().strftime('%Y-%m-%d'), text, analysis['mood'], prod_score)
-    tasks = extract_tasks(text)
-    if entry_id and tasks:
-        for task in tasks:
-            add_task(user_id, entry_id, task)
-    return jsonify({"mood": analysis['mood'], "productivity": prod_score, "date": datetime.now().strftime('%Y-%m-%d'), "tasks": tasks})
+    tasks = result['tasks']
+    add_entry_with_tasks(user_id, datetime.now().strftime('%Y-%m-%d'), text, result['mood'], prod_score, tasks)
+    return jsonify({"mood": result['mood'], "productivity": prod_score, "date": datetime.now().strftime('%Y-%m-%d'), "tasks": tasks})
 
 @app.route('/complete_task/<string:task_id>', methods=['POST'])
 @login_required
@@ -168,36 +138,48 @@ def complete_task(task_id):
 @login_required
 def api_chart_data(period):
     user_id = current_user.get_id()
-     
-     
-    group_id, limit = None, 0
-    if period == "daily":
-        group_id, limit = "$date", 30
-    elif period == "weekly":
-        group_id, limit = {"$dateToString": {"format": "%Y-W%U", "date": {"$toDate": "$date"}}}, 12
-    elif period == "monthly":
-        group_id, limit = {"$substr": ["$date", 0, 7]}, 12
-    else:
+    if period not in ("daily", "weekly", "monthly"):
         return jsonify({"error": "Invalid period"}), 400
-    
-    pipeline = [
-        {"$addFields": {"mood_numeric": {"$switch": {"branches": [{"case": {"$eq": ["$mood", "positive"]}, "then": 1}, {"case": {"$eq": ["$mood", "negative"]}, "then": -1}], "default": 0}}}},
-        {"$group": {"_id": group_id, "avg_productivity": {"$avg": "$productivity"}, "avg_mood": {"$avg": "$mood_numeric"}}},
-        {"$sort": {"_id": -1}}, {"$limit": limit}, {"$sort": {"_id": 1}},
-        {"$project": {"label": "$_id", "productivity": {"$ifNull": ["$avg_productivity", 0]}, "mood": {"$ifNull": ["$avg_mood", 0]}, "_id": 0}}
-    ]
-    results = execute_aggregation(user_id, 'entries', pipeline)
-    for row in results:
-        row["productivity"] = round(row["productivity"], 2)
-        row["mood"] = round(row["mood"], 2)
-    return jsonify(results)
+    return jsonify(get_rollup_chart_data(user_id, period))
+
+@app.route("/api/history")
+@login_required
+def api_history():
+    user_id = current_user.get_id()
+    try:
+        return jsonify(get_entry_history(user_id, request.args.get("cursor")))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route("/api/search")
+@login_required
+def api_search():
+    """Ranked full-text search over the user's entries (see search.py)."""
+    user_id = current_user.get_id()
+    try:
+        return jsonify(search_entries(
+            user_id, request.args.get("q", ""),
+            cursor=request.args.get("cursor"),
+            date_from=request.args.get("from"),
+            date_to=request.args.get("to"),
+            limit=request.args.get("limit", SEARCH_PAGE_SIZE),
+        ))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route("/api/db_stats")
+@login_required
+def api_db_stats():
+    """Connection state and pool checkout wait times for this worker process."""
+    return jsonify(connection.stats())
 
 @app.route('/day_view/<date>')
 @login_required
 def day_view(date):
     user_id = current_user.get_id()
     entries = get_entries_and_tasks_for_date(user_id, date)
-    return render_template('day_view.html', date=date, entries=entries)
+    related = related_entries(user_id, [entry["_id"] for entry in entries])
+    return render_template('day_view.html', date=date, entries=entries, related=related)
 
 @app.route('/delete_entries', methods=['POST'])
 @login_required
@@ -251,55 +233,97 @@ def send_report():
 @app.route("/api/get_summary/<string:period>")
 @login_required
 def get_summary(period):
-    days = 0
-    if period == 'day':
-        days = 1
-    elif period == 'week':
-        days = 7
-    else:
+    if period not in SUMMARY_PERIODS:
         return jsonify({"error": "Invalid period specified."}), 400
 
     user_id = current_user.get_id()
-     
-    entries = get_entries_for_period(user_id, days=days)
 
-    summary_data = generate_rule_based_summary(entries)
-    
+    summary_data, cache_status = summary_cache.get(user_id, period)
+
     if "error" in summary_data:
         return jsonify(summary_data), 500
-        
-    return jsonify(summary_data)
 
-# This is the helper function that will run in the background
-def run_audio_analysis_background(file_path, user_id):
-    """A wrapper function to run the full audio analysis pipeline in a background thread."""
-    print(f"BACKGROUND THREAD: Starting audio analysis for {file_path}")
-    
-    # 1. Transcribe the audio to text
-    transcribed_text = transcribe_audio_local(file_path)
-    
-    if transcribed_text:
-        # 2. Run your EXISTING NLP analysis on the transcribed text
-        analysis = analyze_text(transcribed_text)
-        tasks = extract_tasks(transcribed_text)
-        
-        # 3. Create a new journal entry in the database with the results
-        # This makes the audio entry appear just like a written one
-        add_entry(
+    response = jsonify(summary_data)
+    response.headers['X-Summary-Cache'] = cache_status
+    return response
+
+def audio_job_result(entry):
+    return {
+        "entry_id": str(entry["_id"]),
+        "mood": entry['mood'],
+        "productivity": entry['productivity'],
+        "tasks": entry['tasks'],
+    }
+
+def run_audio_analysis(job, progress):
+    """Job handler for "analyze_audio" (see jobs.py): transcribe, analyze and save the recording as an entry."""
+    user_id = job["payload"]["user_id"]
+    print(f"JOB: Starting audio analysis for job {job['_id']}")
+    # An earlier attempt may have saved the entry and then lost the job before marking it done
+    saved = get_entry_for_job(user_id, job["_id"])
+    if saved is not None:
+        print(f"JOB: Entry for job {job['_id']} was already saved by an earlier attempt.")
+        return audio_job_result(saved)
+    audio = job_workers.open_input(job["_id"])
+    if audio is None:
+        raise JobFailed("The uploaded audio file is no longer available.")
+
+    # 1. Transcribe the audio to text (in the Whisper worker process, see nlp/transcriber.py)
+    progress("transcribing", 10)
+    # Whisper reads a file, so the upload is copied to this worker's disk for the attempt
+    temp_dir = os.path.join(app.root_path, 'temp_uploads')
+    os.makedirs(temp_dir, exist_ok=True)
+    file_path = os.path.join(temp_dir, f"{job['_id']}_{job['attempts']}.wav")
+    with audio, open(file_path, 'wb') as f:
+        shutil.copyfileobj(audio, f)
+    # Other transcription errors are raised to the job queue and retried
+    try:
+        transcribed_text = transcriber.transcribe(file_path, inline=app.debug or None)
+    except ValueError as e:
+        raise JobFailed(str(e))
+    finally:
+        os.remove(file_path)
+    if not transcribed_text:
+        raise JobFailed("No text could be transcribed from the recording.")
+
+    # 2. Run the NLP pipeline on the transcribed text
+    progress("analyzing", 60)
+    result = nlp_executor.analyze(transcribed_text, queue_timeout=None, inline=app.debug or None)
+    tasks = result['tasks']
+
+    # 3. Create a new journal entry and its tasks in the database with the results
+    # This makes the audio entry appear just like a written one. progress() raises JobLeaseLost
+    # here if another attempt took the job over; the entry carries the job id, which the
+    # database keeps unique, so a racing attempt cannot save it twice either
+    progress("saving", 90)
+    try:
+        entry_id = add_entry_with_tasks(
             user_id,
             datetime.now().strftime('%Y-%m-%d'),
             f"(Audio Journal Entry)\n\n{transcribed_text}", # Mark it as an audio entry
-            analysis['mood'],
-            custom_productivity_score(transcribed_text) # Use your existing scorer
+            result['mood'],
+            result['productivity'],
+            tasks,
+            job_id=job["_id"]
         )
-        
-        # Optional: You could add the extracted tasks to the database as well.
-        print(f"--- BACKGROUND ANALYSIS COMPLETE (for User {user_id}) ---")
-        print(f"  > Mood: {analysis['mood']}, Tasks: {len(tasks)}")
-    else:
-        print(f"--- BACKGROUND ANALYSIS FAILED: No text transcribed. ---")
+    except Exception:
+        saved = get_entry_for_job(user_id, job["_id"])
+        if saved is None:
+            raise
+        return audio_job_result(saved)
+
+    print(f"--- AUDIO ANALYSIS COMPLETE (for User {user_id}) ---")
+    print(f"  > Mood: {result['mood']}, Tasks: {len(tasks)}, Timings (ms): {result.timings}")
+    return audio_job_result({"_id": entry_id, "mood": result['mood'], "productivity": result['productivity'],
+                             "tasks": tasks})
+
+job_workers.register("analyze_audio", run_audio_analysis)
 
-    os.remove(file_path)
+@app.before_request
+def start_job_workers():
+    # Only with JOB_WORKERS > 0 (the default for JOB_QUEUE=memory); started per process on first use,
+    # so they also run in each forked gunicorn worker. Otherwise `python -m jobs` runs the jobs
+    job_workers.ensure_started()
 
 @app.route("/api/analyze_audio", methods=['POST'])
 @login_required
@@ -315,28 +339,29 @@ def analyze_audio():
     if not file.filename.lower().endswith(".wav"):
         return jsonify({"error": "Only WAV files are supported"}), 400
 
-    filename = secure_filename(file.filename)
-    temp_dir = os.path.join(app.root_path, 'temp_uploads')
-    os.makedirs(temp_dir, exist_ok=True)
-
-    temp_file_path = os.path.abspath(os.path.join(temp_dir, filename))
-    file.save(temp_file_path)
-
-    print(f"File saved at: {temp_file_path}, exists? {os.path.exists(temp_file_path)}")
-
-    if not app.debug or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
-        import threading
-        threading.Thread(
-            target=run_audio_analysis_background,
-            args=(temp_file_path, current_user.get_id()),
-            daemon=True
-        ).start()
-    else:
-        run_audio_analysis_background(temp_file_path, current_user.get_id())
-
+    # The upload is stored with the job (GridFS with the Mongo queue), so any worker process can read it
+    job_id = job_workers.enqueue(
+        "analyze_audio",
+        {"filename": secure_filename(file.filename), "user_id": current_user.get_id()},
+        current_user.get_id(),
+        input_file=file.stream,
+    )
+    print(f"Audio upload {file.filename!r} queued as job {job_id}")
     return jsonify({
-        "message": "Audio file has been successfully analyzed and saved as a new journal entry."
-    }), 200
+        "message": "Audio file received. It will be analyzed and saved as a new journal entry.",
+        "job_id": job_id,
+        "state": "queued",
+        "status_url": url_for('api_job_status', job_id=job_id),
+    }), 202
+
+@app.route("/api/jobs/<string:job_id>")
+@login_required
+def api_job_status(job_id):
+    """State, stage, progress and (once done) result of one of the current user's jobs."""
+    job = job_workers.get(job_id, user_id=current_user.get_id())
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
 
 
 # Route to get a journal prompt
@@ -361,13 +386,14 @@ def insights_redirect():
 
 
 @app.route('/insights/<period>')
+@login_required
 def insights_page(period):
     # Check for valid periods to be safe
-    if period not in ['weekly', 'monthly', 'all']:
+    if period not in INSIGHT_PERIODS:
         return "Invalid period selected.", 404
 
-    # Pass the period from the URL to our upgraded function
-    insights_list = generate_insights(period=period)
+    # Topics from the user's own entries only (see insights.py)
+    insights_list = generate_insights(current_user.id, period=period)
     
     # Also pass the period to the template so we can display it in the title
     return render_template('insights.html', insights=insights_list, period=period)
@@ -379,5 +405,8 @@ def record_audio():
     return "Recording started!"
 
 if __name__ == "__main__":
+    # The single-process dev server runs its jobs itself unless JOB_WORKERS says otherwise
+    if "JOB_WORKERS" not in os.environ:
+        job_workers.workers = max(job_workers.workers, 1)
     app.run(debug=True, use_reloader=False)
 
@@ -0,0 +1,45 @@
+"""
+Per-entry latency of each mood analyzer backend on the Emotion test set.
+
+Usage (from the project root):
+    python -m benchmarks.bench_analyzers [--limit N]
+"""
+import argparse
+import csv
+import time
+
+from nlp.analysis import ANALYZERS, analyze_texts
+
+DATASET = "Datasets/Emotion/test_converted.csv"
+
+
+def load_dataset(path=DATASET, limit=None):
+    with open(path, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    if limit:
+        rows = rows[:limit]
+    return [r["text"] for r in rows], [r["mood"] for r in rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--limit", type=int, default=None, help="Only use the first N entries")
+    args = parser.parse_args()
+
+    texts, labels = load_dataset(limit=args.limit)
+    print(f"{len(texts)} entries from {DATASET}\n")
+    print(f"{'backend':<12}{'us/entry':>12}{'entries/s':>12}{'accuracy':>10}")
+
+    for name in sorted(ANALYZERS):
+        analyze_texts(texts[:10], backend=name)  # warm up lexicons and models
+        start = time.perf_counter()
+        results = analyze_texts(texts, backend=name)
+        moods = [r['mood'] for r in results]
+        elapsed = time.perf_counter() - start
+
+        accuracy = sum(m == y for m, y in zip(moods, labels)) / len(labels)
+        print(f"{name:<12}{elapsed / len(texts) * 1e6:>12.1f}{len(texts) / elapsed:>12.0f}{accuracy:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
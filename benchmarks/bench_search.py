@@ -0,0 +1,104 @@
+"""
+Query latency of the search index (search.py) on a synthetic journal built from the Emotion training set.
+
+Each synthetic entry joins a few random sentences from the dataset and gets a
+date in the last --days days. The index is built in memory (no database), then
+queried with random one-, two- and three-word queries drawn from the corpus,
+with and without a date range, and for the first and second page.
+
+Usage (from the project root):
+    python -m benchmarks.bench_search [--entries N] [--queries N]
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from bson.objectid import ObjectId
+
+from search import SearchIndex, highlight_spans, query_terms, tokenize
+
+DATASET = "Datasets/Emotion/train.txt"
+MOODS = {"joy": "positive", "love": "positive", "surprise": "neutral",
+         "sadness": "negative", "anger": "negative", "fear": "negative"}
+
+
+def load_sentences(path=DATASET):
+    sentences = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            text, _, label = line.strip().rpartition(";")
+            if text:
+                sentences.append((text, MOODS.get(label, "neutral")))
+    return sentences
+
+
+def build_corpus(sentences, count, days, rng):
+    today = datetime.now()
+    entries = []
+    for _ in range(count):
+        picked = rng.sample(sentences, rng.randint(2, 4))
+        entries.append({
+            "_id": str(ObjectId()),
+            "date": (today - timedelta(days=rng.randrange(days))).strftime('%Y-%m-%d'),
+            "text": ". ".join(text for text, _ in picked),
+            "mood": picked[0][1],
+        })
+    return entries
+
+
+def percentile(samples, p):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(p * len(samples)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--entries", type=int, default=20000, help="Entries in the synthetic journal")
+    parser.add_argument("--days", type=int, default=5 * 365, help="Spread entry dates over this many days")
+    parser.add_argument("--queries", type=int, default=500, help="Queries per scenario")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    entries = build_corpus(load_sentences(), args.entries, args.days, rng)
+    texts = {entry["_id"]: entry["text"] for entry in entries}
+    vocabulary = sorted({token for entry in entries[:2000] for token in tokenize(entry["text"])})
+    print(f"{len(entries)} entries over {args.days} days, {len(vocabulary)} query words from {DATASET}\n")
+
+    index = SearchIndex()
+    start = time.perf_counter()
+    index.add(entries)
+    print(f"build: {(time.perf_counter() - start) * 1000:.0f} ms, {len(index.postings)} terms\n")
+
+    month_ago = (datetime.now() - timedelta(days=30)).toordinal()
+    year_ago = (datetime.now() - timedelta(days=365)).toordinal()
+    scenarios = [
+        ("1 word", 1, None),
+        ("2 words", 2, None),
+        ("3 words", 3, None),
+        ("2 words, last year", 2, year_ago),
+        ("2 words, last month", 2, month_ago),
+    ]
+    print(f"{'scenario':<22}{'p50 ms':>9}{'p95 ms':>9}{'max ms':>9}{'page 2 p50':>12}{'hits/page':>11}")
+    for name, words, date_from in scenarios:
+        first, second, hits = [], [], 0
+        for _ in range(args.queries):
+            terms = query_terms(" ".join(rng.sample(vocabulary, words)))
+            t0 = time.perf_counter()
+            ranked, more = index.search(terms, date_from=date_from)
+            for _, entry_id in ranked:
+                highlight_spans(texts[entry_id], terms)
+            first.append((time.perf_counter() - t0) * 1000)
+            hits += len(ranked)
+            if more:
+                t0 = time.perf_counter()
+                index.search(terms, date_from=date_from, after=ranked[-1])
+                second.append((time.perf_counter() - t0) * 1000)
+        page_two = f"{percentile(second, 0.5):.2f}" if second else "-"
+        print(f"{name:<22}{percentile(first, 0.5):>9.2f}{percentile(first, 0.95):>9.2f}{max(first):>9.2f}"
+              f"{page_two:>12}{hits / args.queries:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
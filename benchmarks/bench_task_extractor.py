@@ -0,0 +1,66 @@
+"""
+Throughput of the task extractor against the previous two-pattern implementation,
+on the Emotion corpus (per entry, and as one long transcript).
+
+Usage (from the project root):
+    python -m benchmarks.bench_task_extractor [--repeat N]
+"""
+import argparse
+import re
+import time
+
+from nlp.task_extractor import extract_tasks, iter_tasks
+
+DATASET = "Datasets/Emotion/train.txt"
+
+
+def legacy_extract_tasks(text):
+    """The extractor as it was before patterns were precompiled and merged."""
+    task_patterns = [
+        r"\b(?:need to|have to|must|should|want to|planning to|plan to|aim to|try to)\s+(.*?)(?:[.!\n]|$)",
+        r"\b(?:to[- ]do|todo)[^\w]*(.*?)(?:[.!\n]|$)"
+    ]
+    tasks = []
+    for pattern in task_patterns:
+        matches = re.findall(pattern, text, re.IGNORECASE)
+        for match in matches:
+            task = match.strip().rstrip('.!')
+            if task:
+                tasks.append(task)
+    return tasks
+
+
+def load_corpus(path=DATASET):
+    with open(path, encoding="utf-8") as f:
+        return [line.rsplit(";", 1)[0] for line in f if line.strip()]
+
+
+def timed(label, func, texts, repeat):
+    start = time.perf_counter()
+    found = 0
+    for _ in range(repeat):
+        for text in texts:
+            found += sum(1 for _ in func(text))
+    elapsed = time.perf_counter() - start
+    chars = sum(len(t) for t in texts) * repeat
+    print(f"{label:<28}{len(texts) * repeat / elapsed:>14.0f}{chars / elapsed / 1e6:>10.1f}{found // repeat:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    entries = load_corpus()
+    transcript = [".\n".join(entries)]
+    print(f"{len(entries)} entries, {sum(len(e) for e in entries) / 1e6:.1f}M chars from {DATASET}\n")
+    print(f"{'implementation':<28}{'texts/s':>14}{'MB/s':>10}{'tasks':>8}")
+
+    timed("legacy (per entry)", legacy_extract_tasks, entries, args.repeat)
+    timed("extract_tasks (per entry)", extract_tasks.uncached, entries, args.repeat)
+    timed("legacy (transcript)", legacy_extract_tasks, transcript, args.repeat)
+    timed("iter_tasks (transcript)", iter_tasks, transcript, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""
+Lazily connected, fork-safe MongoDB client shared by everything in database/.
+
+Nothing connects at import time. The first get_db() call in a process creates
+the MongoClient, so with gunicorn --preload each worker builds its own client
+after fork instead of inheriting the master's sockets and monitor threads.
+After a failed connection, get_db() returns None until MONGO_RETRY_INTERVAL
+seconds have passed and then tries again, instead of giving up for good.
+
+Pool settings (all optional, driver defaults otherwise):
+    MONGO_MAX_POOL_SIZE, MONGO_MIN_POOL_SIZE, MONGO_MAX_IDLE_TIME_MS,
+    MONGO_SERVER_SELECTION_TIMEOUT_MS, MONGO_CONNECT_TIMEOUT_MS,
+    MONGO_WAIT_QUEUE_TIMEOUT_MS, MONGO_RETRY_INTERVAL
+"""
+import os
+import time
+import threading
+from collections import deque
+from pymongo import MongoClient
+from pymongo.monitoring import ConnectionPoolListener
+from pymongo.server_api import ServerApi
+from dotenv import load_dotenv
+from database.indexes import ensure_indexes
+
+load_dotenv()
+
+DATABASE_NAME = "journal_db"
+
+# Environment variable -> MongoClient keyword
+POOL_OPTIONS = {
+    "MONGO_MAX_POOL_SIZE": "maxPoolSize",
+    "MONGO_MIN_POOL_SIZE": "minPoolSize",
+    "MONGO_MAX_IDLE_TIME_MS": "maxIdleTimeMS",
+    "MONGO_SERVER_SELECTION_TIMEOUT_MS": "serverSelectionTimeoutMS",
+    "MONGO_CONNECT_TIMEOUT_MS": "connectTimeoutMS",
+    "MONGO_WAIT_QUEUE_TIMEOUT_MS": "waitQueueTimeoutMS",
+}
+
+
+def pool_options():
+    """MongoClient keyword arguments for every pool setting present in the environment."""
+    return {option: int(os.environ[name]) for name, option in POOL_OPTIONS.items() if os.getenv(name)}
+
+
+class CheckoutWaitListener(ConnectionPoolListener):
+    """
+    Measures how long operations wait to check a connection out of the pool.
+    Checkouts happen on the calling thread, so the start time is kept per thread.
+    """
+
+    def __init__(self, window=1024):
+        self._local = threading.local()
+        self._recent = deque(maxlen=window)
+        self.checkouts = 0
+        self.failures = 0
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+
+    def _finish(self):
+        started = getattr(self._local, "started", None)
+        self._local.started = None
+        if started is None:
+            return None
+        return (time.perf_counter() - started) * 1000
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        wait_ms = self._finish()
+        if wait_ms is None:
+            return
+        self.checkouts += 1
+        self.total_wait_ms += wait_ms
+        self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+        self._recent.append(wait_ms)
+
+    def connection_check_out_failed(self, event):
+        self._finish()
+        self.failures += 1
+
+    # The remaining pool events are not needed for wait times
+    def pool_created(self, event): pass
+    def pool_ready(self, event): pass
+    def pool_cleared(self, event): pass
+    def pool_closed(self, event): pass
+    def connection_created(self, event): pass
+    def connection_ready(self, event): pass
+    def connection_closed(self, event): pass
+    def connection_checked_in(self, event): pass
+
+    def stats(self):
+        recent = sorted(self._recent)
+        return {
+            "checkouts": self.checkouts,
+            "failures": self.failures,
+            "avg_wait_ms": round(self.total_wait_ms / self.checkouts, 3) if self.checkouts else 0.0,
+            "p95_wait_ms": round(recent[min(len(recent) - 1, int(len(recent) * 0.95))], 3) if recent else 0.0,
+            "max_wait_ms": round(self.max_wait_ms, 3),
+        }
+
+
+class MongoConnection:
+    """Owns this process's MongoClient: created on first use, rebuilt after fork or a failed connect."""
+
+    def __init__(self, url=None, database_name=DATABASE_NAME, retry_interval=None, on_connect=None):
+        self.url = url
+        self.database_name = database_name
+        self.retry_interval = float(retry_interval if retry_interval is not None
+                                    else os.getenv("MONGO_RETRY_INTERVAL", 5))
+        self.on_connect = on_connect
+        self.client = None
+        self.db = None
+        self.listener = None
+        self._pid = None
+        self._failed_at = None
+        self._lock = threading.Lock()
+
+    def get_db(self):
+        """This process's database handle, or None while MongoDB is unreachable."""
+        if self.db is not None and self._pid == os.getpid():
+            return self.db
+        with self._lock:
+            if self._pid != os.getpid():
+                # Inherited from the parent across fork(): never reuse or close it here
+                self.client = self.db = None
+                self._failed_at = None
+            if self.db is None and (self._failed_at is None
+                                    or time.monotonic() - self._failed_at >= self.retry_interval):
+                self._connect()
+            return self.db
+
+    def _connect(self):
+        self._pid = os.getpid()
+        url = self.url or os.getenv("MONGO_CLUSTER_URL")
+        try:
+            if not url:
+                raise ValueError("Missing MongoDB credentials in your .env file.")
+            listener = CheckoutWaitListener()
+            client = MongoClient(url, server_api=ServerApi('1'), event_listeners=[listener], **pool_options())
+            client.admin.command('ping')
+            print(f"Pinged your deployment. You successfully connected to MongoDB! (pid {self._pid})")
+            self.client, self.listener = client, listener
+            self.db = client[self.database_name]
+            self._failed_at = None
+            if self.on_connect:
+                self.on_connect(self.db)
+        except Exception as e:
+            print(f"Error connecting to MongoDB: {e}")
+            self.client = self.db = None
+            self._failed_at = time.monotonic()
+
+    def use(self, client, database_name=None):
+        """Points this process at an existing client (scripts and tests)."""
+        with self._lock:
+            self._pid = os.getpid()
+            self.client = client
+            self.db = client[database_name or self.database_name]
+            self._failed_at = None
+
+    def close(self):
+        with self._lock:
+            if self.client is not None and self._pid == os.getpid():
+                self.client.close()
+            self.client = self.db = None
+
+    def stats(self):
+        return {
+            "connected": self.db is not None and self._pid == os.getpid(),
+            "pid": self._pid,
+            "pool_options": pool_options(),
+            "checkout": self.listener.stats() if self.listener else None,
+        }
+
+
+# One lazily created client per process, shared by the Mongo storage backend and the maintenance scripts
+connection = MongoConnection(on_connect=ensure_indexes)
+
+
+def get_db():
+    """The database handle for this process, connecting on first use. None while MongoDB is unreachable."""
+    return connection.get_db()
@@ -0,0 +1,95 @@
+from bson.objectid import ObjectId
+from database.connection import get_db
+
+from database.history import HISTORY_MAX_ENTRIES, HISTORY_PROJECTION, build_history_page
+
+
+def _facet_lookup(collection, pipeline):
+    # Each facet runs one uncorrelated $lookup against the single matched user document
+    return [
+        {"$lookup": {"from": collection, "pipeline": pipeline, "as": "rows"}},
+        {"$unwind": "$rows"},
+        {"$replaceRoot": {"newRoot": "$rows"}},
+    ]
+
+
+def _recent_tasks_pipeline(user_obj_id, completed_status, limit):
+    match = {"user_id": user_obj_id}
+    if completed_status is not None:
+        match["completed"] = completed_status
+    return [
+        {"$match": match},
+        {"$sort": {"_id": -1}},
+        {"$limit": limit},
+        {"$lookup": {"from": "entries", "localField": "entry_id", "foreignField": "_id", "as": "entry_info"}},
+        {"$unwind": "$entry_info"},
+        {"$project": {"_id": 0, "task_text": "$task_text", "date": "$entry_info.date"}}
+    ]
+
+
+def dashboard_pipeline(user_obj_id, task_limit=5, chart_limit=30):
+    """The single aggregation (run against `users`) that gathers everything the dashboard renders."""
+    return [
+        {"$match": {"_id": user_obj_id}},
+        {"$facet": {
+            # Newest page of the day list; older days come from /api/history
+            "history": _facet_lookup("entries", [
+                {"$match": {"user_id": user_obj_id}},
+                {"$sort": {"date": -1, "_id": -1}},
+                {"$limit": HISTORY_MAX_ENTRIES + 1},
+                {"$project": HISTORY_PROJECTION},
+            ]),
+            "pending_tasks": _facet_lookup("tasks", [
+                {"$match": {"user_id": user_obj_id, "completed": False}},
+                {"$project": {"task_text": 1}},
+            ]),
+            "recent_tasks": _facet_lookup("tasks", _recent_tasks_pipeline(user_obj_id, None, task_limit)),
+            "completed_tasks": _facet_lookup("tasks", _recent_tasks_pipeline(user_obj_id, True, task_limit)),
+            "chart_data": _facet_lookup("daily_rollups", [
+                {"$match": {"user_id": user_obj_id, "entries": {"$gt": 0}}},
+                {"$sort": {"date": -1}},
+                {"$limit": chart_limit},
+                {"$sort": {"date": 1}},
+                {"$project": {"_id": 0, "date": 1,
+                              "avg_productivity": {"$divide": ["$productivity_sum", "$entries"]},
+                              "avg_mood": {"$divide": ["$mood_sum", "$entries"]}}}
+            ]),
+        }},
+    ]
+
+
+def empty_dashboard_view():
+    return {"entries_by_day": [], "history_cursor": None, "pending_tasks": [], "recent_tasks": [],
+            "completed_tasks": [], "chart_data": [], "weekly_mood": {}}
+
+
+def build_dashboard_view(data):
+    """
+    Turns the raw dashboard data ({history, pending_tasks, recent_tasks,
+    completed_tasks, chart_data}, as returned by dashboard_pipeline) into the
+    template context for index.html. Shared by every storage backend.
+    """
+    view = empty_dashboard_view()
+    history = build_history_page(data["history"])
+    view["weekly_mood"] = {day["date"]: day["avg_mood_score"] for day in history["days"]}
+
+    view.update(
+        entries_by_day=history["days"],
+        history_cursor=history["next_cursor"],
+        pending_tasks=data["pending_tasks"],
+        recent_tasks=data["recent_tasks"],
+        completed_tasks=data["completed_tasks"],
+        chart_data=data["chart_data"],
+    )
+    return view
+
+
+def get_dashboard_data(user_id):
+    """Fetches everything the dashboard shows from MongoDB in one round trip."""
+    db = get_db()
+    if db is None: return empty_dashboard_view()
+
+    results = list(db.users.aggregate(dashboard_pipeline(ObjectId(user_id))))
+    if not results:
+        return empty_dashboard_view()
+    return build_dashboard_view(results[0])
@@ -1,185 +1,200 @@
+"""
+The app's data access functions. Each one forwards to the storage backend
+chosen by STORAGE_BACKEND: "mongo" (default, database/mongo_storage.py) or
+"sqlite" (database/sqlite_storage.py, file at SQLITE_PATH).
+"""
 import os
-from pymongo import MongoClient
-from pymongo.server_api import ServerApi
-from bson.objectid import ObjectId
+import threading
 from dotenv import load_dotenv
-from urllib.parse import quote_plus
-from datetime import datetime, timedelta
+from database.connection import connection, get_db
+from database.history import HISTORY_DAYS, HISTORY_MAX_ENTRIES, build_history_page
+from database import events
 
 
 # Load environment variables from your .env file
 load_dotenv()
 
-MONGO_CLUSTER_URL = os.getenv("MONGO_CLUSTER_URL")
-db = None
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "mongo").lower()
+
+_store = None
+_store_lock = threading.Lock()
+
+def create_store(backend=None):
+    """Builds the storage backend named by `backend` (or STORAGE_BACKEND)."""
+    backend = (backend or STORAGE_BACKEND).lower()
+    if backend == "mongo":
+        from database.mongo_storage import MongoStorage
+        return MongoStorage()
+    if backend == "sqlite":
+        from database.sqlite_storage import SQLiteStorage
+        return SQLiteStorage()
+    raise ValueError(f"Unknown STORAGE_BACKEND: {backend!r} (expected 'mongo' or 'sqlite')")
+
+def get_store():
+    """The process-wide storage backend, created on first use."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = create_store()
+    return _store
+
+def use_store(store):
+    """Replaces the storage backend (scripts, benchmarks and tests)."""
+    global _store
+    _store = store
 
 def init_db():
-    """Initializes the connection to the MongoDB Atlas database."""
-    global db
-    if db is None:
-        try:
-            if not MONGO_CLUSTER_URL:
-                raise ValueError("Missing MongoDB credentials in your .env file.")
-            
-            client = MongoClient(MONGO_CLUSTER_URL, server_api=ServerApi('1'))
-            client.admin.command('ping')
-            print("Pinged your deployment. You successfully connected to MongoDB!")
-            db = client.journal_db
-        except Exception as e:
-            print(f"Error connecting to MongoDB: {e}")
-            db = None
-
-# --- NEW: User Management Functions ---
+    """Connects eagerly (for scripts); the web app connects lazily on its first query instead."""
+    return get_store().init()
+
+def get_nlp_cache_collection():
+    """Returns the collection backing the persistent tier of the NLP result cache, if the backend has one."""
+    return get_store().get_nlp_cache_collection()
+
+# --- User Management Functions ---
 def find_user_by_email(email):
     """Finds a user document by their email."""
-    if db is None: return None
-    return db.users.find_one({"email": email})
+    return get_store().find_user_by_email(email)
 
 def find_user_by_id(user_id):
     """Finds a user document by their _id."""
-    if db is None: return None
-    try:
-        return db.users.find_one({"_id": ObjectId(user_id)})
-    except:
-        return None
+    return get_store().find_user_by_id(user_id)
 
 def create_user(email, password_hash):
-    """Inserts a new user document into the database."""
-    if db is None: return None
-    return db.users.insert_one({"email": email, "password": password_hash})
+    """Inserts a new user and returns their id."""
+    return get_store().create_user(email, password_hash)
+
+# --- All functions below require a user_id for security ---
 
-# --- UPDATED: All functions below now require a user_id for security ---
+def _entries_changed(user_id, dates):
+    if dates:
+        events.emit(events.ENTRIES_CHANGED, user_id=str(user_id), dates=list(dates))
+
+def _entry_added(user_id, entry_id, date, text, mood, productivity):
+    entry = {"_id": entry_id, "date": date, "text": text, "mood": mood, "productivity": productivity}
+    events.emit(events.ENTRY_ADDED, user_id=str(user_id), entry=entry)
+    _entries_changed(user_id, [date])
 
 def add_entry(user_id, date, text, mood, productivity):
-    if db is None: return None
-    entry_document = {
-        "user_id": ObjectId(user_id), 
-        "date": date, 
-        "text": text, 
-        "mood": mood, 
-        "productivity": productivity
-    }
-    result = db.entries.insert_one(entry_document)
-    return result.inserted_id
+    entry_id = get_store().add_entry(user_id, date, text, mood, productivity)
+    if entry_id is not None:
+        _entry_added(user_id, entry_id, date, text, mood, productivity)
+    return entry_id
 
 def add_task(user_id, entry_id, task_text):
-    if db is None: return None
-    task_document = {
-        "user_id": ObjectId(user_id),
-        "entry_id": entry_id, 
-        "task_text": task_text, 
-        "status": "pending", 
-        "completed": False
-    }
-    db.tasks.insert_one(task_document)
+    return get_store().add_task(user_id, entry_id, task_text)
+
+def add_entry_with_tasks(user_id, date, text, mood, productivity, tasks, job_id=None):
+    """Inserts an entry and all of its extracted tasks atomically. Returns the entry id."""
+    entry_id = get_store().add_entry_with_tasks(user_id, date, text, mood, productivity, tasks, job_id)
+    if entry_id is not None:
+        _entry_added(user_id, entry_id, date, text, mood, productivity)
+    return entry_id
+
+def get_entry_for_job(user_id, job_id):
+    """The entry a background job already saved (see app.run_audio_analysis), or None."""
+    return get_store().get_entry_for_job(user_id, job_id)
 
 def update_task_status(user_id, task_id, completed):
-    if db is None: return None
-    # Security: Ensure the user owns the task they are trying to update
-    db.tasks.update_one(
-        {"_id": ObjectId(task_id), "user_id": ObjectId(user_id)}, 
-        {"$set": {"completed": completed}}
-    )
+    date = get_store().update_task_status(user_id, task_id, completed)
+    if date:
+        _entries_changed(user_id, [date])
+    return date
 
 def get_all_entries_sorted_asc(user_id):
-    if db is None: return []
-    return list(db.entries.find({"user_id": ObjectId(user_id)}).sort("date", 1))
+    return get_store().get_all_entries_sorted_asc(user_id)
 
 def get_pending_tasks(user_id):
-    if db is None: return []
-    return list(db.tasks.find({"user_id": ObjectId(user_id), "completed": False}))
+    return get_store().get_pending_tasks(user_id)
 
 def get_tasks_with_entry_info(user_id, completed_status=None, limit=5):
-    if db is None: return []
-    pipeline = [{"$match": {"user_id": ObjectId(user_id)}}] # Filter by user first
-    if completed_status is not None:
-        pipeline.append({"$match": {"completed": completed_status}})
-    
-    pipeline.extend([
-        {"$sort": {"_id": -1}},
-        {"$limit": limit},
-        {"$lookup": {"from": "entries", "localField": "entry_id", "foreignField": "_id", "as": "entry_info"}},
-        {"$unwind": "$entry_info"},
-        {"$project": {"_id": 0, "task_text": "$task_text", "date": "$entry_info.date"}}
-    ])
-    return list(db.tasks.aggregate(pipeline))
+    return get_store().get_tasks_with_entry_info(user_id, completed_status, limit)
 
 def get_chart_data(user_id, limit=30):
-    if db is None: return []
-    pipeline = [
-        {"$match": {"user_id": ObjectId(user_id)}}, # Filter by user first
-        {"$sort": {"date": -1}},
-        {"$limit": limit},
-        {"$addFields": {"mood_numeric": {"$switch": {"branches": [{"case": {"$eq": ["$mood", "positive"]}, "then": 1}, {"case": {"$eq": ["$mood", "negative"]}, "then": -1}], "default": 0}}}},
-        {"$group": {"_id": "$date", "avg_productivity": {"$avg": "$productivity"}, "avg_mood": {"$avg": "$mood_numeric"}}},
-        {"$sort": {"_id": 1}},
-        {"$project": {"date": "$_id", "avg_productivity": "$avg_productivity", "avg_mood": "$avg_mood", "_id": 0}}
-    ]
-    return list(db.entries.aggregate(pipeline))
+    """Average mood and productivity for the user's last `limit` days with entries."""
+    return get_store().get_chart_data(user_id, limit)
+
+def get_rollup_chart_data(user_id, period):
+    """Chart rows ({label, productivity, mood}) for 'daily', 'weekly' or 'monthly'."""
+    return get_store().get_rollup_chart_data(user_id, period)
 
 def get_tasks_for_entry_ids(user_id, entry_ids):
-    if db is None or not entry_ids: return []
-    return list(db.tasks.find({"user_id": ObjectId(user_id), "entry_id": {"$in": entry_ids}}))
+    return get_store().get_tasks_for_entry_ids(user_id, entry_ids)
 
 def execute_aggregation(user_id, collection_name, pipeline):
-    if db is None: return []
-    # Prepend the user_id match to any pipeline for security
-    full_pipeline = [{"$match": {"user_id": ObjectId(user_id)}}] + pipeline
-    return list(db[collection_name].aggregate(full_pipeline))
+    """Runs a MongoDB aggregation pipeline over the user's documents (Mongo backend only)."""
+    return get_store().execute_aggregation(user_id, collection_name, pipeline)
 
 def get_entries_and_tasks_for_date(user_id, date):
-    if db is None: return []
-    pipeline = [
-        {"$match": {"user_id": ObjectId(user_id), "date": date}}, # Filter by user first
-        {"$lookup": {"from": "tasks", "localField": "_id", "foreignField": "entry_id", "as": "tasks"}},
-        {"$project": {"_id": 1, "journal_text": "$text", "mood": "$mood", "productivity": "$productivity", "tasks": "$tasks"}}
-    ]
-    return list(db.entries.aggregate(pipeline))
+    return get_store().get_entries_and_tasks_for_date(user_id, date)
 
 def delete_entries_and_tasks(user_id, entry_ids):
-    if db is None or not entry_ids: return
-
-    valid_object_ids = [ObjectId(eid) for eid in entry_ids if eid and len(eid) == 24]
-    if not valid_object_ids: return
-
-    # Security: Ensure the queries include the user_id
-    db.tasks.delete_many({"user_id": ObjectId(user_id), "entry_id": {"$in": valid_object_ids}})
-    db.entries.delete_many({"user_id": ObjectId(user_id), "_id": {"$in": valid_object_ids}})
+    dates = get_store().delete_entries_and_tasks(user_id, entry_ids)
+    if dates:
+        events.emit(events.ENTRIES_DELETED, user_id=str(user_id),
+                    entry_ids=[str(entry_id) for entry_id in entry_ids], dates=list(dates))
+    _entries_changed(user_id, dates)
+    return dates
 
 def get_entries_for_period(user_id, days=7):
     """Fetches all journal entries for a user within the last N days."""
-    if db is None: return []
-    start_date = datetime.now() - timedelta(days=days)
-    start_date_str = start_date.strftime('%Y-%m-%d')
-    
-    return list(db.entries.find({
-        "user_id": ObjectId(user_id),
-        "date": {"$gte": start_date_str}
-    }).sort("date", 1))
-
-def save_summary_to_cache(user_id, period, summary_data):
-    """Saves a generated summary to the 'summaries' collection with a timestamp."""
-    if db is None: return
-    db.summaries.update_one(
-        {"user_id": ObjectId(user_id), "period": period},
-        {"$set": {"summary": summary_data, "created_at": datetime.utcnow()}},
-        upsert=True
-    )
-
-def get_summary_from_cache(user_id, period, max_age_hours=6):
+    return get_store().get_entries_for_period(user_id, days)
+
+def get_summary_stats(user_id, days=7):
+    """Mood counts, productivity mean/pstdev and task counts for the last N days, computed by the database."""
+    return get_store().get_summary_stats(user_id, days)
+
+def get_recent_entries(user_id, limit=30):
+    """The user's newest entries, full text included."""
+    return get_store().get_recent_entries(user_id, limit)
+
+def get_entry_ids(user_id):
+    """Ids of all the user's entries, for reconciling in-process indexes with the database."""
+    return get_store().get_entry_ids(user_id)
+
+def get_entries_by_ids(user_id, entry_ids):
+    return get_store().get_entries_by_ids(user_id, entry_ids)
+
+def get_entry_history(user_id, cursor=None, days=HISTORY_DAYS, max_entries=HISTORY_MAX_ENTRIES):
+    """
+    One page of the user's day list, newest first: {"days": [...], "next_cursor": str or None}.
+    Raises ValueError for a malformed cursor.
+    """
+    rows = get_store().get_history_rows(user_id, cursor, max_entries + 1)
+    return build_history_page(rows, days, max_entries)
+
+def get_dashboard_data(user_id):
+    """Everything the dashboard renders, as the template context for index.html."""
+    return get_store().get_dashboard_data(user_id)
+
+def get_active_user_ids(since_date, after=None, limit=100):
+    """One batch of ids of users who wrote on or after since_date, in ascending order after `after`."""
+    return get_store().get_active_user_ids(since_date, after, limit)
+
+def get_prompt_stats(user_id, topics_only=False):
+    """The user's stored phrase statistics (see database/prompt_stats.py), or None if never built."""
+    return get_store().get_prompt_stats(user_id, topics_only)
+
+def save_prompt_stats(user_id, stats, expected_version=None):
+    """Stores phrase statistics; with expected_version, only if nobody saved since. Returns True if saved."""
+    return get_store().save_prompt_stats(user_id, stats, expected_version)
+
+def save_summary_to_cache(user_id, period, summary_data, as_of=None, expected_version=None):
+    """Saves a generated summary with a timestamp; with expected_version, only if not invalidated since. Returns True if saved."""
+    return get_store().save_summary_to_cache(user_id, period, summary_data, as_of, expected_version)
+
+def get_summary_from_cache(user_id, period, max_age_hours=6, as_of=None):
     """Retrieves a summary from the cache if it's not too old."""
-    if db is None: return None
-    try:
-        user_obj_id = ObjectId(user_id)
-    except Exception:
-        return None
-        
-    cached = db.summaries.find_one({"user_id": user_obj_id, "period": period})
-    
-    if cached and 'created_at' in cached:
-        cache_age = datetime.utcnow() - cached['created_at']
-        if cache_age < timedelta(hours=max_age_hours):
-            return cached.get('summary')
-    return None
+    return get_store().get_summary_from_cache(user_id, period, max_age_hours, as_of)
+
+def get_summary_version(user_id, period):
+    return get_store().get_summary_version(user_id, period)
+
+def invalidate_summaries(user_id, periods):
+    return get_store().invalidate_summaries(user_id, periods)
 
 
+# Registers the summary cache and prompt statistics write handlers in every process that writes entries
+import database.summary_cache  # noqa: E402,F401
+import database.prompt_stats  # noqa: E402,F401
@@ -0,0 +1,90 @@
+"""
+Per-process caches of per-user indexes built from entry text (insights.py, search.py).
+
+An index object needs `rows` (entry id -> row), `add(entries)`, `remove(entry_ids)`,
+a `lock` and a `synced_at` timestamp. EntryIndexCache builds it from the user's
+entries on first use, applies this process's writes as they happen (ENTRY_ADDED /
+ENTRIES_DELETED) and, at most every `sync_interval` seconds, reconciles entry ids
+with the database to pick up writes made by other worker processes.
+"""
+import time
+import threading
+from collections import OrderedDict
+from datetime import datetime
+import database.db as database
+from database import events
+
+
+def date_ordinal(date):
+    """An entry's 'YYYY-MM-DD' date as a day number for numpy range filters (0 if malformed)."""
+    try:
+        return datetime.strptime(date, '%Y-%m-%d').toordinal()
+    except (TypeError, ValueError):
+        return 0
+
+
+class EntryIndexCache:
+    """Bounded LRU of user_id -> index, kept current by write events."""
+
+    def __init__(self, index_factory, maxsize=256, sync_interval=30):
+        self.index_factory = index_factory
+        self.maxsize = maxsize
+        self.sync_interval = sync_interval
+        self._indexes = OrderedDict()
+        self._lock = threading.Lock()
+        events.on(events.ENTRY_ADDED, self.on_entry_added)
+        events.on(events.ENTRIES_DELETED, self.on_entries_deleted)
+
+    def get(self, user_id):
+        """The user's index, built on first use and reconciled with the database when due."""
+        user_id = str(user_id)
+        with self._lock:
+            index = self._indexes.get(user_id)
+            if index is None:
+                index = self._indexes[user_id] = self.index_factory()
+            self._indexes.move_to_end(user_id)
+            while len(self._indexes) > self.maxsize:
+                self._indexes.popitem(last=False)
+        with index.lock:
+            if not index.synced_at:
+                index.add(database.get_all_entries_sorted_asc(user_id))
+                index.synced_at = time.monotonic()
+            elif time.monotonic() - index.synced_at > self.sync_interval:
+                self._sync(user_id, index)
+        return index
+
+    def _sync(self, user_id, index):
+        # Only ids are read unless another process added or deleted entries
+        current = set(database.get_entry_ids(user_id))
+        indexed = set(index.rows)
+        if indexed - current:
+            index.remove(indexed - current)
+        if current - indexed:
+            index.add(database.get_entries_by_ids(user_id, list(current - indexed)))
+        index.synced_at = time.monotonic()
+
+    def _cached(self, user_id):
+        with self._lock:
+            return self._indexes.get(str(user_id))
+
+    def on_entry_added(self, user_id, entry):
+        index = self._cached(user_id)
+        if index is not None:
+            with index.lock:
+                if index.synced_at:
+                    index.add([entry])
+
+    def on_entries_deleted(self, user_id, entry_ids, dates):
+        index = self._cached(user_id)
+        if index is not None:
+            with index.lock:
+                index.remove(entry_ids)
+
+    def clear(self):
+        with self._lock:
+            self._indexes.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"users": len(self._indexes), "maxsize": self.maxsize,
+                    "entries": sum(len(index.rows) for index in self._indexes.values())}
@@ -0,0 +1,39 @@
+"""
+In-process notifications for writes made through database/db.py.
+
+Caches that depend on a user's entries register a handler with on() and are
+told exactly which dates changed, instead of expiring on a timer:
+
+    events.on(events.ENTRIES_CHANGED, lambda user_id, dates: ...)
+"""
+from collections import defaultdict
+
+# Payload: user_id, dates (the entry dates that gained or lost entries, or whose tasks changed)
+ENTRIES_CHANGED = "entries_changed"
+# Payload: user_id, entry ({_id, date, text, mood, productivity}); for indexes built from entry text
+ENTRY_ADDED = "entry_added"
+# Payload: user_id, entry_ids (as strings), dates
+ENTRIES_DELETED = "entries_deleted"
+
+_handlers = defaultdict(list)
+
+
+def on(event, handler):
+    """Registers handler(**payload) for event."""
+    if handler not in _handlers[event]:
+        _handlers[event].append(handler)
+    return handler
+
+
+def off(event, handler):
+    if handler in _handlers[event]:
+        _handlers[event].remove(handler)
+
+
+def emit(event, **payload):
+    """Calls every handler for event. A failing handler is logged and never fails the write."""
+    for handler in list(_handlers[event]):
+        try:
+            handler(**payload)
+        except Exception as e:
+            print(f"Error in {event} handler {getattr(handler, '__name__', handler)}: {e}")
@@ -0,0 +1,77 @@
+"""
+Keyset-paginated entry history for the dashboard's day list.
+
+Entries are read newest first in (date, _id) order with a projection that
+leaves out the journal text, and grouped into days. A cursor is the
+(date, _id) of the last entry on a page, so fetching the next page is an
+index range scan no matter how far back the user scrolls.
+"""
+from bson.objectid import ObjectId
+from bson.errors import InvalidId
+from database.rollups import MOOD_SCORES
+
+HISTORY_DAYS = 14
+HISTORY_MAX_ENTRIES = 500
+HISTORY_PROJECTION = {"date": 1, "mood": 1, "productivity": 1}
+HISTORY_SORT = [("date", -1), ("_id", -1)]
+
+
+def encode_cursor(date, entry_id):
+    return f"{date}.{entry_id}"
+
+
+def parse_cursor(cursor):
+    """Parses a cursor from encode_cursor(); raises ValueError if it is malformed."""
+    try:
+        date, entry_id = cursor.split(".", 1)
+        return date, ObjectId(entry_id)
+    except (AttributeError, ValueError, InvalidId):
+        raise ValueError(f"Invalid history cursor: {cursor!r}")
+
+
+def history_query(user_obj_id, cursor=None):
+    """Filter for entries strictly older than the cursor in (date, _id) order."""
+    query = {"user_id": user_obj_id}
+    if cursor:
+        date, entry_id = parse_cursor(cursor)
+        query["$or"] = [{"date": {"$lt": date}}, {"date": date, "_id": {"$lt": entry_id}}]
+    return query
+
+
+def build_history_page(rows, days=HISTORY_DAYS, max_entries=HISTORY_MAX_ENTRIES):
+    """
+    Groups up to max_entries + 1 rows (newest first) into at most `days` days.
+
+    A page normally ends on a day boundary. Only a single day with more than
+    max_entries entries is split, and its continuation on the next page has
+    the same date; the per-day sums let the client merge the two halves.
+    """
+    more = len(rows) > max_entries
+    rows = rows[:max_entries]
+
+    page_days, last_row = [], None
+    for row in rows:
+        if not page_days or page_days[-1]["date"] != row["date"]:
+            if len(page_days) == days:
+                more = True
+                break
+            page_days.append({"date": row["date"], "entry_count": 0, "mood_sum": 0, "productivity_sum": 0.0, "last": None})
+        day = page_days[-1]
+        day["entry_count"] += 1
+        day["mood_sum"] += MOOD_SCORES.get(row.get("mood"), 0)
+        day["productivity_sum"] += float(row.get("productivity") or 0)
+        day["last"] = row
+
+    # When the entry limit was hit the oldest day may be incomplete; leave it for the next page
+    if more and len(rows) == max_entries and len(page_days) > 1 and page_days[-1]["last"] is rows[-1]:
+        page_days.pop()
+
+    for day in page_days:
+        last_row = day.pop("last")
+        day["productivity_sum"] = round(day["productivity_sum"], 4)
+        day["avg_mood_score"] = round(day["mood_sum"] / day["entry_count"], 2)
+        day["avg_productivity"] = round(day["productivity_sum"] / day["entry_count"], 2)
+
+    next_cursor = encode_cursor(last_row["date"], last_row["_id"]) if more and last_row else None
+    return {"days": page_days, "next_cursor": next_cursor}
+
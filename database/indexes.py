@@ -0,0 +1,83 @@
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+
+# Every index the queries in database/mongo_storage.py rely on, per collection.
+# ensure_indexes() runs whenever a process first connects (database/connection.py); creating an index that already exists
+# with the same definition is a no-op, so this is safe to run repeatedly.
+INDEXES = {
+    "entries": [
+        # get_all_entries_sorted_asc, get_entries_for_period, get_entries_and_tasks_for_date,
+        # and the (date, _id) keyset pages in database/history.py (read in reverse)
+        {"keys": [("user_id", ASCENDING), ("date", ASCENDING), ("_id", ASCENDING)], "name": "user_date_id"},
+        # get_entry_for_job; unique so a retried job cannot save its entry twice (only entries saved by jobs have job_id)
+        {"keys": [("job_id", ASCENDING)], "name": "job_unique", "unique": True,
+         "partial": {"job_id": {"$exists": True}}},
+    ],
+    "tasks": [
+        # get_tasks_for_entry_ids, delete_entries_and_tasks
+        {"keys": [("user_id", ASCENDING), ("entry_id", ASCENDING)], "name": "user_entry"},
+        # get_pending_tasks, get_tasks_with_entry_info(completed_status=...)
+        {"keys": [("user_id", ASCENDING), ("completed", ASCENDING), ("_id", DESCENDING)], "name": "user_completed_recent"},
+        # get_tasks_with_entry_info(completed_status=None)
+        {"keys": [("user_id", ASCENDING), ("_id", DESCENDING)], "name": "user_recent"},
+        # $lookup from entries into tasks on entry_id (get_entries_and_tasks_for_date)
+        {"keys": [("entry_id", ASCENDING)], "name": "entry"},
+    ],
+    "users": [
+        # find_user_by_email; also guarantees one account per email
+        {"keys": [("email", ASCENDING)], "name": "email_unique", "unique": True},
+    ],
+    "daily_rollups": [
+        # Rollup upserts, chart reads and the $merge in rollups.rebuild_pipeline
+        {"keys": [("user_id", ASCENDING), ("date", ASCENDING)], "name": "user_date_unique", "unique": True},
+        # get_active_user_ids (the precompute job's batches of recently active users)
+        {"keys": [("date", ASCENDING), ("user_id", ASCENDING)], "name": "date_user"},
+    ],
+    "summaries": [
+        # save_summary_to_cache / get_summary_from_cache / get_summary_version / invalidate_summaries
+        {"keys": [("user_id", ASCENDING), ("period", ASCENDING)], "name": "user_period_unique", "unique": True},
+    ],
+    "prompt_stats": [
+        # get_prompt_stats / save_prompt_stats; unique so concurrent first saves cannot create two documents
+        {"keys": [("user_id", ASCENDING)], "name": "user_unique", "unique": True},
+    ],
+    "jobs": [
+        # job_queue.MongoJobQueue.claim: queued jobs that are due, and running jobs whose lease ran out
+        {"keys": [("state", ASCENDING), ("run_after", ASCENDING)], "name": "state_run_after"},
+        {"keys": [("state", ASCENDING), ("lease_until", ASCENDING)], "name": "state_lease_until"},
+        # Finished jobs are deleted a week after they finish (queued/running ones have no finished_at)
+        {"keys": [("finished_at", ASCENDING)], "name": "finished_ttl", "expire_after": 7 * 24 * 3600},
+    ],
+}
+
+# Indexes replaced by a wider one above; ensure_indexes() drops them if present.
+RETIRED_INDEXES = {
+    "entries": ["user_date"],
+}
+
+
+def ensure_indexes(db):
+    """Creates any missing index from INDEXES and drops RETIRED_INDEXES. Returns the names of indexes that could not be."""
+    failed = []
+    for collection_name, specs in INDEXES.items():
+        collection = db[collection_name]
+        for spec in specs:
+            try:
+                options = {"expireAfterSeconds": spec["expire_after"]} if "expire_after" in spec else {}
+                if "partial" in spec:
+                    options["partialFilterExpression"] = spec["partial"]
+                collection.create_index(spec["keys"], name=spec["name"], unique=spec.get("unique", False), **options)
+            except OperationFailure as e:
+                # e.g. a conflicting definition under the same name, or duplicates blocking a unique index
+                print(f"Could not create index {collection_name}.{spec['name']}: {e}")
+                failed.append(f"{collection_name}.{spec['name']}")
+    for collection_name, names in RETIRED_INDEXES.items():
+        for name in names:
+            try:
+                if name in db[collection_name].index_information():
+                    db[collection_name].drop_index(name)
+            except OperationFailure as e:
+                # e.g. no dropIndex permission, or another process dropped it first
+                print(f"Could not drop retired index {collection_name}.{name}: {e}")
+                failed.append(f"{collection_name}.{name}")
+    return failed
@@ -0,0 +1,333 @@
+"""
+Persistent background jobs (audio analysis) for jobs.py.
+
+A job moves through the states
+
+    queued -> running -> done
+                  \\-> queued (retry after a delay) -> ... -> failed
+
+and carries its progress ("stage" and "progress" percent) while it runs.
+JOB_QUEUE selects the backend: "mongo" keeps jobs in the `jobs` collection,
+so they survive restarts and are shared by every process, and "memory" keeps
+them in this process only (single-process/local runs; lost on restart). The
+default follows STORAGE_BACKEND.
+
+A running job holds a lease that its worker renews with every progress
+update. If the process dies, the lease runs out and another worker claims the
+job again, counting it as a new attempt; once max_attempts is used up the job
+is failed instead. Updates from an attempt that lost its job this way are
+ignored (see JobQueue).
+
+A job's input file (an audio upload) is kept by the queue too, under the job's
+id: the Mongo queue stores it in GridFS (the `job_inputs` bucket), so a worker
+on another machine can read it. jobs.py deletes it once the job is done or
+failed.
+"""
+import io
+import os
+import uuid
+import threading
+import gridfs
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument
+from database.connection import get_db
+
+JOB_QUEUE = os.getenv("JOB_QUEUE", "mongo" if os.getenv("STORAGE_BACKEND", "mongo").lower() == "mongo" else "memory")
+# Seconds a running job may go without a progress update before it is considered abandoned
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", 900))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 3))
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+
+def new_job(kind, payload, user_id, max_attempts=JOB_MAX_ATTEMPTS):
+    now = datetime.utcnow()
+    return {
+        "_id": uuid.uuid4().hex,
+        "kind": kind,
+        "user_id": str(user_id),
+        "payload": payload,
+        "state": QUEUED,
+        "stage": None,
+        "progress": 0,
+        "attempts": 0,
+        "max_attempts": max_attempts,
+        "error": None,
+        "result": None,
+        "run_after": now,
+        "lease_until": None,
+        "created_at": now,
+        "updated_at": now,
+        "finished_at": None,
+    }
+
+
+def public_job(job):
+    """The fields /api/jobs/<id> reports."""
+    return {
+        "job_id": job["_id"],
+        "kind": job["kind"],
+        "state": job["state"],
+        "stage": job.get("stage"),
+        "progress": job.get("progress", 0),
+        "attempts": job.get("attempts", 0),
+        "max_attempts": job.get("max_attempts"),
+        "error": job.get("error"),
+        "result": job.get("result"),
+        "created_at": job["created_at"].isoformat() + "Z",
+        "updated_at": job["updated_at"].isoformat() + "Z",
+    }
+
+
+class JobQueue:
+    """
+    The methods that change a claimed job take the `attempt` it was claimed
+    as (its "attempts" after claim()) and only apply while that attempt
+    still owns the job, i.e. it is running under that attempt number. A
+    worker whose lease ran out and whose job was claimed again can then no
+    longer overwrite it; these methods return False in that case.
+    """
+    name = None
+
+    def enqueue(self, job):
+        """Stores a job made by new_job(). Returns its id."""
+        raise NotImplementedError
+
+    def claim(self, lease_seconds=JOB_LEASE_SECONDS):
+        """
+        Atomically takes the oldest runnable job and marks it running: a queued job
+        that is due, or a running one whose lease ran out with attempts left.
+        """
+        raise NotImplementedError
+
+    def abandon(self):
+        """
+        Fails one running job whose lease ran out on its last attempt and returns it
+        (None if there is none), so the caller can clean up after it.
+        """
+        raise NotImplementedError
+
+    def progress(self, job_id, attempt, stage, progress, lease_seconds=JOB_LEASE_SECONDS):
+        """Records progress and renews the lease."""
+        raise NotImplementedError
+
+    def complete(self, job_id, attempt, result):
+        raise NotImplementedError
+
+    def retry(self, job_id, attempt, error, delay_seconds):
+        """Puts a failed attempt back in the queue, runnable after delay_seconds."""
+        raise NotImplementedError
+
+    def fail(self, job_id, attempt, error):
+        raise NotImplementedError
+
+    def get(self, job_id):
+        raise NotImplementedError
+
+    def counts(self):
+        """{state: number of jobs}."""
+        raise NotImplementedError
+
+    def put_input(self, job_id, file):
+        """Stores the readable binary `file` as the input of the job with this id (before it is enqueued)."""
+        raise NotImplementedError
+
+    def open_input(self, job_id):
+        """The job's input as a readable binary file, or None if there is none."""
+        raise NotImplementedError
+
+    def delete_input(self, job_id):
+        raise NotImplementedError
+
+
+ABANDONED_ERROR = "The worker running this job stopped before it finished."
+
+
+class MemoryJobQueue(JobQueue):
+    """Jobs in a dict guarded by a lock. For local runs and tests; nothing survives a restart."""
+    name = "memory"
+
+    def __init__(self):
+        self._jobs = {}
+        self._inputs = {}
+        self._lock = threading.Lock()
+
+    def _update(self, job_id, attempt, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job["state"] != RUNNING or job["attempts"] != attempt:
+                return False
+            job.update(fields, updated_at=datetime.utcnow())
+            return True
+
+    def enqueue(self, job):
+        with self._lock:
+            self._jobs[job["_id"]] = dict(job)
+        return job["_id"]
+
+    def claim(self, lease_seconds=JOB_LEASE_SECONDS):
+        now = datetime.utcnow()
+        with self._lock:
+            runnable = [job for job in self._jobs.values()
+                        if (job["state"] == QUEUED and job["run_after"] <= now)
+                        or (job["state"] == RUNNING and job["lease_until"] < now
+                            and job["attempts"] < job["max_attempts"])]
+            if not runnable:
+                return None
+            job = min(runnable, key=lambda job: job["created_at"])
+            job.update(state=RUNNING, attempts=job["attempts"] + 1, updated_at=now,
+                       lease_until=now + timedelta(seconds=lease_seconds))
+            return dict(job)
+
+    def abandon(self):
+        now = datetime.utcnow()
+        with self._lock:
+            for job in self._jobs.values():
+                if job["state"] == RUNNING and job["lease_until"] < now and job["attempts"] >= job["max_attempts"]:
+                    job.update(state=FAILED, error=ABANDONED_ERROR, lease_until=None, updated_at=now, finished_at=now)
+                    return dict(job)
+        return None
+
+    def progress(self, job_id, attempt, stage, progress, lease_seconds=JOB_LEASE_SECONDS):
+        return self._update(job_id, attempt, stage=stage, progress=progress,
+                            lease_until=datetime.utcnow() + timedelta(seconds=lease_seconds))
+
+    def complete(self, job_id, attempt, result):
+        return self._update(job_id, attempt, state=DONE, result=result, progress=100, error=None,
+                            lease_until=None, finished_at=datetime.utcnow())
+
+    def retry(self, job_id, attempt, error, delay_seconds):
+        return self._update(job_id, attempt, state=QUEUED, error=error, lease_until=None,
+                            run_after=datetime.utcnow() + timedelta(seconds=delay_seconds))
+
+    def fail(self, job_id, attempt, error):
+        return self._update(job_id, attempt, state=FAILED, error=error, lease_until=None,
+                            finished_at=datetime.utcnow())
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def counts(self):
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job["state"]] = counts.get(job["state"], 0) + 1
+            return counts
+
+    def put_input(self, job_id, file):
+        data = file.read()
+        with self._lock:
+            self._inputs[job_id] = data
+
+    def open_input(self, job_id):
+        with self._lock:
+            data = self._inputs.get(job_id)
+        return io.BytesIO(data) if data is not None else None
+
+    def delete_input(self, job_id):
+        with self._lock:
+            self._inputs.pop(job_id, None)
+
+
+class MongoJobQueue(JobQueue):
+    """Jobs in the `jobs` collection; claims are single find_one_and_update calls, so workers never share a job."""
+    name = "mongo"
+
+    def _update(self, job_id, attempt, fields):
+        db = get_db()
+        if db is None: return False
+        fields["updated_at"] = datetime.utcnow()
+        # state + attempts fence out a worker whose lease ran out and whose job was claimed again
+        return db.jobs.update_one({"_id": job_id, "state": RUNNING, "attempts": attempt},
+                                  {"$set": fields}).modified_count == 1
+
+    def enqueue(self, job):
+        db = get_db()
+        if db is None:
+            raise RuntimeError("No database connection for the job queue.")
+        db.jobs.insert_one(job)
+        return job["_id"]
+
+    def claim(self, lease_seconds=JOB_LEASE_SECONDS):
+        db = get_db()
+        if db is None: return None
+        now = datetime.utcnow()
+        return db.jobs.find_one_and_update(
+            {"$or": [{"state": QUEUED, "run_after": {"$lte": now}},
+                     {"state": RUNNING, "lease_until": {"$lt": now},
+                      "$expr": {"$lt": ["$attempts", "$max_attempts"]}}]},
+            {"$set": {"state": RUNNING, "updated_at": now, "lease_until": now + timedelta(seconds=lease_seconds)},
+             "$inc": {"attempts": 1}},
+            sort=[("created_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    def abandon(self):
+        db = get_db()
+        if db is None: return None
+        now = datetime.utcnow()
+        return db.jobs.find_one_and_update(
+            {"state": RUNNING, "lease_until": {"$lt": now},
+             "$expr": {"$gte": ["$attempts", "$max_attempts"]}},
+            {"$set": {"state": FAILED, "error": ABANDONED_ERROR, "lease_until": None,
+                      "updated_at": now, "finished_at": now}},
+            return_document=ReturnDocument.AFTER,
+        )
+
+    def progress(self, job_id, attempt, stage, progress, lease_seconds=JOB_LEASE_SECONDS):
+        return self._update(job_id, attempt, {"stage": stage, "progress": progress,
+                                              "lease_until": datetime.utcnow() + timedelta(seconds=lease_seconds)})
+
+    def complete(self, job_id, attempt, result):
+        return self._update(job_id, attempt, {"state": DONE, "result": result, "progress": 100, "error": None,
+                                              "lease_until": None, "finished_at": datetime.utcnow()})
+
+    def retry(self, job_id, attempt, error, delay_seconds):
+        return self._update(job_id, attempt, {"state": QUEUED, "error": error, "lease_until": None,
+                                              "run_after": datetime.utcnow() + timedelta(seconds=delay_seconds)})
+
+    def fail(self, job_id, attempt, error):
+        return self._update(job_id, attempt, {"state": FAILED, "error": error, "lease_until": None,
+                                              "finished_at": datetime.utcnow()})
+
+    def get(self, job_id):
+        db = get_db()
+        if db is None: return None
+        return db.jobs.find_one({"_id": job_id})
+
+    def counts(self):
+        db = get_db()
+        if db is None: return {}
+        # One indexed count per state (state_run_after index prefix)
+        return {state: db.jobs.count_documents({"state": state}) for state in (QUEUED, RUNNING, DONE, FAILED)}
+
+    def _inputs(self):
+        db = get_db()
+        if db is None:
+            raise RuntimeError("No database connection for the job queue.")
+        return gridfs.GridFS(db, collection="job_inputs")
+
+    def put_input(self, job_id, file):
+        # GridFS splits the file into chunks, so uploads are not limited by the 16 MB document size
+        self._inputs().put(file, _id=job_id)
+
+    def open_input(self, job_id):
+        try:
+            return self._inputs().get(job_id)
+        except gridfs.NoFile:
+            return None
+
+    def delete_input(self, job_id):
+        self._inputs().delete(job_id)
+
+
+def create_job_queue(backend=None):
+    """Builds the job queue named by `backend` (or JOB_QUEUE)."""
+    backend = (backend or JOB_QUEUE).lower()
+    if backend == "mongo":
+        return MongoJobQueue()
+    if backend == "memory":
+        return MemoryJobQueue()
+    raise ValueError(f"Unknown JOB_QUEUE: {backend!r} (expected 'mongo' or 'memory')")
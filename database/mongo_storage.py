@@ -0,0 +1,417 @@
+from bson.objectid import ObjectId
+from pymongo.errors import DuplicateKeyError
+from datetime import datetime, timedelta
+from database.connection import connection, get_db
+from database.storage import Storage
+from database.history import HISTORY_MAX_ENTRIES, HISTORY_PROJECTION, HISTORY_SORT, history_query
+from database import dashboard, rollups
+from database.summary_stats import empty_stats, make_stats, period_start_date, summary_stats_pipeline
+
+
+def _supports_transactions():
+    # Multi-document transactions need a replica set or sharded cluster (Atlas always is one)
+    client = connection.client
+    return client is not None and client.topology_description.topology_type_name in (
+        "ReplicaSetWithPrimary", "Sharded", "LoadBalanced"
+    )
+
+def _write(callback):
+    """Runs callback(session) in a transaction when the deployment supports one, else directly."""
+    if _supports_transactions():
+        with connection.client.start_session() as session:
+            return session.with_transaction(callback)
+    return callback(None)
+
+
+class MongoStorage(Storage):
+    """MongoDB (Atlas) backend. Connects lazily per process through database/connection.py."""
+    name = "mongo"
+
+    def init(self):
+        return get_db() is not None
+
+    def close(self):
+        connection.close()
+
+    # --- Users ---
+    def find_user_by_email(self, email):
+        """Finds a user document by their email."""
+        db = get_db()
+        if db is None: return None
+        return db.users.find_one({"email": email})
+
+    def find_user_by_id(self, user_id):
+        """Finds a user document by their _id."""
+        db = get_db()
+        if db is None: return None
+        try:
+            return db.users.find_one({"_id": ObjectId(user_id)})
+        except:
+            return None
+
+    def create_user(self, email, password_hash):
+        """Inserts a new user document into the database."""
+        db = get_db()
+        if db is None: return None
+        return db.users.insert_one({"email": email, "password": password_hash}).inserted_id
+
+    # --- Writes ---
+    def add_entry(self, user_id, date, text, mood, productivity):
+        db = get_db()
+        if db is None: return None
+        user_obj_id = ObjectId(user_id)
+
+        def write(session):
+            entry_document = {
+                "user_id": user_obj_id,
+                "date": date,
+                "text": text,
+                "mood": mood,
+                "productivity": productivity
+            }
+            result = db.entries.insert_one(entry_document, session=session)
+            rollups.apply_increments(db, user_obj_id, date, rollups.entry_increments(mood, productivity), session)
+            return result.inserted_id
+
+        return _write(write)
+
+    def add_task(self, user_id, entry_id, task_text):
+        db = get_db()
+        if db is None: return None
+        task_document = {
+            "user_id": ObjectId(user_id),
+            "entry_id": entry_id,
+            "task_text": task_text,
+            "status": "pending",
+            "completed": False
+        }
+        db.tasks.insert_one(task_document)
+
+    def add_entry_with_tasks(self, user_id, date, text, mood, productivity, tasks, job_id=None):
+        """
+        Inserts an entry and all of its extracted tasks with one insert_many, so the
+        number of round trips does not grow with the number of tasks. Runs inside a
+        transaction when the deployment supports one, so a failure cannot leave the
+        entry with only some of its tasks.
+        """
+        db = get_db()
+        if db is None: return None
+        user_obj_id = ObjectId(user_id)
+
+        def write(session):
+            entry_document = {
+                "user_id": user_obj_id,
+                "date": date,
+                "text": text,
+                "mood": mood,
+                "productivity": productivity
+            }
+            if job_id is not None:
+                # Unique (job_unique index): a job retried after saving cannot save a second entry
+                entry_document["job_id"] = job_id
+            entry_id = db.entries.insert_one(entry_document, session=session).inserted_id
+            if tasks:
+                db.tasks.insert_many([
+                    {"user_id": user_obj_id, "entry_id": entry_id, "task_text": task_text,
+                     "status": "pending", "completed": False}
+                    for task_text in tasks
+                ], ordered=True, session=session)
+            rollups.apply_increments(db, user_obj_id, date,
+                                     rollups.entry_increments(mood, productivity, tasks_total=len(tasks or [])), session)
+            return entry_id
+
+        return _write(write)
+
+    def get_entry_for_job(self, user_id, job_id):
+        db = get_db()
+        if db is None: return None
+        user_obj_id = ObjectId(user_id)
+        entry = db.entries.find_one({"user_id": user_obj_id, "job_id": job_id}, {"mood": 1, "productivity": 1})
+        if entry is None: return None
+        entry["tasks"] = [task["task_text"] for task in db.tasks.find(
+            {"user_id": user_obj_id, "entry_id": entry["_id"]}, {"task_text": 1}).sort("_id", 1)]
+        return entry
+
+    def update_task_status(self, user_id, task_id, completed):
+        db = get_db()
+        if db is None: return None
+        user_obj_id = ObjectId(user_id)
+
+        def write(session):
+            # Security: Ensure the user owns the task they are trying to update
+            before = db.tasks.find_one_and_update(
+                {"_id": ObjectId(task_id), "user_id": user_obj_id},
+                {"$set": {"completed": completed}},
+                projection={"completed": 1, "entry_id": 1},
+                session=session
+            )
+            if before is None or bool(before.get("completed")) == bool(completed):
+                return None
+            entry = db.entries.find_one({"_id": before["entry_id"]}, {"date": 1}, session=session)
+            if entry:
+                rollups.apply_increments(db, user_obj_id, entry["date"],
+                                         {"tasks_completed": 1 if completed else -1}, session)
+                return entry["date"]
+            return None
+
+        return _write(write)
+
+    def delete_entries_and_tasks(self, user_id, entry_ids):
+        db = get_db()
+        if db is None or not entry_ids: return []
+
+        valid_object_ids = [ObjectId(eid) for eid in entry_ids if eid and len(eid) == 24]
+        if not valid_object_ids: return []
+
+        user_obj_id = ObjectId(user_id)
+
+        def write(session):
+            # Security: Ensure the queries include the user_id
+            entries = list(db.entries.find(
+                {"user_id": user_obj_id, "_id": {"$in": valid_object_ids}},
+                {"date": 1, "mood": 1, "productivity": 1}, session=session
+            ))
+            if not entries: return []
+            entry_ids = [entry["_id"] for entry in entries]
+            task_counts = {}
+            for task in db.tasks.find({"user_id": user_obj_id, "entry_id": {"$in": entry_ids}},
+                                      {"entry_id": 1, "completed": 1}, session=session):
+                total, done = task_counts.get(task["entry_id"], (0, 0))
+                task_counts[task["entry_id"]] = (total + 1, done + (1 if task.get("completed") else 0))
+
+            db.tasks.delete_many({"user_id": user_obj_id, "entry_id": {"$in": entry_ids}}, session=session)
+            db.entries.delete_many({"user_id": user_obj_id, "_id": {"$in": entry_ids}}, session=session)
+
+            # Take the deleted entries back out of their days' rollups
+            by_date = {}
+            for entry in entries:
+                total, done = task_counts.get(entry["_id"], (0, 0))
+                increments = rollups.entry_increments(entry.get("mood"), entry.get("productivity"), -1, total, done)
+                day = by_date.setdefault(entry["date"], {})
+                for field, value in increments.items():
+                    day[field] = day.get(field, 0) + value
+            for date, increments in by_date.items():
+                rollups.apply_increments(db, user_obj_id, date, increments, session)
+            rollups.prune_empty(db, user_obj_id, by_date, session)
+            return sorted(by_date)
+
+        return _write(write)
+
+    # --- Reads ---
+    def get_all_entries_sorted_asc(self, user_id):
+        db = get_db()
+        if db is None: return []
+        return list(db.entries.find({"user_id": ObjectId(user_id)}).sort("date", 1))
+
+    def get_pending_tasks(self, user_id):
+        db = get_db()
+        if db is None: return []
+        return list(db.tasks.find({"user_id": ObjectId(user_id), "completed": False}))
+
+    def get_tasks_with_entry_info(self, user_id, completed_status=None, limit=5):
+        db = get_db()
+        if db is None: return []
+        pipeline = [{"$match": {"user_id": ObjectId(user_id)}}] # Filter by user first
+        if completed_status is not None:
+            pipeline.append({"$match": {"completed": completed_status}})
+
+        pipeline.extend([
+            {"$sort": {"_id": -1}},
+            {"$limit": limit},
+            {"$lookup": {"from": "entries", "localField": "entry_id", "foreignField": "_id", "as": "entry_info"}},
+            {"$unwind": "$entry_info"},
+            {"$project": {"_id": 0, "task_text": "$task_text", "date": "$entry_info.date"}}
+        ])
+        return list(db.tasks.aggregate(pipeline))
+
+    def get_chart_data(self, user_id, limit=30):
+        """Average mood and productivity for the user's last `limit` days with entries, read from daily rollups."""
+        db = get_db()
+        if db is None: return []
+        days = list(db.daily_rollups.find(
+            {"user_id": ObjectId(user_id), "entries": {"$gt": 0}},
+            {"_id": 0, "date": 1, "entries": 1, "productivity_sum": 1, "mood_sum": 1}
+        ).sort("date", -1).limit(limit))
+        return [
+            {"date": day["date"], "avg_productivity": day["productivity_sum"] / day["entries"],
+             "avg_mood": day["mood_sum"] / day["entries"]}
+            for day in reversed(days)
+        ]
+
+    def get_rollup_chart_data(self, user_id, period):
+        """Chart rows ({label, productivity, mood}) for 'daily', 'weekly' or 'monthly', read from daily rollups."""
+        db = get_db()
+        if db is None: return []
+        return list(db.daily_rollups.aggregate(rollups.chart_pipeline(ObjectId(user_id), period)))
+
+    def get_tasks_for_entry_ids(self, user_id, entry_ids):
+        db = get_db()
+        if db is None or not entry_ids: return []
+        return list(db.tasks.find({"user_id": ObjectId(user_id), "entry_id": {"$in": entry_ids}}))
+
+    def get_entries_and_tasks_for_date(self, user_id, date):
+        db = get_db()
+        if db is None: return []
+        pipeline = [
+            {"$match": {"user_id": ObjectId(user_id), "date": date}}, # Filter by user first
+            {"$lookup": {"from": "tasks", "localField": "_id", "foreignField": "entry_id", "as": "tasks"}},
+            {"$project": {"_id": 1, "journal_text": "$text", "mood": "$mood", "productivity": "$productivity", "tasks": "$tasks"}}
+        ]
+        return list(db.entries.aggregate(pipeline))
+
+    def get_entries_for_period(self, user_id, days=7):
+        """Fetches all journal entries for a user within the last N days."""
+        db = get_db()
+        if db is None: return []
+        start_date = datetime.now() - timedelta(days=days)
+        start_date_str = start_date.strftime('%Y-%m-%d')
+
+        return list(db.entries.find({
+            "user_id": ObjectId(user_id),
+            "date": {"$gte": start_date_str}
+        }).sort("date", 1))
+
+    def get_summary_stats(self, user_id, days=7):
+        db = get_db()
+        if db is None: return empty_stats()
+        rows = list(db.entries.aggregate(summary_stats_pipeline(ObjectId(user_id), period_start_date(days))))
+        return make_stats(**rows[0]) if rows else empty_stats()
+
+    def get_recent_entries(self, user_id, limit=30):
+        db = get_db()
+        if db is None: return []
+        query = {}
+        if user_id:
+            try:
+                query["user_id"] = ObjectId(user_id)
+            except Exception:
+                query["user_id"] = user_id
+        return list(db.entries.find(query).sort([("date", -1), ("_id", -1)]).limit(limit))
+
+    def get_entry_ids(self, user_id):
+        db = get_db()
+        if db is None: return []
+        # Covered by the user_date_id index
+        return [str(row["_id"]) for row in db.entries.find({"user_id": ObjectId(user_id)}, {"_id": 1})]
+
+    def get_entries_by_ids(self, user_id, entry_ids):
+        db = get_db()
+        if db is None or not entry_ids: return []
+        object_ids = [ObjectId(entry_id) for entry_id in entry_ids]
+        return list(db.entries.find({"user_id": ObjectId(user_id), "_id": {"$in": object_ids}}))
+
+    def get_history_rows(self, user_id, cursor=None, limit=HISTORY_MAX_ENTRIES + 1):
+        db = get_db()
+        if db is None: return []
+        return list(db.entries.find(history_query(ObjectId(user_id), cursor), HISTORY_PROJECTION)
+                    .sort(HISTORY_SORT).limit(limit))
+
+    def get_dashboard_data(self, user_id):
+        # One $facet round trip instead of the five separate queries in Storage.get_dashboard_data
+        return dashboard.get_dashboard_data(user_id)
+
+    def get_active_user_ids(self, since_date, after=None, limit=100):
+        db = get_db()
+        if db is None: return []
+        # daily_rollups has one small document per user and day, so this reads far less than entries
+        match = {"date": {"$gte": since_date}}
+        if after:
+            match["user_id"] = {"$gt": ObjectId(after)}
+        rows = db.daily_rollups.aggregate([
+            {"$match": match},
+            {"$group": {"_id": "$user_id"}},
+            {"$sort": {"_id": 1}},
+            {"$limit": limit},
+        ])
+        return [str(row["_id"]) for row in rows]
+
+    # --- Prompt statistics ---
+    def get_prompt_stats(self, user_id, topics_only=False):
+        db = get_db()
+        if db is None: return None
+        projection = {"_id": 0, "user_id": 0}
+        if topics_only:
+            projection = {"_id": 0, "count": 1, "topics": 1, "latest_topics": 1, "version": 1}
+        return db.prompt_stats.find_one({"user_id": ObjectId(user_id)}, projection)
+
+    def save_prompt_stats(self, user_id, stats, expected_version=None):
+        db = get_db()
+        if db is None: return False
+        query = {"user_id": ObjectId(user_id)}
+        if expected_version is not None:
+            query["version"] = expected_version
+        fields = {key: value for key, value in stats.items() if key != "version"}
+        try:
+            db.prompt_stats.update_one(query, {"$set": fields, "$inc": {"version": 1}}, upsert=True)
+        except DuplicateKeyError:
+            # Another writer moved the version on; the upsert collided with their document
+            return False
+        return True
+
+    # --- Summaries ---
+    def save_summary_to_cache(self, user_id, period, summary_data, as_of=None, expected_version=None):
+        """Saves a generated summary to the 'summaries' collection with a timestamp."""
+        db = get_db()
+        if db is None: return False
+        query = {"user_id": ObjectId(user_id), "period": period}
+        if expected_version is not None:
+            # Documents saved before versions were kept have no version field
+            query["version"] = expected_version if expected_version else {"$in": [0, None]}
+        try:
+            db.summaries.update_one(
+                query,
+                {"$set": {"summary": summary_data, "as_of": as_of, "created_at": datetime.utcnow()}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # A write invalidated the summary while it was being built
+            return False
+        return True
+
+    def get_summary_from_cache(self, user_id, period, max_age_hours=6, as_of=None):
+        """Retrieves a summary from the cache if it's not too old (and, given as_of, was built for that day)."""
+        db = get_db()
+        if db is None: return None
+        try:
+            user_obj_id = ObjectId(user_id)
+        except Exception:
+            return None
+
+        cached = db.summaries.find_one({"user_id": user_obj_id, "period": period})
+
+        if cached and 'created_at' in cached and (as_of is None or cached.get('as_of') == as_of):
+            cache_age = datetime.utcnow() - cached['created_at']
+            if cache_age < timedelta(hours=max_age_hours):
+                return cached.get('summary')
+        return None
+
+    def get_summary_version(self, user_id, period):
+        db = get_db()
+        if db is None: return 0
+        cached = db.summaries.find_one({"user_id": ObjectId(user_id), "period": period}, {"_id": 0, "version": 1})
+        return (cached or {}).get("version", 0)
+
+    def invalidate_summaries(self, user_id, periods):
+        db = get_db()
+        if db is None: return
+        # Upserted, so a summary being built for a period with no document yet is fenced too
+        for period in periods:
+            db.summaries.update_one(
+                {"user_id": ObjectId(user_id), "period": period},
+                {"$unset": {"summary": "", "as_of": "", "created_at": ""}, "$inc": {"version": 1}},
+                upsert=True
+            )
+
+    # --- Backend-specific ---
+    def get_nlp_cache_collection(self):
+        """Returns the collection backing the persistent tier of the NLP result cache."""
+        db = get_db()
+        if db is None: return None
+        return db.nlp_cache
+
+    def execute_aggregation(self, user_id, collection_name, pipeline):
+        db = get_db()
+        if db is None: return []
+        # Prepend the user_id match to any pipeline for security
+        full_pipeline = [{"$match": {"user_id": ObjectId(user_id)}}] + pipeline
+        return list(db[collection_name].aggregate(full_pipeline))
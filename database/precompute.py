@@ -0,0 +1,204 @@
+"""
+Precomputes the day and week summaries of recently active users so that
+/api/get_summary is served warm from the summary cache.
+
+A pass walks users with entries in the last PRECOMPUTE_ACTIVE_DAYS days in
+batches of PRECOMPUTE_BATCH_SIZE, refreshing up to PRECOMPUTE_CONCURRENCY
+users at a time. After each batch it records the last user id in a
+checkpoint file (PRECOMPUTE_CHECKPOINT), so an interrupted pass resumes
+where it stopped instead of starting over.
+
+Run one pass (for cron):
+    python -m database.precompute --once [--rollups]
+
+Or schedule it: a nightly pass at PRECOMPUTE_NIGHTLY_AT (HH:MM, local time),
+plus a refresh of each user PRECOMPUTE_DEBOUNCE seconds after their last
+write. In the web app set PRECOMPUTE_SCHEDULER=True; with several worker
+processes, prefer cron for the nightly pass so it runs once.
+    python -m database.precompute
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import database.db as database
+from database import events, rollups
+from database.summary_cache import summary_cache, SUMMARY_PERIODS
+
+ACTIVE_DAYS = int(os.getenv("PRECOMPUTE_ACTIVE_DAYS", 7))
+BATCH_SIZE = int(os.getenv("PRECOMPUTE_BATCH_SIZE", 100))
+CONCURRENCY = int(os.getenv("PRECOMPUTE_CONCURRENCY", 4))
+CHECKPOINT_PATH = os.getenv("PRECOMPUTE_CHECKPOINT", ".precompute_checkpoint.json")
+NIGHTLY_AT = os.getenv("PRECOMPUTE_NIGHTLY_AT", "02:30")
+DEBOUNCE_SECONDS = float(os.getenv("PRECOMPUTE_DEBOUNCE", 30))
+
+
+def precompute_user(user_id, rebuild_rollups=False):
+    """Refreshes every summary period for one user (and optionally rebuilds their rollups)."""
+    if rebuild_rollups and database.get_store().name == "mongo":
+        from database.connection import get_db
+        rollups.rebuild_rollups(get_db(), user_id)
+    for period in SUMMARY_PERIODS:
+        summary_cache.refresh(user_id, period)
+
+
+def load_checkpoint(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_checkpoint(path, checkpoint):
+    # Write then rename, so a crash never leaves a half-written checkpoint
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+
+def run_once(batch_size=BATCH_SIZE, concurrency=CONCURRENCY, active_days=ACTIVE_DAYS,
+             checkpoint_path=CHECKPOINT_PATH, rebuild_rollups=False):
+    """
+    One pass over today's active users. Resumes from the checkpoint if an
+    earlier pass today was interrupted. Returns the number of users refreshed.
+    """
+    today = datetime.now().strftime('%Y-%m-%d')
+    since = (datetime.now() - timedelta(days=active_days)).strftime('%Y-%m-%d')
+    checkpoint = load_checkpoint(checkpoint_path) if checkpoint_path else {}
+    if checkpoint.get("run_date") != today or checkpoint.get("finished"):
+        checkpoint = {"run_date": today, "after": None, "done": 0, "finished": False}
+    elif checkpoint.get("after"):
+        print(f"Resuming precompute after user {checkpoint['after']} ({checkpoint['done']} done).")
+
+    refreshed = 0
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        while True:
+            user_ids = database.get_active_user_ids(since, checkpoint["after"], batch_size)
+            if not user_ids:
+                break
+            for user_id, error in zip(user_ids, pool.map(lambda uid: _safe_precompute(uid, rebuild_rollups), user_ids)):
+                if error:
+                    print(f"Precompute failed for user {user_id}: {error}")
+                else:
+                    refreshed += 1
+            checkpoint.update(after=user_ids[-1], done=checkpoint["done"] + len(user_ids))
+            if checkpoint_path:
+                save_checkpoint(checkpoint_path, checkpoint)
+
+    checkpoint["finished"] = True
+    if checkpoint_path:
+        save_checkpoint(checkpoint_path, checkpoint)
+    return refreshed
+
+
+def _safe_precompute(user_id, rebuild_rollups):
+    try:
+        precompute_user(user_id, rebuild_rollups)
+        return None
+    except Exception as e:
+        return e
+
+
+class PrecomputeScheduler:
+    """
+    Background thread that runs run_once() nightly and refreshes a user's
+    summaries once their writes have been quiet for `debounce` seconds.
+    """
+
+    def __init__(self, nightly_at=NIGHTLY_AT, debounce=DEBOUNCE_SECONDS, poll_interval=1.0):
+        hour, minute = (int(part) for part in nightly_at.split(":")) if nightly_at else (None, None)
+        self.nightly_at = (hour, minute) if nightly_at else None
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self._dirty = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._next_nightly = None
+
+    def _schedule_nightly(self, now):
+        if not self.nightly_at:
+            return None
+        run_at = now.replace(hour=self.nightly_at[0], minute=self.nightly_at[1], second=0, microsecond=0)
+        return run_at if run_at > now else run_at + timedelta(days=1)
+
+    def on_entries_changed(self, user_id, dates):
+        with self._lock:
+            self._dirty[str(user_id)] = time.monotonic()
+
+    def start(self):
+        if self._thread is not None:
+            return self
+        if self.debounce:
+            events.on(events.ENTRIES_CHANGED, self.on_entries_changed)
+        self._next_nightly = self._schedule_nightly(datetime.now())
+        self._thread = threading.Thread(target=self._run, name="precompute-scheduler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        events.off(events.ENTRIES_CHANGED, self.on_entries_changed)
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _due_users(self):
+        cutoff = time.monotonic() - self.debounce
+        with self._lock:
+            due = [user_id for user_id, last_write in self._dirty.items() if last_write <= cutoff]
+            for user_id in due:
+                del self._dirty[user_id]
+        return due
+
+    def _run(self):
+        while not self._stop.wait(self.poll_interval):
+            for user_id in self._due_users():
+                error = _safe_precompute(user_id, False)
+                if error:
+                    print(f"Precompute failed for user {user_id}: {error}")
+            if self._next_nightly and datetime.now() >= self._next_nightly:
+                try:
+                    print(f"Nightly precompute refreshed {run_once()} users.")
+                except Exception as e:
+                    print(f"Nightly precompute failed: {e}")
+                self._next_nightly = self._schedule_nightly(datetime.now())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute day/week summaries for active users.")
+    parser.add_argument("--once", action="store_true", help="Run one pass and exit (for cron)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    parser.add_argument("--active-days", type=int, default=ACTIVE_DAYS)
+    parser.add_argument("--checkpoint", default=CHECKPOINT_PATH, help="Checkpoint file ('' disables resuming)")
+    parser.add_argument("--rollups", action="store_true", help="Also rebuild each user's daily rollups (MongoDB)")
+    args = parser.parse_args()
+
+    if not database.init_db():
+        print("No database connection.")
+        return 2
+    if args.once:
+        started = time.perf_counter()
+        count = run_once(args.batch_size, args.concurrency, args.active_days, args.checkpoint or None, args.rollups)
+        print(f"Precomputed summaries for {count} users in {time.perf_counter() - started:.1f}s.")
+        return 0
+
+    scheduler = PrecomputeScheduler().start()
+    print(f"Precompute scheduler running (nightly at {NIGHTLY_AT}, debounce {DEBOUNCE_SECONDS}s). Ctrl+C to stop.")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        scheduler.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
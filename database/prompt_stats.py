@@ -0,0 +1,181 @@
+"""
+Per-user phrase statistics behind prompts.generate_prompt.
+
+Instead of cleaning the last 30 entries and rebuilding bigram TF-IDF on every
+/api/get_prompt call, each user has one prompt_stats document that is updated
+as entries are written (ENTRY_ADDED / ENTRIES_DELETED from database/events.py):
+
+    {"count": int,                      # entries in the window
+     "topics": [{"phrase", "mood"}],    # top TF-IDF bigrams seen in 2+ entries, with their average mood
+     "latest_topics": [phrase],         # bigrams only the newest entry uses
+     "window": [{"_id", "date", "mood", "words", "phrases": {phrase: count}}],  # newest first
+     "phrases": {phrase: [df, tf_sum, mood_sum]}}
+
+The window holds the user's newest PROMPT_WINDOW entries, as the old query
+did. Adding an entry updates df/tf/mood sums for its own bigrams only;
+deleting one from a full window rebuilds it so the next older entry moves in.
+Concurrent writers are caught by the document version and fall back to a
+rebuild.
+"""
+import os
+import re
+import math
+from collections import Counter
+import database.db as database
+from database import events
+
+PROMPT_WINDOW = int(os.getenv("PROMPT_WINDOW", 30))
+
+# --- STOP WORDS ---
+STOP_WORDS = [
+    'a', 'about', 'am', 'an', 'and', 'are', 'as', 'at', 'be', 'been', 'being', 'but',
+    'by', 'can', 'did', 'do', 'does', 'doing', 'don', 'for', 'from', 'had', 'has',
+    'have', 'having', 'he', 'her', 'him', 'his', 'i', 'if', 'in', 'is', 'it', 'its',
+    'just', 'me', 'my', 'myself', 'now', 'of', 'off', 'on', 'or', 'our', 'ours',
+    's', 'she', 'should', 'so', 't', 'that', 'the', 'their', 'them', 'then',
+    'these', 'they', 'this', 'those', 'to', 'too', 'was', 'we', 'were', 'what',
+    'which', 'who', 'whom', 'will', 'with', 'you', 'your', 'yours', 'today',
+    'yesterday', 'tomorrow'
+]
+STOP_WORD_SET = frozenset(STOP_WORDS)
+
+MOOD_SCORES = {'positive': 1, 'neutral': 0, 'negative': -1}
+
+
+# --- HELPER: Find word pairs (phrases) ---
+def find_phrases(text, phrase_length=2):
+    words = text.split()
+    if len(words) < phrase_length:
+        return []
+    return [' '.join(words[i:i + phrase_length]) for i in range(len(words) - phrase_length + 1)]
+
+
+def clean_text(text):
+    return re.sub(r'[^a-zA-Z\s]', '', (text or "").lower())
+
+
+def entry_features(entry):
+    """The window item for one entry: its bigram counts, word count and mood score."""
+    doc = clean_text(entry.get("text"))
+    return {
+        "_id": str(entry["_id"]),
+        "date": entry.get("date") or "",
+        "mood": MOOD_SCORES.get(str(entry.get("mood") or "neutral").lower(), 0),
+        "words": len(doc.split()),
+        "phrases": dict(Counter(find_phrases(doc, 2))),
+    }
+
+
+def empty_stats():
+    return {"count": 0, "topics": [], "latest_topics": [], "window": [], "phrases": {}}
+
+
+def _apply(stats, item, sign):
+    phrases = stats["phrases"]
+    for phrase, count in item["phrases"].items():
+        df, tf_sum, mood_sum = phrases.get(phrase, (0, 0.0, 0))
+        df += sign
+        if df <= 0:
+            phrases.pop(phrase, None)
+            continue
+        phrases[phrase] = [df, tf_sum + sign * count / item["words"], mood_sum + sign * item["mood"]]
+
+
+def _finish(stats):
+    """Recomputes the prompt-facing fields from the phrase sums."""
+    window, phrases = stats["window"], stats["phrases"]
+    count = len(window)
+    stats["count"] = count
+
+    # Phrases of the newest entry that no other entry in the window uses
+    stats["latest_topics"] = sorted(
+        phrase for phrase in window[0]["phrases"]
+        if phrases[phrase][0] == 1 and not any(w in STOP_WORD_SET for w in phrase.split())
+    ) if count > 1 else []
+
+    # Top TF-IDF phrases: sum over entries of tf * idf is tf_sum * idf, as idf is per phrase
+    topics = []
+    if count > 2:
+        scores = {phrase: tf_sum * math.log(count / (1 + df)) for phrase, (df, tf_sum, mood_sum) in phrases.items()}
+        # Ties broken by phrase, so the result does not depend on the order entries arrived in
+        for phrase in sorted(scores, key=lambda phrase: (-round(scores[phrase], 9), phrase))[:5]:
+            df, tf_sum, mood_sum = phrases[phrase]
+            if all(w in STOP_WORD_SET for w in phrase.split()) or df < 2:
+                continue
+            topics.append({"phrase": phrase, "mood": mood_sum / df})
+    stats["topics"] = topics
+    return stats
+
+
+def _sort_key(item):
+    return (item["date"], item["_id"])
+
+
+def build_stats(entries):
+    """Stats for a list of entries (any order); keeps the newest PROMPT_WINDOW of them."""
+    stats = empty_stats()
+    items = sorted((entry_features(entry) for entry in entries if "text" in entry), key=_sort_key, reverse=True)
+    stats["window"] = items[:PROMPT_WINDOW]
+    for item in stats["window"]:
+        _apply(stats, item, 1)
+    return _finish(stats)
+
+
+def add_entry(stats, entry):
+    """Adds one entry to stats in place. Returns False if it is older than a full window (no change)."""
+    item = entry_features(entry)
+    window = stats["window"]
+    if len(window) >= PROMPT_WINDOW and _sort_key(item) <= _sort_key(window[-1]):
+        return False
+    position = next((i for i, other in enumerate(window) if _sort_key(item) > _sort_key(other)), len(window))
+    window.insert(position, item)
+    _apply(stats, item, 1)
+    while len(window) > PROMPT_WINDOW:
+        _apply(stats, window.pop(), -1)
+    _finish(stats)
+    return True
+
+
+def rebuild(user_id):
+    """Rebuilds a user's stats from their newest entries and stores them unconditionally."""
+    stats = build_stats(database.get_recent_entries(user_id, limit=PROMPT_WINDOW))
+    database.save_prompt_stats(user_id, stats)
+    return stats
+
+
+def get_prompt_topics(user_id):
+    """count/topics/latest_topics for the user, building the stats on first use."""
+    stats = database.get_prompt_stats(user_id, topics_only=True)
+    return stats if stats is not None else rebuild(user_id)
+
+
+def on_entry_added(user_id, entry):
+    stats = database.get_prompt_stats(user_id)
+    if stats is None:
+        rebuild(user_id)
+        return
+    if add_entry(stats, entry) and not database.save_prompt_stats(user_id, stats, stats["version"]):
+        rebuild(user_id)
+
+
+def on_entries_deleted(user_id, entry_ids, dates):
+    stats = database.get_prompt_stats(user_id)
+    if stats is None:
+        return
+    deleted = set(entry_ids)
+    removed = [item for item in stats["window"] if item["_id"] in deleted]
+    if not removed:
+        return
+    # A full window may have older entries that should now move in, which needs a read
+    if len(stats["window"]) >= PROMPT_WINDOW:
+        rebuild(user_id)
+        return
+    stats["window"] = [item for item in stats["window"] if item["_id"] not in deleted]
+    for item in removed:
+        _apply(stats, item, -1)
+    if not database.save_prompt_stats(user_id, _finish(stats), stats["version"]):
+        rebuild(user_id)
+
+
+events.on(events.ENTRY_ADDED, on_entry_added)
+events.on(events.ENTRIES_DELETED, on_entries_deleted)
@@ -0,0 +1,138 @@
+"""
+Per-user, per-day rollups of entries, kept in the `daily_rollups` collection.
+
+Each document holds counts and sums for one (user_id, date):
+    {user_id, date, entries, productivity_sum, mood_sum,
+     moods: {positive, neutral, negative}, tasks_total, tasks_completed}
+
+database/db.py keeps them current with $inc on every write, so charts read
+one small document per day instead of regrouping every entry.
+
+Rebuild from the entries and tasks collections (all users, or one):
+    python -m database.rollups rebuild [--user USER_ID]
+"""
+import sys
+import argparse
+from bson.objectid import ObjectId
+
+MOODS = ("positive", "neutral", "negative")
+MOOD_SCORES = {"positive": 1, "neutral": 0, "negative": -1}
+
+MOOD_NUMERIC = {"$switch": {"branches": [
+    {"case": {"$eq": ["$mood", "positive"]}, "then": 1},
+    {"case": {"$eq": ["$mood", "negative"]}, "then": -1}
+], "default": 0}}
+
+CHART_PERIODS = {
+    # period: (group key over the rollup's date string, number of buckets)
+    "daily": ("$date", 30),
+    "weekly": ({"$dateToString": {"format": "%Y-W%U", "date": {"$toDate": "$date"}}}, 12),
+    "monthly": ({"$substr": ["$date", 0, 7]}, 12),
+}
+
+
+def entry_increments(mood, productivity, sign=1, tasks_total=0, tasks_completed=0):
+    """The $inc document that adds (sign=1) or removes (sign=-1) one entry from its day's rollup."""
+    mood = mood if mood in MOOD_SCORES else "neutral"
+    return {
+        "entries": sign,
+        "productivity_sum": sign * float(productivity or 0),
+        "mood_sum": sign * MOOD_SCORES[mood],
+        f"moods.{mood}": sign,
+        "tasks_total": sign * tasks_total,
+        "tasks_completed": sign * tasks_completed,
+    }
+
+
+def apply_increments(db, user_obj_id, date, increments, session=None):
+    """Atomically applies an $inc to one day's rollup, creating it if needed."""
+    db.daily_rollups.update_one(
+        {"user_id": user_obj_id, "date": date},
+        {"$inc": increments},
+        upsert=True,
+        session=session
+    )
+
+
+def prune_empty(db, user_obj_id, dates, session=None):
+    """Drops rollups whose last entry was deleted."""
+    db.daily_rollups.delete_many(
+        {"user_id": user_obj_id, "date": {"$in": list(dates)}, "entries": {"$lte": 0}},
+        session=session
+    )
+
+
+def chart_pipeline(user_obj_id, period):
+    """Aggregation over daily_rollups producing [{label, productivity, mood}] for /api/chart_data."""
+    if period not in CHART_PERIODS:
+        raise ValueError(f"Invalid period: {period}")
+    group_id, limit = CHART_PERIODS[period]
+    return [
+        {"$match": {"user_id": user_obj_id}},
+        {"$sort": {"date": -1}},
+        # A bucket never spans more than 31 days, so this bounds the scan without cutting one short
+        {"$limit": limit * 31},
+        {"$group": {"_id": group_id, "entries": {"$sum": "$entries"},
+                    "productivity_sum": {"$sum": "$productivity_sum"}, "mood_sum": {"$sum": "$mood_sum"}}},
+        {"$match": {"entries": {"$gt": 0}}},
+        {"$sort": {"_id": -1}}, {"$limit": limit}, {"$sort": {"_id": 1}},
+        {"$project": {"_id": 0, "label": "$_id",
+                      "productivity": {"$round": [{"$divide": ["$productivity_sum", "$entries"]}, 2]},
+                      "mood": {"$round": [{"$divide": ["$mood_sum", "$entries"]}, 2]}}},
+    ]
+
+
+def rebuild_pipeline(match):
+    """Recomputes rollups from entries and tasks and $merges them into daily_rollups."""
+    return [
+        {"$match": match},
+        {"$lookup": {"from": "tasks", "localField": "_id", "foreignField": "entry_id", "as": "tasks"}},
+        {"$group": {
+            "_id": {"user_id": "$user_id", "date": "$date"},
+            "entries": {"$sum": 1},
+            "productivity_sum": {"$sum": "$productivity"},
+            "mood_sum": {"$sum": MOOD_NUMERIC},
+            "positive": {"$sum": {"$cond": [{"$eq": ["$mood", "positive"]}, 1, 0]}},
+            "negative": {"$sum": {"$cond": [{"$eq": ["$mood", "negative"]}, 1, 0]}},
+            "tasks_total": {"$sum": {"$size": "$tasks"}},
+            "tasks_completed": {"$sum": {"$size": {"$filter": {"input": "$tasks", "cond": "$$this.completed"}}}},
+        }},
+        {"$project": {
+            "_id": 0, "user_id": "$_id.user_id", "date": "$_id.date", "entries": 1,
+            "productivity_sum": 1, "mood_sum": 1, "tasks_total": 1, "tasks_completed": 1,
+            "moods": {"positive": "$positive", "negative": "$negative",
+                      "neutral": {"$subtract": ["$entries", {"$add": ["$positive", "$negative"]}]}},
+        }},
+        {"$merge": {"into": "daily_rollups", "on": ["user_id", "date"],
+                    "whenMatched": "replace", "whenNotMatched": "insert"}},
+    ]
+
+
+def rebuild_rollups(db, user_id=None):
+    """Backfills daily_rollups from scratch for one user, or for everyone."""
+    match = {"user_id": ObjectId(user_id)} if user_id else {}
+    db.daily_rollups.delete_many(match)
+    list(db.entries.aggregate(rebuild_pipeline(match), allowDiskUse=True))
+    return db.daily_rollups.count_documents(match)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the daily_rollups collection.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rebuild_cmd = sub.add_parser("rebuild", help="Recompute rollups from entries and tasks")
+    rebuild_cmd.add_argument("--user", default=None, help="Only rebuild this user's rollups")
+    args = parser.parse_args()
+
+    from database.connection import get_db
+    db = get_db()
+    if db is None:
+        print("No database connection.")
+        return 2
+    if args.command == "rebuild":
+        count = rebuild_rollups(db, args.user)
+        print(f"Rebuilt {count} daily rollups.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
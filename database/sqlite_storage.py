@@ -0,0 +1,404 @@
+"""
+Embedded SQLite backend for single-node deployments and benchmark rigs.
+
+Select it with STORAGE_BACKEND=sqlite; the file lives at SQLITE_PATH
+(default mindsync.db). The database runs in WAL mode so request threads can
+read while another thread writes, and every per-user query has a matching
+index (see SCHEMA). Ids are ObjectId hex strings, so they sort by creation
+time exactly like the MongoDB _ids and the same cursors and templates work.
+"""
+import os
+import json
+import math
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from bson.objectid import ObjectId
+from database.storage import Storage
+from database.history import HISTORY_MAX_ENTRIES, parse_cursor
+from database.rollups import CHART_PERIODS
+from database.summary_stats import make_stats, period_start_date
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    _id TEXT PRIMARY KEY,
+    email TEXT NOT NULL UNIQUE,
+    password TEXT
+);
+CREATE TABLE IF NOT EXISTS entries (
+    _id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    date TEXT NOT NULL,
+    text TEXT,
+    mood TEXT,
+    productivity REAL,
+    job_id TEXT
+);
+-- Every entries query filters on user_id and orders or ranges on (date, _id); carrying
+-- mood and productivity lets the history and chart queries run from the index alone
+CREATE INDEX IF NOT EXISTS entries_user_date_id ON entries (user_id, date, _id, mood, productivity);
+-- Active-user scans for the precompute job (database/precompute.py)
+CREATE INDEX IF NOT EXISTS entries_date_user ON entries (date, user_id);
+CREATE TABLE IF NOT EXISTS tasks (
+    _id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    entry_id TEXT NOT NULL REFERENCES entries (_id) ON DELETE CASCADE,
+    task_text TEXT,
+    status TEXT,
+    completed INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS tasks_user_entry ON tasks (user_id, entry_id);
+CREATE INDEX IF NOT EXISTS tasks_user_completed_recent ON tasks (user_id, completed, _id);
+CREATE INDEX IF NOT EXISTS tasks_user_recent ON tasks (user_id, _id);
+CREATE INDEX IF NOT EXISTS tasks_entry ON tasks (entry_id);
+CREATE TABLE IF NOT EXISTS summaries (
+    user_id TEXT NOT NULL,
+    period TEXT NOT NULL,
+    summary TEXT,
+    as_of TEXT,
+    created_at TEXT,
+    version INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, period)
+);
+-- Phrase statistics for prompts.py: the small topics part is read per prompt, the state (per-entry window) only on writes
+CREATE TABLE IF NOT EXISTS prompt_stats (
+    user_id TEXT PRIMARY KEY,
+    topics TEXT,
+    state TEXT,
+    version INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+# The prompt_stats fields kept in the topics column; everything else goes in state
+PROMPT_TOPIC_FIELDS = ("count", "topics", "latest_topics")
+
+# Most days a chart bucket can span, to bound how many daily sums are read
+BUCKET_DAYS = {"daily": 1, "weekly": 7, "monthly": 31}
+
+MOOD_SCORE_SQL = "CASE mood WHEN 'positive' THEN 1 WHEN 'negative' THEN -1 ELSE 0 END"
+
+
+def _new_id():
+    return str(ObjectId())
+
+
+def _task(row):
+    task = dict(row)
+    task["completed"] = bool(task["completed"])
+    return task
+
+
+def _chart_label(date, period):
+    if period == "weekly":
+        # Same week numbering as $dateToString's %Y-W%U in rollups.CHART_PERIODS
+        return datetime.strptime(date, '%Y-%m-%d').strftime('%Y-W%U')
+    if period == "monthly":
+        return date[:7]
+    return date
+
+
+class SQLiteStorage(Storage):
+    """One connection per thread (and per process, so it is fork-safe) to a WAL-mode SQLite file."""
+    name = "sqlite"
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv("SQLITE_PATH", "mindsync.db")
+        self._local = threading.local()
+        self._schema_pid = None
+        self._lock = threading.Lock()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        # isolation_level=None: statements autocommit unless _transaction() opens one
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        with self._lock:
+            if self._schema_pid != os.getpid():
+                conn.executescript(SCHEMA)
+                self._migrate(conn)
+                self._schema_pid = os.getpid()
+        self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def _migrate(self, conn):
+        """Adds columns introduced after a database file was first created."""
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(summaries)")}
+        if "version" not in columns:
+            conn.execute("ALTER TABLE summaries ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(entries)")}
+        if "job_id" not in columns:
+            conn.execute("ALTER TABLE entries ADD COLUMN job_id TEXT")
+        # One entry per background job (get_entry_for_job); created here since older files lack the column
+        conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS entries_job ON entries (job_id) WHERE job_id IS NOT NULL")
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._conn()
+        # IMMEDIATE takes the write lock up front, so concurrent writers wait instead of failing to upgrade
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _all(self, sql, params=()):
+        return [dict(row) for row in self._conn().execute(sql, params)]
+
+    def _one(self, sql, params=()):
+        row = self._conn().execute(sql, params).fetchone()
+        return dict(row) if row else None
+
+    def init(self):
+        try:
+            self._conn()
+            return True
+        except sqlite3.Error as e:
+            print(f"Error opening SQLite database {self.path}: {e}")
+            return False
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    # --- Users ---
+    def find_user_by_email(self, email):
+        return self._one("SELECT * FROM users WHERE email = ?", (email,))
+
+    def find_user_by_id(self, user_id):
+        return self._one("SELECT * FROM users WHERE _id = ?", (str(user_id),))
+
+    def create_user(self, email, password_hash):
+        user_id = _new_id()
+        self._conn().execute("INSERT INTO users (_id, email, password) VALUES (?, ?, ?)",
+                             (user_id, email, password_hash))
+        return user_id
+
+    # --- Writes ---
+    def add_entry(self, user_id, date, text, mood, productivity):
+        return self.add_entry_with_tasks(user_id, date, text, mood, productivity, [])
+
+    def add_task(self, user_id, entry_id, task_text):
+        self._conn().execute(
+            "INSERT INTO tasks (_id, user_id, entry_id, task_text, status, completed) VALUES (?, ?, ?, ?, 'pending', 0)",
+            (_new_id(), str(user_id), str(entry_id), task_text))
+
+    def add_entry_with_tasks(self, user_id, date, text, mood, productivity, tasks, job_id=None):
+        entry_id = _new_id()
+        with self._transaction() as conn:
+            conn.execute("INSERT INTO entries (_id, user_id, date, text, mood, productivity, job_id) "
+                         "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                         (entry_id, str(user_id), date, text, mood, productivity, job_id))
+            conn.executemany(
+                "INSERT INTO tasks (_id, user_id, entry_id, task_text, status, completed) VALUES (?, ?, ?, ?, 'pending', 0)",
+                [(_new_id(), str(user_id), entry_id, task_text) for task_text in tasks or []])
+        return entry_id
+
+    def get_entry_for_job(self, user_id, job_id):
+        entry = self._one("SELECT _id, mood, productivity FROM entries WHERE user_id = ? AND job_id = ?",
+                          (str(user_id), job_id))
+        if entry is None: return None
+        entry["tasks"] = [row["task_text"] for row in self._all(
+            "SELECT task_text FROM tasks WHERE entry_id = ? ORDER BY _id", (entry["_id"],))]
+        return entry
+
+    def update_task_status(self, user_id, task_id, completed):
+        # Security: Ensure the user owns the task they are trying to update
+        with self._transaction() as conn:
+            changed = conn.execute("UPDATE tasks SET completed = ? WHERE _id = ? AND user_id = ? AND completed != ?",
+                                   (1 if completed else 0, str(task_id), str(user_id), 1 if completed else 0)).rowcount
+            if not changed:
+                return None
+            row = conn.execute("SELECT e.date FROM tasks t JOIN entries e ON e._id = t.entry_id WHERE t._id = ?",
+                               (str(task_id),)).fetchone()
+        return row["date"] if row else None
+
+    def delete_entries_and_tasks(self, user_id, entry_ids):
+        valid_ids = [eid for eid in entry_ids or [] if eid and len(eid) == 24]
+        if not valid_ids: return []
+        placeholders = ",".join("?" * len(valid_ids))
+        with self._transaction() as conn:
+            dates = [row["date"] for row in conn.execute(
+                f"SELECT DISTINCT date FROM entries WHERE user_id = ? AND _id IN ({placeholders})",
+                [str(user_id)] + valid_ids)]
+            conn.execute(f"DELETE FROM tasks WHERE user_id = ? AND entry_id IN ({placeholders})",
+                         [str(user_id)] + valid_ids)
+            conn.execute(f"DELETE FROM entries WHERE user_id = ? AND _id IN ({placeholders})",
+                         [str(user_id)] + valid_ids)
+        return sorted(dates)
+
+    # --- Reads ---
+    def get_all_entries_sorted_asc(self, user_id):
+        return self._all("SELECT * FROM entries WHERE user_id = ? ORDER BY date", (str(user_id),))
+
+    def get_pending_tasks(self, user_id):
+        return [_task(row) for row in self._all(
+            "SELECT * FROM tasks WHERE user_id = ? AND completed = 0", (str(user_id),))]
+
+    def get_tasks_with_entry_info(self, user_id, completed_status=None, limit=5):
+        sql = "SELECT t.task_text, e.date FROM tasks t JOIN entries e ON e._id = t.entry_id WHERE t.user_id = ?"
+        params = [str(user_id)]
+        if completed_status is not None:
+            sql += " AND t.completed = ?"
+            params.append(1 if completed_status else 0)
+        return self._all(sql + " ORDER BY t._id DESC LIMIT ?", params + [limit])
+
+    def _daily_sums(self, user_id, limit):
+        # Newest `limit` days with entries; GROUP BY date walks the (user_id, date, _id) index in order
+        return self._all(
+            f"SELECT date, COUNT(*) AS entries, SUM(productivity) AS productivity_sum, "
+            f"SUM({MOOD_SCORE_SQL}) AS mood_sum FROM entries WHERE user_id = ? "
+            f"GROUP BY date ORDER BY date DESC LIMIT ?", (str(user_id), limit))
+
+    def get_chart_data(self, user_id, limit=30):
+        return [
+            {"date": day["date"], "avg_productivity": (day["productivity_sum"] or 0) / day["entries"],
+             "avg_mood": day["mood_sum"] / day["entries"]}
+            for day in reversed(self._daily_sums(user_id, limit))
+        ]
+
+    def get_rollup_chart_data(self, user_id, period):
+        if period not in CHART_PERIODS:
+            raise ValueError(f"Invalid period: {period}")
+        limit = CHART_PERIODS[period][1]
+        buckets = {}
+        for day in self._daily_sums(user_id, limit * BUCKET_DAYS[period]):
+            bucket = buckets.setdefault(_chart_label(day["date"], period), [0, 0.0, 0])
+            bucket[0] += day["entries"]
+            bucket[1] += day["productivity_sum"] or 0
+            bucket[2] += day["mood_sum"]
+        labels = sorted(buckets)[-limit:]
+        return [
+            {"label": label, "productivity": round(buckets[label][1] / buckets[label][0], 2),
+             "mood": round(buckets[label][2] / buckets[label][0], 2)}
+            for label in labels
+        ]
+
+    def get_tasks_for_entry_ids(self, user_id, entry_ids):
+        if not entry_ids: return []
+        entry_ids = [str(eid) for eid in entry_ids]
+        placeholders = ",".join("?" * len(entry_ids))
+        return [_task(row) for row in self._all(
+            f"SELECT * FROM tasks WHERE user_id = ? AND entry_id IN ({placeholders})", [str(user_id)] + entry_ids)]
+
+    def get_entries_and_tasks_for_date(self, user_id, date):
+        entries = self._all(
+            "SELECT _id, text AS journal_text, mood, productivity FROM entries "
+            "WHERE user_id = ? AND date = ? ORDER BY _id", (str(user_id), date))
+        by_entry = {entry["_id"]: entry for entry in entries}
+        for entry in entries:
+            entry["tasks"] = []
+        for task in self.get_tasks_for_entry_ids(user_id, list(by_entry)):
+            by_entry[task["entry_id"]]["tasks"].append(task)
+        return entries
+
+    def get_entries_for_period(self, user_id, days=7):
+        start_date_str = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
+        return self._all("SELECT * FROM entries WHERE user_id = ? AND date >= ? ORDER BY date",
+                         (str(user_id), start_date_str))
+
+    def get_summary_stats(self, user_id, days=7):
+        params = (str(user_id), period_start_date(days))
+        row = self._one(
+            "SELECT COUNT(*) AS entries, SUM(lower(mood) = 'positive') AS positive, "
+            "SUM(lower(mood) = 'negative') AS negative, AVG(productivity) AS mean, "
+            "AVG(productivity * productivity) AS mean_sq FROM entries WHERE user_id = ? AND date >= ?", params)
+        tasks = self._one(
+            "SELECT COUNT(*) AS total, SUM(t.completed) AS completed FROM entries e "
+            "JOIN tasks t ON t.entry_id = e._id WHERE e.user_id = ? AND e.date >= ?", params)
+        mean = row["mean"] or 0.0
+        # Population variance as E[x^2] - E[x]^2, clamped against rounding below zero
+        pstdev = math.sqrt(max(0.0, (row["mean_sq"] or 0.0) - mean * mean))
+        return make_stats(row["entries"], row["positive"], row["negative"], mean, pstdev,
+                          tasks["total"], tasks["completed"])
+
+    def get_recent_entries(self, user_id, limit=30):
+        if user_id:
+            return self._all("SELECT * FROM entries WHERE user_id = ? ORDER BY date DESC, _id DESC LIMIT ?",
+                             (str(user_id), limit))
+        return self._all("SELECT * FROM entries ORDER BY date DESC, _id DESC LIMIT ?", (limit,))
+
+    def get_entry_ids(self, user_id):
+        return [row["_id"] for row in self._all("SELECT _id FROM entries WHERE user_id = ?", (str(user_id),))]
+
+    def get_entries_by_ids(self, user_id, entry_ids):
+        entry_ids = [str(entry_id) for entry_id in entry_ids]
+        if not entry_ids: return []
+        return self._all(
+            f"SELECT * FROM entries WHERE user_id = ? AND _id IN ({','.join('?' * len(entry_ids))})",
+            [str(user_id)] + entry_ids)
+
+    def get_history_rows(self, user_id, cursor=None, limit=HISTORY_MAX_ENTRIES + 1):
+        sql = "SELECT _id, date, mood, productivity FROM entries WHERE user_id = ?"
+        params = [str(user_id)]
+        if cursor:
+            date, entry_id = parse_cursor(cursor)
+            sql += " AND (date, _id) < (?, ?)"
+            params += [date, str(entry_id)]
+        return self._all(sql + " ORDER BY date DESC, _id DESC LIMIT ?", params + [limit])
+
+    def get_active_user_ids(self, since_date, after=None, limit=100):
+        return [row["user_id"] for row in self._all(
+            "SELECT DISTINCT user_id FROM entries WHERE date >= ? AND user_id > ? ORDER BY user_id LIMIT ?",
+            (since_date, str(after or ""), limit))]
+
+    # --- Prompt statistics ---
+    def get_prompt_stats(self, user_id, topics_only=False):
+        columns = "topics, version" if topics_only else "topics, state, version"
+        row = self._one(f"SELECT {columns} FROM prompt_stats WHERE user_id = ?", (str(user_id),))
+        if row is None:
+            return None
+        stats = json.loads(row["topics"])
+        if not topics_only:
+            stats.update(json.loads(row["state"]))
+        stats["version"] = row["version"]
+        return stats
+
+    def save_prompt_stats(self, user_id, stats, expected_version=None):
+        topics = {key: stats[key] for key in PROMPT_TOPIC_FIELDS}
+        state = {key: value for key, value in stats.items() if key not in PROMPT_TOPIC_FIELDS and key != "version"}
+        cursor = self._conn().execute(
+            "INSERT INTO prompt_stats (user_id, topics, state, version) VALUES (?, ?, ?, 1) "
+            "ON CONFLICT (user_id) DO UPDATE SET topics = excluded.topics, state = excluded.state, "
+            "version = version + 1 WHERE ? IS NULL OR version = ?",
+            (str(user_id), json.dumps(topics), json.dumps(state), expected_version, expected_version))
+        return cursor.rowcount == 1
+
+    # --- Summaries ---
+    def save_summary_to_cache(self, user_id, period, summary_data, as_of=None, expected_version=None):
+        cursor = self._conn().execute(
+            "INSERT INTO summaries (user_id, period, summary, as_of, created_at) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (user_id, period) DO UPDATE SET summary = excluded.summary, "
+            "as_of = excluded.as_of, created_at = excluded.created_at WHERE ? IS NULL OR version = ?",
+            (str(user_id), period, json.dumps(summary_data), as_of, datetime.utcnow().isoformat(),
+             expected_version, expected_version))
+        return cursor.rowcount == 1
+
+    def get_summary_from_cache(self, user_id, period, max_age_hours=6, as_of=None):
+        cached = self._one("SELECT summary, as_of, created_at FROM summaries WHERE user_id = ? AND period = ?",
+                           (str(user_id), period))
+        if cached and cached["created_at"] and (as_of is None or cached["as_of"] == as_of):
+            cache_age = datetime.utcnow() - datetime.fromisoformat(cached["created_at"])
+            if cache_age < timedelta(hours=max_age_hours):
+                return json.loads(cached["summary"])
+        return None
+
+    def get_summary_version(self, user_id, period):
+        row = self._one("SELECT version FROM summaries WHERE user_id = ? AND period = ?", (str(user_id), period))
+        return row["version"] if row else 0
+
+    def invalidate_summaries(self, user_id, periods):
+        self._conn().executemany(
+            "INSERT INTO summaries (user_id, period, version) VALUES (?, ?, 1) "
+            "ON CONFLICT (user_id, period) DO UPDATE SET summary = NULL, as_of = NULL, created_at = NULL, "
+            "version = version + 1",
+            [(str(user_id), period) for period in periods])
@@ -0,0 +1,166 @@
+"""
+The storage interface behind database/db.py.
+
+Every operation the app performs on users, entries, tasks and summaries is a
+method here. database/mongo_storage.py implements it on MongoDB and
+database/sqlite_storage.py on an embedded SQLite file. STORAGE_BACKEND
+selects one (see database/db.py).
+
+Both return the same shapes: documents are dicts keyed like the MongoDB
+documents ("_id", "user_id", "date", "text", ...), so templates and the NLP
+code do not care which backend produced them.
+"""
+from database.dashboard import build_dashboard_view
+from database.history import HISTORY_MAX_ENTRIES
+
+
+class Storage:
+    name = None
+
+    def init(self):
+        """Connects and prepares the schema/indexes. Returns False if the store is unreachable."""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    # --- Users ---
+    def find_user_by_email(self, email):
+        raise NotImplementedError
+
+    def find_user_by_id(self, user_id):
+        raise NotImplementedError
+
+    def create_user(self, email, password_hash):
+        """Returns the new user's id."""
+        raise NotImplementedError
+
+    # --- Writes ---
+    def add_entry(self, user_id, date, text, mood, productivity):
+        """Returns the new entry's id."""
+        raise NotImplementedError
+
+    def add_task(self, user_id, entry_id, task_text):
+        raise NotImplementedError
+
+    def add_entry_with_tasks(self, user_id, date, text, mood, productivity, tasks, job_id=None):
+        """
+        Writes an entry and its tasks atomically. Returns the new entry's id.
+        `job_id` marks the entry as the result of that job; a second entry for the same job is rejected.
+        """
+        raise NotImplementedError
+
+    def get_entry_for_job(self, user_id, job_id):
+        """{_id, mood, productivity, tasks: [task_text, ...]} of the entry saved by a job, or None."""
+        raise NotImplementedError
+
+    def update_task_status(self, user_id, task_id, completed):
+        """Returns the date of the task's entry if the status changed, else None."""
+        raise NotImplementedError
+
+    def delete_entries_and_tasks(self, user_id, entry_ids):
+        """Returns the dates that lost entries."""
+        raise NotImplementedError
+
+    # --- Reads ---
+    def get_all_entries_sorted_asc(self, user_id):
+        raise NotImplementedError
+
+    def get_pending_tasks(self, user_id):
+        raise NotImplementedError
+
+    def get_tasks_with_entry_info(self, user_id, completed_status=None, limit=5):
+        """Newest tasks first as [{task_text, date}], optionally only (not) completed ones."""
+        raise NotImplementedError
+
+    def get_chart_data(self, user_id, limit=30):
+        """[{date, avg_productivity, avg_mood}] for the last `limit` days with entries, oldest first."""
+        raise NotImplementedError
+
+    def get_rollup_chart_data(self, user_id, period):
+        """[{label, productivity, mood}] for 'daily', 'weekly' or 'monthly' buckets, oldest first."""
+        raise NotImplementedError
+
+    def get_tasks_for_entry_ids(self, user_id, entry_ids):
+        raise NotImplementedError
+
+    def get_entries_and_tasks_for_date(self, user_id, date):
+        """[{_id, journal_text, mood, productivity, tasks: [task, ...]}] for one day."""
+        raise NotImplementedError
+
+    def get_entries_for_period(self, user_id, days=7):
+        raise NotImplementedError
+
+    def get_summary_stats(self, user_id, days=7):
+        """The stats document described in database/summary_stats.py for the last `days` days."""
+        raise NotImplementedError
+
+    def get_recent_entries(self, user_id, limit=30):
+        """The user's newest entries, full text included."""
+        raise NotImplementedError
+
+    def get_entry_ids(self, user_id):
+        """Ids (as strings) of all the user's entries; answered from an index, no documents read."""
+        raise NotImplementedError
+
+    def get_entries_by_ids(self, user_id, entry_ids):
+        """The user's entries among entry_ids, full text included, in no particular order."""
+        raise NotImplementedError
+
+    def get_history_rows(self, user_id, cursor=None, limit=HISTORY_MAX_ENTRIES + 1):
+        """Entries older than the cursor in (date, _id) order, newest first, as {_id, date, mood, productivity}."""
+        raise NotImplementedError
+
+    def get_dashboard_data(self, user_id):
+        """Template context for index.html. Backends with a cheaper single-query form override this."""
+        return build_dashboard_view({
+            "history": self.get_history_rows(user_id),
+            "pending_tasks": self.get_pending_tasks(user_id),
+            "recent_tasks": self.get_tasks_with_entry_info(user_id, None),
+            "completed_tasks": self.get_tasks_with_entry_info(user_id, True),
+            "chart_data": self.get_chart_data(user_id),
+        })
+
+    def get_active_user_ids(self, since_date, after=None, limit=100):
+        """Ids (as strings, ascending) of users with entries on or after since_date, starting after `after`."""
+        raise NotImplementedError
+
+    # --- Prompt statistics ---
+    def get_prompt_stats(self, user_id, topics_only=False):
+        """
+        The stats document from database/prompt_stats.py plus its "version", or None.
+        topics_only leaves out the per-entry window, which only writes need.
+        """
+        raise NotImplementedError
+
+    def save_prompt_stats(self, user_id, stats, expected_version=None):
+        """Upserts the stats document and bumps its version; False if expected_version no longer matches."""
+        raise NotImplementedError
+
+    # --- Summaries ---
+    def save_summary_to_cache(self, user_id, period, summary_data, as_of=None, expected_version=None):
+        """
+        `as_of` records the day the summary was built for; see database/summary_cache.py.
+        With expected_version, saves only if no write invalidated the summary since
+        get_summary_version() returned it. Returns True if saved.
+        """
+        raise NotImplementedError
+
+    def get_summary_from_cache(self, user_id, period, max_age_hours=6, as_of=None):
+        raise NotImplementedError
+
+    def get_summary_version(self, user_id, period):
+        """How many times invalidate_summaries() has cleared this summary (0 if never)."""
+        raise NotImplementedError
+
+    def invalidate_summaries(self, user_id, periods):
+        """Clears the user's summaries for `periods` and bumps their versions."""
+        raise NotImplementedError
+
+    # --- Backend-specific ---
+    def get_nlp_cache_collection(self):
+        """The MongoDB collection for the NLP cache's persistent tier, or None if this backend has none."""
+        return None
+
+    def execute_aggregation(self, user_id, collection_name, pipeline):
+        raise NotImplementedError(f"The {self.name} backend does not run MongoDB aggregation pipelines.")
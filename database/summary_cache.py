@@ -0,0 +1,152 @@
+"""
+Two-tier cache for /api/get_summary: a bounded in-process LRU in front of the
+summaries collection (or table).
+
+A summary covers the last N days counted from today, so cached summaries are
+keyed by the day they were built for and go stale at midnight on their own.
+Within a day, writes invalidate them precisely: database/db.py emits
+ENTRIES_CHANGED with the dates a write touched, and every period whose window
+contains one of those dates is dropped from both tiers. Dropping a summary
+bumps its version in the store, and a summary is only saved if the version it
+was built under is still current, so a summary built by any process while a
+write landed is never stored. The in-process tier also expires after
+SUMMARY_CACHE_TTL seconds, which bounds how long another worker process can
+serve a summary after a write it did not see.
+"""
+import os
+import time
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import database.db as database
+from database import events
+from nlp.summarizer import generate_rule_based_summary
+
+# period -> number of days back from today, as passed to get_entries_for_period
+SUMMARY_PERIODS = {"day": 1, "week": 7}
+
+
+def period_start(period, now=None):
+    """The oldest entry date included in a summary for `period`, matching get_entries_for_period."""
+    now = now or datetime.now()
+    return (now - timedelta(days=SUMMARY_PERIODS[period])).strftime('%Y-%m-%d')
+
+
+def periods_covering(dates, now=None):
+    """The summary periods whose window contains any of `dates`."""
+    now = now or datetime.now()
+    latest = max(dates, default=None)
+    return [period for period in SUMMARY_PERIODS if latest is not None and latest >= period_start(period, now)]
+
+
+def build_summary(user_id, period):
+    """Computes a fresh summary for one user and period from the database's summary stats."""
+    return generate_rule_based_summary(database.get_summary_stats(user_id, days=SUMMARY_PERIODS[period]))
+
+
+class SummaryCache:
+    """(user_id, period, as_of day) -> summary, with hit counters per tier."""
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped on every invalidation so a summary saved just before one is not kept in this process's tier
+        self._generations = {}
+        self.memory_hits = 0
+        self.store_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _remember(self, key, summary):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, summary)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get(self, user_id, period, build=None):
+        """
+        Returns (summary, status) where status is "memory", "store" or "miss".
+        On a miss, build() (default: build_summary) produces the summary; results
+        with an "error" key are not cached.
+        """
+        build = build or (lambda: build_summary(user_id, period))
+        as_of = datetime.now().strftime('%Y-%m-%d')
+        key = (str(user_id), period, as_of)
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None and item[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                return item[1], "memory"
+            generation = self._generations.get(key[0], 0)
+
+        summary = database.get_summary_from_cache(user_id, period, as_of=as_of)
+        if summary is not None:
+            self.store_hits += 1
+            self._remember(key, summary)
+            return summary, "store"
+
+        self.misses += 1
+        version = database.get_summary_version(user_id, period)
+        return self._store(key, build(), version, generation), "miss"
+
+    def refresh(self, user_id, period, build=None):
+        """Rebuilds and stores a summary without a cache lookup (used by the precompute job). Returns it."""
+        key = (str(user_id), period, datetime.now().strftime('%Y-%m-%d'))
+        with self._lock:
+            generation = self._generations.get(key[0], 0)
+        version = database.get_summary_version(user_id, period)
+        summary = build() if build else build_summary(user_id, period)
+        return self._store(key, summary, version, generation)
+
+    def _store(self, key, summary, version, generation):
+        # The save is skipped if a write (in any process) invalidated the summary while it was being built
+        if "error" not in summary and database.save_summary_to_cache(
+                key[0], key[1], summary, as_of=key[2], expected_version=version):
+            with self._lock:
+                current = self._generations.get(key[0], 0) == generation
+            if current:
+                self._remember(key, summary)
+        return summary
+
+    def invalidate(self, user_id, dates):
+        """Drops the user's cached summaries whose window contains any of `dates`, in both tiers."""
+        user_id = str(user_id)
+        periods = periods_covering(dates)
+        if not periods:
+            return
+        with self._lock:
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            for key in [key for key in self._entries if key[0] == user_id and key[1] in periods]:
+                del self._entries[key]
+        self.invalidations += 1
+        database.invalidate_summaries(user_id, periods)
+
+    def on_entries_changed(self, user_id, dates):
+        self.invalidate(user_id, dates)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        lookups = self.memory_hits + self.store_hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "memory_hits": self.memory_hits,
+            "store_hits": self.store_hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "hit_rate": round((self.memory_hits + self.store_hits) / lookups, 4) if lookups else 0.0,
+        }
+
+
+summary_cache = SummaryCache(
+    maxsize=int(os.getenv("SUMMARY_CACHE_SIZE", 1024)),
+    ttl=float(os.getenv("SUMMARY_CACHE_TTL", 60)),
+)
+events.on(events.ENTRIES_CHANGED, summary_cache.on_entries_changed)
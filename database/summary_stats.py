@@ -0,0 +1,57 @@
+"""
+The numbers behind a wellness summary, computed by the database.
+
+generate_rule_based_summary() only needs mood counts, the mean and
+population standard deviation of productivity and task completion counts,
+so the storage backends return this one small document instead of every
+entry in the period:
+
+    {"entries": int, "moods": {"positive": int, "neutral": int, "negative": int},
+     "productivity_mean": float, "productivity_pstdev": float,
+     "tasks_total": int, "tasks_completed": int}
+"""
+from datetime import datetime, timedelta
+
+
+def period_start_date(days):
+    """Oldest entry date in a summary over the last `days` days, as used by get_entries_for_period."""
+    return (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
+
+
+def empty_stats():
+    return {"entries": 0, "moods": {"positive": 0, "neutral": 0, "negative": 0},
+            "productivity_mean": 0.0, "productivity_pstdev": 0.0, "tasks_total": 0, "tasks_completed": 0}
+
+
+def make_stats(entries, positive, negative, productivity_mean, productivity_pstdev, tasks_total, tasks_completed):
+    """Builds the stats document; moods other than positive/negative count as neutral, as in the summarizer."""
+    if not entries:
+        return empty_stats()
+    return {
+        "entries": int(entries),
+        "moods": {"positive": int(positive or 0), "negative": int(negative or 0),
+                  "neutral": int(entries - (positive or 0) - (negative or 0))},
+        "productivity_mean": float(productivity_mean or 0),
+        "productivity_pstdev": float(productivity_pstdev or 0) if entries > 1 else 0.0,
+        "tasks_total": int(tasks_total or 0),
+        "tasks_completed": int(tasks_completed or 0),
+    }
+
+
+def summary_stats_pipeline(user_obj_id, start_date):
+    """Aggregation over entries (joined to their tasks) that returns at most one stats document."""
+    return [
+        {"$match": {"user_id": user_obj_id, "date": {"$gte": start_date}}},
+        {"$lookup": {"from": "tasks", "localField": "_id", "foreignField": "entry_id", "as": "tasks"}},
+        {"$group": {
+            "_id": None,
+            "entries": {"$sum": 1},
+            "positive": {"$sum": {"$cond": [{"$eq": [{"$toLower": "$mood"}, "positive"]}, 1, 0]}},
+            "negative": {"$sum": {"$cond": [{"$eq": [{"$toLower": "$mood"}, "negative"]}, 1, 0]}},
+            "productivity_mean": {"$avg": "$productivity"},
+            "productivity_pstdev": {"$stdDevPop": "$productivity"},
+            "tasks_total": {"$sum": {"$size": "$tasks"}},
+            "tasks_completed": {"$sum": {"$size": {"$filter": {"input": "$tasks", "cond": "$$this.completed"}}}},
+        }},
+        {"$project": {"_id": 0}},
+    ]
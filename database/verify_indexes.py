@@ -0,0 +1,288 @@
+"""
+Runs explain() on every query issued by database/mongo_storage.py (with database/dashboard.py,
+database/history.py and database/rollups.py behind it) and database/job_queue.py, and fails if
+any of them would scan a whole collection.
+
+The queries are not copied here: CALLS runs the real storage and job queue methods against a
+recording stand-in for the database, which captures each filter, sort and pipeline without
+reading or writing anything, and those captured queries are explained against the real
+database. Every public method of MongoStorage and MongoJobQueue must appear in CALLS or
+UNCHECKED, so a new method cannot go unverified.
+
+Usage (from the project root, with MONGO_CLUSTER_URL set):
+    python -m database.verify_indexes
+
+Exits with status 1 if a COLLSCAN is found. MongoDB backend only.
+"""
+import sys
+from types import SimpleNamespace
+from bson.objectid import ObjectId
+from database.connection import connection, get_db
+from database.mongo_storage import MongoStorage
+from database.job_queue import MongoJobQueue
+
+# Placeholder values: the planner picks the same plan whatever the ids are
+USER_ID = str(ObjectId())
+ENTRY_ID = str(ObjectId())
+TASK_ID = str(ObjectId())
+JOB_ID = "0" * 32
+DATE = "2024-01-01"
+
+# Documents a read returns while recording, per collection, for methods whose later
+# queries only run when an earlier one found something
+FIXTURES = {
+    "tasks": [{"_id": ObjectId(TASK_ID), "entry_id": ObjectId(ENTRY_ID), "task_text": "task", "completed": False}],
+    "entries": [{"_id": ObjectId(ENTRY_ID), "date": DATE, "mood": "positive", "productivity": 0.5}],
+}
+
+# (name, call, fixtures): name starts with the method it checks
+CALLS = [
+    ("find_user_by_email", lambda s, q: s.find_user_by_email("someone@example.com"), None),
+    ("find_user_by_id", lambda s, q: s.find_user_by_id(USER_ID), None),
+    ("add_entry", lambda s, q: s.add_entry(USER_ID, DATE, "text", "positive", 0.5), None),
+    ("add_entry_with_tasks", lambda s, q: s.add_entry_with_tasks(USER_ID, DATE, "text", "positive", 0.5, ["task"]), None),
+    ("get_entry_for_job", lambda s, q: s.get_entry_for_job(USER_ID, JOB_ID), FIXTURES),
+    ("update_task_status", lambda s, q: s.update_task_status(USER_ID, TASK_ID, True), FIXTURES),
+    ("delete_entries_and_tasks", lambda s, q: s.delete_entries_and_tasks(USER_ID, [ENTRY_ID]), FIXTURES),
+    ("get_all_entries_sorted_asc", lambda s, q: s.get_all_entries_sorted_asc(USER_ID), None),
+    ("get_pending_tasks", lambda s, q: s.get_pending_tasks(USER_ID), None),
+    ("get_tasks_with_entry_info(all)", lambda s, q: s.get_tasks_with_entry_info(USER_ID), None),
+    ("get_tasks_with_entry_info(completed)", lambda s, q: s.get_tasks_with_entry_info(USER_ID, True), None),
+    ("get_chart_data", lambda s, q: s.get_chart_data(USER_ID), None),
+    ("get_rollup_chart_data", lambda s, q: s.get_rollup_chart_data(USER_ID, "weekly"), None),
+    ("get_tasks_for_entry_ids", lambda s, q: s.get_tasks_for_entry_ids(USER_ID, [ObjectId(ENTRY_ID)]), None),
+    ("get_entries_and_tasks_for_date", lambda s, q: s.get_entries_and_tasks_for_date(USER_ID, DATE), None),
+    ("get_entries_for_period", lambda s, q: s.get_entries_for_period(USER_ID), None),
+    ("get_summary_stats", lambda s, q: s.get_summary_stats(USER_ID), None),
+    ("get_recent_entries", lambda s, q: s.get_recent_entries(USER_ID), None),
+    ("get_entry_ids", lambda s, q: s.get_entry_ids(USER_ID), None),
+    ("get_entries_by_ids", lambda s, q: s.get_entries_by_ids(USER_ID, [ENTRY_ID]), None),
+    ("get_history_rows", lambda s, q: s.get_history_rows(USER_ID), None),
+    ("get_history_rows(cursor)", lambda s, q: s.get_history_rows(USER_ID, f"{DATE}.{ENTRY_ID}"), None),
+    ("get_dashboard_data", lambda s, q: s.get_dashboard_data(USER_ID), None),
+    ("get_active_user_ids", lambda s, q: s.get_active_user_ids(DATE, after=USER_ID), None),
+    ("get_prompt_stats", lambda s, q: s.get_prompt_stats(USER_ID), None),
+    ("save_prompt_stats", lambda s, q: s.save_prompt_stats(USER_ID, {"count": 0}, expected_version=1), None),
+    ("save_summary_to_cache", lambda s, q: s.save_summary_to_cache(USER_ID, "week", {}, DATE, 0), None),
+    ("get_summary_from_cache", lambda s, q: s.get_summary_from_cache(USER_ID, "week"), None),
+    ("get_summary_version", lambda s, q: s.get_summary_version(USER_ID, "week"), None),
+    ("invalidate_summaries", lambda s, q: s.invalidate_summaries(USER_ID, ["day", "week"]), None),
+    ("job_queue.claim", lambda s, q: q.claim(), None),
+    ("job_queue.abandon", lambda s, q: q.abandon(), None),
+    ("job_queue.progress", lambda s, q: q.progress(JOB_ID, 1, "stage", 50), None),
+    ("job_queue.complete", lambda s, q: q.complete(JOB_ID, 1, {}), None),
+    ("job_queue.retry", lambda s, q: q.retry(JOB_ID, 1, "error", 10), None),
+    ("job_queue.fail", lambda s, q: q.fail(JOB_ID, 1, "error"), None),
+    ("job_queue.get", lambda s, q: q.get(JOB_ID), None),
+    ("job_queue.counts", lambda s, q: q.counts(), None),
+]
+
+# Public methods deliberately not explained, with the reason
+UNCHECKED = {
+    "init": "connects only",
+    "close": "connects only",
+    "create_user": "insert only",
+    "add_task": "insert only",
+    "get_nlp_cache_collection": "returns the collection; the NLP cache reads it by _id",
+    "execute_aggregation": "runs caller-supplied pipelines",
+    "job_queue.enqueue": "insert only",
+    "job_queue.put_input": "GridFS, by _id; the driver indexes its chunks",
+    "job_queue.open_input": "GridFS, by _id; the driver indexes its chunks",
+    "job_queue.delete_input": "GridFS, by _id; the driver indexes its chunks",
+}
+
+
+class _Cursor:
+    def __init__(self, collection, query):
+        self._collection, self._query = collection, query
+        self._sort, self._limit = None, 0
+
+    def sort(self, key, direction=None):
+        self._sort = [(key, direction or 1)] if isinstance(key, str) else list(key)
+        return self
+
+    def limit(self, limit):
+        self._limit = limit
+        return self
+
+    def __iter__(self):
+        self._collection._record("find", self._query, self._sort, self._limit)
+        return iter(self._collection._rows())
+
+
+class _RecordingCollection:
+    """Records the queries made on a collection; writes do nothing and reads return fixtures."""
+
+    def __init__(self, name, recorded, fixtures):
+        self.name, self._recorded, self._fixtures = name, recorded, fixtures
+
+    def _record(self, kind, query, sort=None, limit=0):
+        self._recorded.append((kind, self.name, query, sort, limit))
+
+    def _rows(self):
+        return [dict(row) for row in self._fixtures.get(self.name, [])]
+
+    def _first(self):
+        rows = self._rows()
+        return rows[0] if rows else None
+
+    def find(self, filter=None, *args, **kwargs):
+        return _Cursor(self, filter or {})
+
+    def find_one(self, filter=None, *args, **kwargs):
+        self._record("find", filter or {}, None, 1)
+        return self._first()
+
+    def find_one_and_update(self, filter, update, sort=None, **kwargs):
+        self._record("find", filter, sort, 1)
+        return self._first()
+
+    def count_documents(self, filter, **kwargs):
+        self._record("find", filter)
+        return 0
+
+    def aggregate(self, pipeline, **kwargs):
+        self._record("aggregate", pipeline)
+        return iter([])
+
+    def _write(self, filter, *args, **kwargs):
+        self._record("find", filter)
+        return SimpleNamespace(matched_count=0, modified_count=0, deleted_count=0, upserted_id=None)
+
+    update_one = update_many = delete_one = delete_many = _write
+
+    def insert_one(self, document, **kwargs):
+        return SimpleNamespace(inserted_id=document.get("_id", ObjectId()))
+
+    def insert_many(self, documents, **kwargs):
+        return SimpleNamespace(inserted_ids=[document.get("_id", ObjectId()) for document in documents])
+
+
+class _RecordingDatabase:
+    def __init__(self, recorded, fixtures):
+        self._recorded, self._fixtures = recorded, fixtures or {}
+
+    def __getitem__(self, name):
+        return _RecordingCollection(name, self._recorded, self._fixtures)
+
+    __getattr__ = __getitem__
+
+
+def record(call, fixtures=None):
+    """The (kind, collection, query, sort, limit) tuples call(storage, job_queue) issues, without running them."""
+    real = get_db()
+    recorded = []
+    connection.db = _RecordingDatabase(recorded, fixtures)
+    try:
+        call(MongoStorage(), MongoJobQueue())
+    finally:
+        connection.db = real
+    return recorded
+
+
+def _find(collection, query, sort=None, limit=0):
+    cursor = get_db()[collection].find(query)
+    if sort:
+        cursor = cursor.sort(sort)
+    if limit:
+        cursor = cursor.limit(limit)
+    return cursor.explain()
+
+
+def _aggregate(collection, pipeline):
+    return get_db().command("aggregate", collection, pipeline=pipeline, explain=True)
+
+
+def _lookups(collection, pipeline):
+    """
+    (label, explain thunk) for the foreign side of every $lookup in pipeline (inside $facet too),
+    checked as the query it runs: a find on foreignField per input document, or its own pipeline.
+    """
+    for stage in pipeline:
+        for facet in stage.get("$facet", {}).values():
+            yield from _lookups(collection, facet)
+        lookup = stage.get("$lookup")
+        if lookup is None:
+            continue
+        target = lookup["from"]
+        if "foreignField" in lookup:
+            query = {lookup["foreignField"]: ObjectId()}
+            yield f"$lookup {target}.{lookup['foreignField']}", lambda target=target, query=query: _find(target, query)
+        if "pipeline" in lookup:
+            sub = lookup["pipeline"]
+            yield f"$lookup {target} pipeline", lambda target=target, sub=sub: _aggregate(target, sub)
+            yield from _lookups(target, sub)
+
+
+def build_queries():
+    """[(name, explain thunk)] for every query the methods in CALLS issue."""
+    queries = []
+    for name, call, fixtures in CALLS:
+        for kind, collection, query, sort, limit in record(call, fixtures):
+            label = f"{name}: {collection}"
+            if kind == "find":
+                queries.append((label, lambda c=collection, q=query, s=sort, l=limit: _find(c, q, s, l)))
+            else:
+                queries.append((f"{label} aggregate", lambda c=collection, p=query: _aggregate(c, p)))
+                queries.extend((f"{name}: {lookup}", thunk) for lookup, thunk in _lookups(collection, query))
+    return queries
+
+
+def unlisted_methods():
+    """Public storage / job queue methods that are neither in CALLS nor in UNCHECKED."""
+    listed = {name.split("(")[0] for name, _, _ in CALLS} | set(UNCHECKED)
+    methods = {name for name in vars(MongoStorage) if not name.startswith("_") and callable(getattr(MongoStorage, name))}
+    methods |= {f"job_queue.{name}" for name in vars(MongoJobQueue)
+                if not name.startswith("_") and callable(getattr(MongoJobQueue, name))}
+    return sorted(methods - listed)
+
+
+def collect_stages(plan, found=None):
+    """Collects every plan stage name (COLLSCAN, IXSCAN, IDHACK, ...) anywhere in an explain document."""
+    found = [] if found is None else found
+    if isinstance(plan, dict):
+        stage = plan.get("stage")
+        if isinstance(stage, str):
+            found.append(stage)
+        # $lookup stages report foreign-side scans this way on MongoDB 5.0+
+        if plan.get("collectionScans"):
+            found.append("COLLSCAN")
+        for value in plan.values():
+            collect_stages(value, found)
+    elif isinstance(plan, list):
+        for value in plan:
+            collect_stages(value, found)
+    return found
+
+
+def verify(queries):
+    """Explains every query; returns the names of the ones that use COLLSCAN."""
+    failures = []
+    for name, explain in queries:
+        stages = collect_stages(explain())
+        status = "COLLSCAN" if "COLLSCAN" in stages else "ok"
+        print(f"{status:<9}{name:<60}{' > '.join(dict.fromkeys(stages))}")
+        if status != "ok":
+            failures.append(name)
+    return failures
+
+
+def main():
+    unlisted = unlisted_methods()
+    if unlisted:
+        print(f"Not covered by CALLS or UNCHECKED: {', '.join(unlisted)}")
+        return 1
+    if get_db() is None:
+        print("No database connection; cannot verify query plans.")
+        return 2
+    queries = build_queries()
+    failures = verify(queries)
+    if failures:
+        print(f"\n{len(failures)} queries scan a whole collection: {', '.join(failures)}")
+        return 1
+    print(f"\nAll {len(queries)} queries use an index.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,133 +1,165 @@
-import random
+"""
+Topic insights for /insights/<period>, computed from a per-user sparse index.
 
-def generate_insights(period="all"):
-    """
-    Temporary function to return random insights for testing the frontend.
-    """
-    topics = ["Work", "Health", "Exercise", "Sleep", "Mood", "Study", "Friends", "Hobby", "Food", "Travel"]
-    
-    insights = []
-    for _ in range(5):  # generate 5 random insights
-        topic = random.choice(topics)
-        count = random.randint(1, 10)
-        avg_mood = round(random.uniform(-1, 1), 2)  # between -1 (negative) and 1 (positive)
-        avg_prod = round(random.uniform(0, 10), 2)  # productivity score
-        
-        insights.append({
-            "topic": topic,
-            "count": count,
-            "avg_mood": avg_mood,
-            "avg_prod": avg_prod
-        })
-    
-    return insights
+Each user's entries are tokenized once into a scipy CSR term-count matrix
+(one row per entry) alongside numpy arrays of entry dates, mood scores and
+productivity. New entries are appended to the index as they are written
+(ENTRY_ADDED) and deleted ones masked out (ENTRIES_DELETED), so a page view
+never re-reads or re-tokenizes entry text. Topic scores, mention counts and
+the mood/productivity averages per topic are sparse matrix-vector products
+over the rows in the requested period.
 
+Indexes live in a bounded per-process LRU (database/entry_indexes.py). Writes
+made by other worker processes are picked up by reconciling entry ids with
+the database at most every INSIGHTS_SYNC_INTERVAL seconds.
+"""
+import os
 import re
-# from collections import defaultdict
-# import math
-# from datetime import datetime, timedelta
-# from database.db import db
-
-# STOP_WORDS = [
-#     'a', 'about', 'am', 'an', 'and', 'are', 'as', 'at', 'be', 'been',
-#     'being', 'but', 'by', 'can', 'did', 'do', 'does', 'doing', 'don',
-#     'for', 'from', 'had', 'has', 'have', 'having', 'he', 'her', 'him',
-#     'his', 'i', 'if', 'in', 'is', 'it', 'its', 'just', 'me', 'my', 'myself',
-#     'now', 'of', 'off', 'on', 'or', 'our', 'ours', 's', 'she', 'should',
-#     'so', 't', 'that', 'the', 'their', 'them', 'then', 'these', 'they',
-#     'this', 'those', 'to', 'too', 'was', 'we', 'were', 'what', 'which',
-#     'who', 'whom', 'will', 'with', 'you', 'your', 'yours'
-# ]
-
-# def generate_insights(period="all"):
-#     """
-#     Analyzes entries using a TF-IDF algorithm to find the most important topics.
-#     If no significant patterns, fallback to last 5 entries.
-#     """
-#     if db is None:
-#         return []
-
-#     # Build query
-#     query = {}
-#     if period == "weekly":
-#         start_date = (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d')
-#         query["date"] = {"$gte": start_date}
-#     elif period == "monthly":
-#         start_date = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
-#         query["date"] = {"$gte": start_date}
-
-#     entries = list(db.entries.find(query).sort("date", -1))
-#     if not entries:
-#         # No entries at all
-#         return []
-
-#     # --- Preprocess documents ---
-#     processed_docs = []
-#     for entry in entries:
-#         raw_text = entry.get('text', '') or ''
-#         clean_text = re.sub(r'[^\w\s]', '', raw_text).lower()
-#         words = [w for w in clean_text.split() if w not in STOP_WORDS]
-#         processed_docs.append(words)
-
-#     # --- Term Frequency (TF) ---
-#     tf_scores = []
-#     for doc in processed_docs:
-#         doc_tf = defaultdict(int)
-#         for word in doc:
-#             doc_tf[word] += 1
-#         for word in doc_tf:
-#             doc_tf[word] = doc_tf[word] / len(doc) if len(doc) > 0 else 0
-#         tf_scores.append(doc_tf)
-
-#     # --- Inverse Document Frequency (IDF) ---
-#     doc_count = len(processed_docs)
-#     word_doc_counts = defaultdict(int)
-#     all_words = set(word for doc in processed_docs for word in doc)
-#     for word in all_words:
-#         for doc in processed_docs:
-#             if word in doc:
-#                 word_doc_counts[word] += 1
-#     idf_scores = {}
-#     for word, count in word_doc_counts.items():
-#         idf_scores[word] = math.log((1 + doc_count) / (1 + count)) + 1
-
-#     # --- TF-IDF computation ---
-#     tfidf_scores = defaultdict(float)
-#     for i, doc in enumerate(processed_docs):
-#         for word in doc:
-#             tfidf_scores[word] += tf_scores[i][word] * idf_scores[word]
-
-#     # Top 10 topics
-#     top_topics = sorted(tfidf_scores.items(), key=lambda x: x[1], reverse=True)[:10]
-#     top_topics = [word for word, score in top_topics]
-
-#     # --- Build insights ---
-#     insights = []
-#     mood_map = {'positive': 1, 'neutral': 0, 'negative': -1}
-
-#     for topic in top_topics:
-#         related_entries = [e for e in entries if topic in (e.get('text') or '').lower()]
-#         mention_count = len(related_entries)
-#         if mention_count == 0:
-#             continue
-#         avg_mood = sum(mood_map.get(e.get('mood', 'neutral'), 0) for e in related_entries) / mention_count
-#         avg_prod = sum(e.get('productivity', 0) for e in related_entries) / mention_count
-#         insights.append({
-#             'topic': topic,
-#             'count': mention_count,
-#             'avg_mood': avg_mood,
-#             'avg_prod': avg_prod
-#         })
-
-#     # --- Fallback: No significant patterns found ---
-#     if not insights:
-#         fallback_entries = entries[:5]  # Last 5 entries
-#         for entry in fallback_entries:
-#             insights.append({
-#                 'topic': 'General',
-#                 'count': 1,
-#                 'avg_mood': mood_map.get(entry.get('mood', 'neutral'), 0),
-#                 'avg_prod': entry.get('productivity', 0)
-#             })
-
-#     return insights
+import threading
+from datetime import datetime, timedelta
+import numpy as np
+from scipy import sparse
+from database.entry_indexes import EntryIndexCache, date_ordinal
+from database.prompt_stats import MOOD_SCORES, STOP_WORD_SET
+
+# period -> days back from today (None: every entry)
+INSIGHT_PERIODS = {"weekly": 7, "monthly": 30, "all": None}
+TOP_TOPICS = 10
+# A topic has to appear in at least this many entries of the period to be reported
+MIN_MENTIONS = 2
+
+
+def tokenize(text):
+    clean_text = re.sub(r'[^\w\s]', '', text or '').lower()
+    return [w for w in clean_text.split() if w not in STOP_WORD_SET and not w.isdigit()]
+
+
+class InsightIndex:
+    """One user's term-document matrix plus per-entry date, mood and productivity."""
+
+    def __init__(self):
+        self.vocabulary = {}
+        self.terms = []
+        self.matrix = sparse.csr_matrix((0, 0), dtype=np.float32)
+        self.dates = np.zeros(0, dtype=np.int32)
+        self.moods = np.zeros(0, dtype=np.float32)
+        self.productivity = np.zeros(0, dtype=np.float32)
+        self.lengths = np.zeros(0, dtype=np.float32)
+        self.alive = np.zeros(0, dtype=bool)
+        self.rows = {}  # entry id -> row
+        # Rows added since the last query, merged into the matrix on the next one
+        self._pending = []
+        self.lock = threading.Lock()
+        self.synced_at = 0.0
+
+    def __len__(self):
+        return len(self.rows)
+
+    def add(self, entries):
+        """Tokenizes and appends entries that are not in the index yet."""
+        for entry in entries:
+            entry_id = str(entry["_id"])
+            if entry_id in self.rows:
+                continue
+            counts = {}
+            for word in tokenize(entry.get("text")):
+                column = self.vocabulary.get(word)
+                if column is None:
+                    column = self.vocabulary[word] = len(self.terms)
+                    self.terms.append(word)
+                counts[column] = counts.get(column, 0) + 1
+            self.rows[entry_id] = len(self.alive) + len(self._pending)
+            self._pending.append((counts, date_ordinal(entry.get("date")),
+                                  MOOD_SCORES.get(str(entry.get("mood") or "neutral").lower(), 0),
+                                  float(entry.get("productivity") or 0)))
+
+    def remove(self, entry_ids):
+        self._merge()
+        for entry_id in entry_ids:
+            row = self.rows.pop(str(entry_id), None)
+            if row is not None:
+                self.alive[row] = False
+        # Drop masked rows once they are a quarter of the matrix
+        if len(self.alive) and (~self.alive).sum() * 4 > len(self.alive):
+            self._compact()
+
+    def _merge(self):
+        if not self._pending:
+            return
+        indptr, indices, data = [0], [], []
+        for counts, _, _, _ in self._pending:
+            indices.extend(counts)
+            data.extend(counts.values())
+            indptr.append(len(indices))
+        shape = (len(self._pending), len(self.terms))
+        new_rows = sparse.csr_matrix((np.array(data, dtype=np.float32), np.array(indices, dtype=np.int32),
+                                      np.array(indptr, dtype=np.int32)), shape=shape)
+        self.matrix.resize((self.matrix.shape[0], len(self.terms)))
+        self.matrix = sparse.vstack([self.matrix, new_rows], format="csr")
+        self.dates = np.concatenate([self.dates, np.array([p[1] for p in self._pending], dtype=np.int32)])
+        self.moods = np.concatenate([self.moods, np.array([p[2] for p in self._pending], dtype=np.float32)])
+        self.productivity = np.concatenate([self.productivity, np.array([p[3] for p in self._pending], dtype=np.float32)])
+        self.lengths = np.concatenate([self.lengths, np.asarray(new_rows.sum(axis=1), dtype=np.float32).ravel()])
+        self.alive = np.concatenate([self.alive, np.ones(len(self._pending), dtype=bool)])
+        self._pending = []
+
+    def _compact(self):
+        keep = np.flatnonzero(self.alive)
+        old_to_new = {int(old): new for new, old in enumerate(keep)}
+        self.matrix = self.matrix[keep]
+        self.dates, self.moods = self.dates[keep], self.moods[keep]
+        self.productivity, self.lengths = self.productivity[keep], self.lengths[keep]
+        self.alive = np.ones(len(keep), dtype=bool)
+        self.rows = {entry_id: old_to_new[row] for entry_id, row in self.rows.items()}
+
+    def topics(self, since_ordinal=None, top=TOP_TOPICS, min_mentions=MIN_MENTIONS):
+        """[{topic, count, avg_mood, avg_prod}] for the top TF-IDF terms of entries dated on/after since_ordinal."""
+        self._merge()
+        selected = self.alive if since_ordinal is None else self.alive & (self.dates >= since_ordinal)
+        rows = np.flatnonzero(selected & (self.lengths > 0))
+        if rows.size == 0:
+            return []
+        counts = self.matrix[rows]
+        present = counts.copy()
+        present.data[:] = 1
+
+        mentions = np.asarray(present.sum(axis=0)).ravel()
+        # Sum over entries of tf (count / entry length), times idf
+        tf_sum = counts.T @ (1.0 / self.lengths[rows])
+        idf = np.log((1 + rows.size) / (1 + mentions)) + 1
+        scores = np.where(mentions >= min_mentions, tf_sum * idf, 0.0)
+
+        candidates = np.flatnonzero(scores)
+        if candidates.size > top:
+            candidates = candidates[np.argpartition(-scores[candidates], top)[:top]]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        if candidates.size == 0:
+            return []
+
+        mood_sums = present[:, candidates].T @ self.moods[rows]
+        productivity_sums = present[:, candidates].T @ self.productivity[rows]
+        return [{
+            "topic": self.terms[column],
+            "count": int(mentions[column]),
+            "avg_mood": round(float(mood_sums[i] / mentions[column]), 2),
+            "avg_prod": round(float(productivity_sums[i] / mentions[column]), 2),
+        } for i, column in enumerate(candidates)]
+
+
+insight_indexes = EntryIndexCache(
+    InsightIndex,
+    maxsize=int(os.getenv("INSIGHTS_INDEX_SIZE", 256)),
+    sync_interval=float(os.getenv("INSIGHTS_SYNC_INTERVAL", 30)),
+)
+
+
+def generate_insights(user_id, period="all"):
+    """
+    The user's most significant topics in the period ('weekly', 'monthly' or 'all'),
+    each with how many entries mention it and their average mood and productivity.
+    """
+    days = INSIGHT_PERIODS[period]
+    since = (datetime.now() - timedelta(days=days)).toordinal() if days else None
+    index = insight_indexes.get(user_id)
+    with index.lock:
+        return index.topics(since)
@@ -0,0 +1,222 @@
+"""
+Runs background jobs (audio analysis) from the job queue in database/job_queue.py
+on a fixed number of worker threads, so uploads wait in the queue instead of
+all running at once.
+
+The web app registers a handler per job kind and enqueues jobs, optionally
+with an input file that the queue stores for the job (open_input()). Handlers
+receive the job (its "_id", "payload", ...) and a progress(stage, percent)
+callback and return a JSON-serializable result. An exception schedules a retry after
+JOB_RETRY_DELAY * 2**(attempt - 1) seconds until max_attempts is reached;
+JobFailed fails the job at once. After the last failed attempt (or when the
+last attempt's worker died) the handler's on_failure(payload) runs. The input
+file is deleted once the job is done or failed. progress() raises JobLeaseLost
+once the attempt no longer owns its job, so a handler should report progress
+before side effects such as saving an entry.
+
+With JOB_QUEUE=mongo the web processes only enqueue (JOB_WORKERS defaults to
+0), and jobs are run by a single consumer process, so at most JOB_WORKERS
+jobs (and Whisper processes) run at once however many web workers there are.
+Inputs live in the database, so it can run on another machine:
+    python -m jobs
+With JOB_QUEUE=memory each process runs its own jobs (JOB_WORKERS defaults to 1).
+"""
+import os
+import sys
+import time
+import threading
+import traceback
+from database.job_queue import create_job_queue, new_job, public_job, JOB_MAX_ATTEMPTS, JOB_QUEUE
+
+# Worker threads per process; the Mongo queue is served by `python -m jobs` alone by default
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 0 if JOB_QUEUE == "mongo" else 1))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", 2))
+JOB_RETRY_DELAY = float(os.getenv("JOB_RETRY_DELAY", 10))
+
+
+class JobFailed(Exception):
+    """Raised by a handler for a failure that retrying cannot fix."""
+
+
+class JobLeaseLost(Exception):
+    """Raised by progress() when the job was claimed again (or finished) by another attempt."""
+
+
+class JobWorkers:
+    """A fixed pool of threads that claim and run jobs, started once per process."""
+
+    def __init__(self, queue=None, workers=JOB_WORKERS, poll_interval=JOB_POLL_INTERVAL, retry_delay=JOB_RETRY_DELAY):
+        self.queue = queue or create_job_queue()
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.retry_delay = retry_delay
+        self._handlers = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+        self._pid = None
+
+    def register(self, kind, handler, on_failure=None):
+        self._handlers[kind] = (handler, on_failure)
+
+    def enqueue(self, kind, payload, user_id, max_attempts=JOB_MAX_ATTEMPTS, input_file=None):
+        """
+        Queues a job and returns its id; a local worker picks it up right away if one is idle.
+        `input_file` (a readable binary file) is stored with the job for its handler to open_input().
+        """
+        job = new_job(kind, payload, user_id, max_attempts)
+        if input_file is not None:
+            # Stored first, so no worker can claim the job before its input exists
+            self.queue.put_input(job["_id"], input_file)
+        try:
+            job_id = self.queue.enqueue(job)
+        except Exception:
+            if input_file is not None:
+                self.queue.delete_input(job["_id"])
+            raise
+        self.ensure_started()
+        self._wakeup.set()
+        return job_id
+
+    def open_input(self, job_id):
+        """The input file stored with a job, or None."""
+        return self.queue.open_input(job_id)
+
+    def _delete_input(self, job_id):
+        try:
+            self.queue.delete_input(job_id)
+        except Exception as e:
+            print(f"Could not delete the input of job {job_id}: {e}")
+
+    def get(self, job_id, user_id=None):
+        """The job's status fields, or None if it does not exist (or belongs to another user)."""
+        job = self.queue.get(job_id)
+        if job is None or (user_id is not None and job["user_id"] != str(user_id)):
+            return None
+        return public_job(job)
+
+    def ensure_started(self):
+        """Starts the worker threads in this process (again after a fork). Cheap to call per request."""
+        if self._pid == os.getpid() or not self.workers:
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._stop.clear()
+            self._threads = [
+                threading.Thread(target=self._run, name=f"job-worker-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+            self._pid = os.getpid()
+
+    def stop(self, wait=True):
+        self._stop.set()
+        self._wakeup.set()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+        self._pid = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                job = self.queue.claim()
+            except Exception as e:
+                print(f"Could not claim a job: {e}")
+                job = None
+            if job is None:
+                self._clean_up_abandoned()
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+            self.run_job(job)
+
+    def _clean_up_abandoned(self):
+        """Fails jobs whose last attempt's worker died, running their on_failure."""
+        try:
+            while True:
+                job = self.queue.abandon()
+                if job is None:
+                    return
+                print(f"Job {job['_id']} ({job['kind']}) failed: its worker stopped on the last attempt.")
+                self._delete_input(job["_id"])
+                _, on_failure = self._handlers.get(job["kind"], (None, None))
+                if on_failure is not None:
+                    on_failure(job["payload"])
+        except Exception as e:
+            print(f"Could not clean up abandoned jobs: {e}")
+
+    def run_job(self, job):
+        job_id, attempt = job["_id"], job["attempts"]
+        handler, on_failure = self._handlers.get(job["kind"], (None, None))
+        if handler is None:
+            if self.queue.fail(job_id, attempt, f"No handler for job kind {job['kind']!r}"):
+                self._delete_input(job_id)
+            return
+
+        def progress(stage, percent):
+            if not self.queue.progress(job_id, attempt, stage, percent):
+                raise JobLeaseLost(f"Job {job_id} attempt {attempt} no longer owns the job.")
+
+        try:
+            result = handler(job, progress)
+        except JobLeaseLost as e:
+            print(f"{e} Stopped it.")
+            return
+        except Exception as e:
+            error = str(e) or type(e).__name__
+            if not isinstance(e, JobFailed):
+                traceback.print_exc()
+            if isinstance(e, JobFailed) or attempt >= job["max_attempts"]:
+                print(f"Job {job_id} ({job['kind']}) failed after {attempt} attempt(s): {error}")
+                if self.queue.fail(job_id, attempt, error):
+                    self._delete_input(job_id)
+                    if on_failure is not None:
+                        on_failure(job["payload"])
+            else:
+                delay = self.retry_delay * 2 ** (attempt - 1)
+                print(f"Job {job_id} ({job['kind']}) attempt {attempt} failed, retrying in {delay:.0f}s: {error}")
+                self.queue.retry(job_id, attempt, error, delay)
+            return
+        if not self.queue.complete(job_id, attempt, result):
+            print(f"Job {job_id} attempt {attempt} finished after losing the job; its result was discarded.")
+            return
+        # Kept until the job is done, since an attempt that takes the job over still needs it
+        self._delete_input(job_id)
+
+    def stats(self):
+        return {
+            "queue": self.queue.name,
+            "workers": self.workers,
+            "running_here": self._pid == os.getpid(),
+            "jobs": self.queue.counts(),
+        }
+
+
+job_workers = JobWorkers()
+
+
+def main():
+    """Runs JOB_WORKERS (at least 1) workers in the foreground with the app's job handlers. Run one per deployment."""
+    import app  # noqa: F401  registers the handlers
+    # Under `python -m jobs` this module is __main__; app registered its handlers on the `jobs` module's pool
+    from jobs import job_workers as workers
+    if workers.queue.name != "mongo":
+        print("JOB_QUEUE=memory only holds jobs enqueued by this process; use JOB_QUEUE=mongo.")
+        return 2
+    workers.workers = max(1, JOB_WORKERS)
+    workers.ensure_started()
+    print(f"Running {workers.workers} job worker(s). Ctrl+C to stop.")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        workers.stop(wait=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,17 +1,39 @@
-from flask_login import UserMixin
+import os
+import time
+import threading
+from collections import OrderedDict
 from database.db import find_user_by_email, find_user_by_id, create_user as db_create_user
 # We removed "from app import bcrypt" from here to break the circular import.
 
-class User(UserMixin):
+class User:
     """
     A user model that integrates with Flask-Login.
     It's a wrapper around the user data stored in MongoDB.
+
+    Implements the Flask-Login user interface itself instead of inheriting
+    UserMixin, which has no __slots__ and would give every instance a __dict__.
     """
+    __slots__ = ("id", "email", "password_hash")
+
     def __init__(self, user_data):
         self.id = str(user_data.get('_id'))
         self.email = user_data.get('email')
         self.password_hash = user_data.get('password')
 
+    is_active = True
+    is_authenticated = True
+    is_anonymous = False
+
+    def get_id(self):
+        return self.id
+
+    def __eq__(self, other):
+        if isinstance(other, User):
+            return self.id == other.id
+        return NotImplemented
+
+    __hash__ = object.__hash__
+
     @staticmethod
     def find_by_email(email):
         """Finds a user by email in the database."""
@@ -28,13 +50,94 @@ class User(UserMixin):
             return User(user_data)
         return None
 
+    @staticmethod
+    def get_cached(user_id):
+        """Like find_by_id, but served from the per-process user cache when possible."""
+        user = user_cache.get(user_id)
+        if user is None:
+            user = User.find_by_id(user_id)
+            if user is not None:
+                user_cache.set(user_id, user)
+        return user
+
     @staticmethod
     def create(email, password):
         """Creates a new user and saves them to the database."""
         # FIX: Import bcrypt here, only when it's needed.
-        from app import bcrypt 
-        
+        from app import bcrypt
+
         # Hash the password before storing it for security
         hashed_password = bcrypt.generate_password_hash(password).decode('utf-8')
         return db_create_user(email, hashed_password)
 
+
+class UserCache:
+    """
+    Bounded in-process LRU of User objects with a time-to-live.
+
+    Saves the users lookup Flask-Login does on every authenticated request.
+    Each worker process has its own copy, so the TTL bounds how long another
+    process can keep serving a user after an account change; call
+    invalidate() wherever an account is changed or removed.
+    """
+
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.invalidations = 0
+
+    def get(self, user_id):
+        """Returns the cached User, or None if it is missing or older than the TTL."""
+        now = time.monotonic()
+        with self._lock:
+            item = self._entries.get(user_id)
+            if item is not None and item[0] > now:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return item[1]
+            if item is not None:
+                del self._entries[user_id]
+                self.expired += 1
+            self.misses += 1
+            return None
+
+    def set(self, user_id, user):
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl, user)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        """Drops one user, e.g. after their account changed or they logged out."""
+        with self._lock:
+            if self._entries.pop(str(user_id), None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "invalidations": self.invalidations,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+user_cache = UserCache(
+    maxsize=int(os.getenv('USER_CACHE_SIZE', 1024)),
+    ttl=float(os.getenv('USER_CACHE_TTL', 300)),
+)
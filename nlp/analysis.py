@@ -1,24 +1,216 @@
-from textblob import TextBlob
+import os
+from collections.abc import Mapping
+from textblob.en.sentiments import PatternAnalyzer
 import nltk
 from nltk.sentiment import SentimentIntensityAnalyzer
+from nlp.cache import nlp_cache, content_key
 
 try:
     nltk.data.find('sentiment/vader_lexicon.zip')
 except nltk.downloader.DownloadError:
     pass
 
-def analyze_text(text):
+# Backend used when a caller does not ask for one explicitly
+MOOD_ANALYZER = os.getenv("MOOD_ANALYZER", "textblob")
+
+# Part of every cache key: bump it when a backend's output can change
+ANALYZER_VERSION = 1
+
+# Analyzers are built once per process and shared by every call.
+# SentimentIntensityAnalyzer re-reads the VADER lexicon from disk in its
+# constructor, so building one per entry dominated the cost of analysis.
+_pattern_analyzer = None
+_vader_analyzer = None
+
+
+def get_pattern_analyzer():
+    """Returns the shared TextBlob (Pattern) sentiment analyzer."""
+    global _pattern_analyzer
+    if _pattern_analyzer is None:
+        _pattern_analyzer = PatternAnalyzer()
+    return _pattern_analyzer
+
+
+def get_vader_analyzer():
+    """Returns the shared VADER analyzer, loading the lexicon on first use."""
+    global _vader_analyzer
+    if _vader_analyzer is None:
+        _vader_analyzer = SentimentIntensityAnalyzer()
+    return _vader_analyzer
+
+
+def _textblob_polarity(text):
+    # Calling the analyzer directly skips building a full TextBlob per entry
+    return get_pattern_analyzer().analyze(text).polarity
+
+
+def _vader_scores(text):
+    return get_vader_analyzer().polarity_scores(text)
+
+
+def _classify(score, threshold):
+    return 'positive' if score > threshold else 'negative' if score < -threshold else 'neutral'
+
+
+class MoodAnalysis(Mapping):
     """
-    Analyzes text to determine mood using both TextBlob and VADER.
+    Read-only analysis result for a single text.
+
+    Behaves like the dictionary analyze_text has always returned
+    ({'polarity', 'vader', 'mood'}), but detail fields the backend did not
+    need are only computed the first time a caller reads them.
     """
-    blob = TextBlob(text)
-    polarity = blob.sentiment.polarity
+    _detail_fields = {'polarity': _textblob_polarity, 'vader': _vader_scores}
+
+    def __init__(self, text, mood, **fields):
+        self._text = text
+        self._fields = dict(fields, mood=mood)
+
+    def __getitem__(self, key):
+        if key not in self._fields:
+            if key not in self._detail_fields:
+                raise KeyError(key)
+            self._fields[key] = self._detail_fields[key](self._text)
+        return self._fields[key]
+
+    def __iter__(self):
+        return iter(('polarity', 'vader', 'mood'))
+
+    def __len__(self):
+        return 3
+
+    def computed(self):
+        """Returns only the fields that have been computed so far."""
+        return dict(self._fields)
+
+    def __repr__(self):
+        return f"MoodAnalysis({self._fields!r})"
+
+
+# --- Analyzer registry ---
+ANALYZERS = {}
+_ANALYZER_VERSIONS = {}
+_TOKEN_ANALYZERS = {}
+
+def register_analyzer(name, version=None, tokens=None):
+    """
+    Registers a batch backend: a function mapping a list of texts to MoodAnalysis results.
+    `version` is an optional callable whose result becomes part of the backend's cache key,
+    for backends whose output depends on something other than this code (e.g. a model file).
+    `tokens` optionally maps (text, lowercase word tokens) to a MoodAnalysis, for backends
+    that can reuse a tokenization done by the caller (see nlp/pipeline.py).
+    """
+    def decorator(func):
+        ANALYZERS[name] = func
+        if version is not None:
+            _ANALYZER_VERSIONS[name] = version
+        if tokens is not None:
+            _TOKEN_ANALYZERS[name] = tokens
+        return func
+    return decorator
+
 
-    sia = SentimentIntensityAnalyzer()
-    vader_score = sia.polarity_scores(text)
+def _check_backend(name):
+    if name not in ANALYZERS:
+        raise ValueError(f"Unknown mood analyzer '{name}'. Available: {', '.join(sorted(ANALYZERS))}")
 
-    # Use a threshold on TextBlob's polarity for mood classification
-    mood = 'positive' if polarity > 0.2 else 'negative' if polarity < -0.2 else 'neutral'
-    
-    # Return a dictionary with detailed analysis results
-    return {'polarity': polarity, 'vader': vader_score, 'mood': mood}
+
+def analyzer_version(backend=None):
+    """The version a backend's results are cached under, including e.g. its model fingerprint."""
+    name = backend or MOOD_ANALYZER
+    _check_backend(name)
+    if name in _ANALYZER_VERSIONS:
+        return f"{ANALYZER_VERSION}:{_ANALYZER_VERSIONS[name]()}"
+    return ANALYZER_VERSION
+
+
+@register_analyzer("textblob")
+def _analyze_textblob(texts):
+    results = []
+    for text in texts:
+        polarity = _textblob_polarity(text)
+        # Use a threshold on TextBlob's polarity for mood classification
+        results.append(MoodAnalysis(text, _classify(polarity, 0.2), polarity=polarity))
+    return results
+
+
+@register_analyzer("vader")
+def _analyze_vader(texts):
+    results = []
+    for text in texts:
+        vader_score = _vader_scores(text)
+        # 0.05 is the compound-score cut-off recommended by the VADER authors
+        results.append(MoodAnalysis(text, _classify(vader_score['compound'], 0.05), vader=vader_score))
+    return results
+
+
+@register_analyzer("ensemble")
+def _analyze_ensemble(texts):
+    results = []
+    for text in texts:
+        polarity = _textblob_polarity(text)
+        vader_score = _vader_scores(text)
+        combined = (polarity + vader_score['compound']) / 2
+        results.append(MoodAnalysis(text, _classify(combined, 0.2), polarity=polarity, vader=vader_score))
+    return results
+
+
+def _classifier_version():
+    from nlp.mood_model import get_model
+    return get_model().meta.get("fingerprint", "")
+
+
+def _classifier_tokens(text, tokens):
+    from nlp.mood_model import get_model
+    # The model's tokenizer keeps words of two or more characters
+    return MoodAnalysis(text, get_model().predict_tokens([[token for token in tokens if len(token) > 1]])[0])
+
+
+@register_analyzer("classifier", version=_classifier_version, tokens=_classifier_tokens)
+def _analyze_classifier(texts):
+    # Imported lazily so the other backends never load the model artifact
+    from nlp.mood_model import predict_mood
+    return [MoodAnalysis(text, mood) for text, mood in zip(texts, predict_mood(texts))]
+
+
+def analyze_texts(texts, backend=None):
+    """
+    Analyzes a batch of texts to determine mood with the selected backend
+    (defaults to MOOD_ANALYZER). Returns one result per text, in the same order.
+    """
+    name = backend or MOOD_ANALYZER
+    texts = list(texts)
+    namespace = f"analysis:{name}"
+    version = analyzer_version(name)
+    keys = [content_key(namespace, version, text) for text in texts]
+    text_by_key = dict(zip(keys, texts))
+    found = nlp_cache.get_many(keys, load=lambda key, fields: MoodAnalysis(text_by_key[key], **fields))
+
+    # Only the texts that missed both cache tiers go through the backend
+    misses = {key: text for key, text in text_by_key.items() if key not in found}
+    if misses:
+        computed = ANALYZERS[name](list(misses.values()))
+        fresh = list(zip(misses.keys(), computed))
+        nlp_cache.set_many(fresh, namespace, dump=MoodAnalysis.computed)
+        found.update(fresh)
+    return [found[key] for key in keys]
+
+
+def analyze_text(text, backend=None):
+    """
+    Analyzes text to determine mood.
+    """
+    return analyze_texts([text], backend=backend)[0]
+
+
+def analyze_tokens(text, tokens, backend=None):
+    """
+    Analyzes one text already split into lowercase word tokens, bypassing the
+    per-text cache (for callers that cache whole results themselves, like
+    nlp/pipeline.py). Backends that tokenize internally are given the text.
+    """
+    name = backend or MOOD_ANALYZER
+    _check_backend(name)
+    if name in _TOKEN_ANALYZERS:
+        return _TOKEN_ANALYZERS[name](text, tokens)
+    return ANALYZERS[name]([text])[0]
@@ -0,0 +1,163 @@
+import os
+import hashlib
+import threading
+import functools
+from collections import OrderedDict
+from datetime import datetime
+from pymongo import UpdateOne
+
+
+def content_key(namespace, version, text):
+    """Content-addressed key: changes whenever the text or the producer's version changes."""
+    digest = hashlib.sha256()
+    for part in (namespace, str(version), text):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\x00')
+    return digest.hexdigest()
+
+
+class NLPCache:
+    """
+    Two-tier cache for NLP results keyed by content hash.
+
+    The first tier is a bounded in-process LRU. The optional second tier is a
+    MongoDB collection shared by every worker, enabled with attach_collection().
+    Values stored in the persistent tier must be BSON-serializable, so callers
+    can pass dump/load functions to convert results on the way in and out.
+    """
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._collection = None
+        self._collection_factory = None
+        self.hits = 0
+        self.misses = 0
+        self.persistent_hits = 0
+        self.persistent_errors = 0
+
+    def attach_collection(self, collection=None, collection_factory=None):
+        """
+        Enables the persistent tier backed by the given collection (or disables it with None).
+        Alternatively `collection_factory`, a zero-argument callable returning the collection
+        (or None), is resolved on each use, so the database connection can be made lazily.
+        """
+        self._collection = collection
+        self._collection_factory = collection_factory
+
+    def _persistent(self):
+        if self._collection_factory is not None:
+            return self._collection_factory()
+        return self._collection
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get_many(self, keys, load=None):
+        """
+        Looks up several keys at once. Returns a dict of the keys that were found;
+        persistent-tier lookups for all in-process misses share a single query.
+        `load(key, stored)` rebuilds a value read from the persistent tier.
+        """
+        found = {}
+        missing = []
+        persistent_hits = errors = 0
+        with self._lock:
+            for key in keys:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    found[key] = self._entries[key]
+                else:
+                    missing.append(key)
+
+        try:
+            collection = self._persistent() if missing else None
+            if collection is not None:
+                for doc in collection.find({"_id": {"$in": missing}}):
+                    value = load(doc["_id"], doc["value"]) if load else doc["value"]
+                    found[doc["_id"]] = value
+                    self._remember(doc["_id"], value)
+                    persistent_hits += 1
+        except Exception as e:
+            errors += 1
+            print(f"NLP cache lookup failed: {e}")
+
+        # Counters are shared by request threads, so they are updated under the LRU's lock
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+            self.persistent_hits += persistent_hits
+            self.persistent_errors += errors
+        return found
+
+    def set_many(self, items, namespace, dump=None):
+        """Stores (key, value) pairs in both tiers."""
+        items = list(items)
+        for key, value in items:
+            self._remember(key, value)
+
+        try:
+            collection = self._persistent() if items else None
+            if collection is not None:
+                now = datetime.utcnow()
+                # One round trip for the whole batch
+                collection.bulk_write([
+                    UpdateOne(
+                        {"_id": key},
+                        {"$set": {"ns": namespace, "value": dump(value) if dump else value, "created_at": now}},
+                        upsert=True
+                    )
+                    for key, value in items
+                ], ordered=False)
+        except Exception as e:
+            with self._lock:
+                self.persistent_errors += 1
+            print(f"NLP cache write failed: {e}")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Returns hit/miss counters for both tiers."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "persistent_hits": self.persistent_hits,
+                "persistent_errors": self.persistent_errors,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+                "persistent": self._collection is not None or self._collection_factory is not None,
+            }
+
+nlp_cache = NLPCache(maxsize=int(os.getenv("NLP_CACHE_SIZE", 4096)))
+
+
+def cached(namespace, version, dump=None, load=None):
+    """
+    Caches a single-text function f(text) in nlp_cache under (namespace, version, text).
+    Bump `version` whenever the function's output for the same text can change.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(text):
+            key = content_key(namespace, version, text)
+            found = nlp_cache.get_many([key], load=load and (lambda _key, stored: load(stored)))
+            if key in found:
+                value = found[key]
+            else:
+                value = func(text)
+                nlp_cache.set_many([(key, value)], namespace, dump=dump)
+            # Hand out copies of mutable results so callers cannot alter the cached value
+            return list(value) if isinstance(value, list) else value
+        wrapper.uncached = func
+        return wrapper
+    return decorator
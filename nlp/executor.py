@@ -0,0 +1,152 @@
+"""
+Journal analysis in a pool of worker processes (see NLPExecutor).
+
+Every process that analyzes text starts its own pool, so a deployment runs
+NLP_WORKERS x (gunicorn workers) analysis processes in total, each holding
+TextBlob, VADER and (with MOOD_ANALYZER=classifier) the mood model. The
+default therefore splits the machine's cores across WEB_CONCURRENCY web
+workers and caps the result at two per web worker.
+"""
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturesTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from nlp.pipeline import text_pipeline, PipelineResult
+
+# Analysis processes per web process (not per deployment; see above)
+NLP_WORKERS = int(os.getenv("NLP_WORKERS", max(1, min(2, (os.cpu_count() or 1) // int(os.getenv("WEB_CONCURRENCY", 1))))))
+# Analyses allowed in flight (running or queued) before new submits are turned away
+NLP_MAX_PENDING = int(os.getenv("NLP_MAX_PENDING", NLP_WORKERS * 4))
+# Seconds an analysis may take once submitted, and seconds to wait for a free slot
+NLP_TIMEOUT = float(os.getenv("NLP_TIMEOUT", 15))
+NLP_QUEUE_TIMEOUT = float(os.getenv("NLP_QUEUE_TIMEOUT", 2))
+NLP_INLINE = os.getenv("NLP_INLINE", "False").lower() in ["true", "1", "t"]
+
+
+class NLPBusyError(RuntimeError):
+    """Raised when every analysis slot is taken for longer than the queue timeout."""
+
+
+class NLPTimeoutError(TimeoutError):
+    """Raised when an analysis does not finish within its timeout."""
+
+
+def _warm_worker():
+    """Runs once in each worker process: loads lexicons and models before the first job."""
+    text_pipeline.run("Warming up the analyzers. I need to finish this.")
+
+
+def _run_in_worker(text):
+    result = text_pipeline.run(text)
+    return dict(result), result.timings
+
+
+class NLPExecutor:
+    """
+    Runs the text pipeline in a bounded pool of worker processes so journal
+    analysis never occupies a web worker's CPU.
+
+    The pool is created lazily in the process that first uses it (so gunicorn
+    workers each get their own after fork), workers are pre-warmed, and a
+    semaphore caps in-flight analyses to give callers backpressure.
+    """
+
+    def __init__(self, max_workers=NLP_WORKERS, max_pending=NLP_MAX_PENDING, inline=NLP_INLINE):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.inline = inline
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pool_pid = None
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None or self._pool_pid != os.getpid():
+                # "spawn" keeps workers independent of the parent's threads and sockets
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_warm_worker,
+                )
+                self._pool_pid = os.getpid()
+            return self._pool
+
+    def _acquire_slot(self, timeout):
+        if not self._slots.acquire(timeout=timeout):
+            return False
+        with self._lock:
+            self._in_flight += 1
+        return True
+
+    def _release_slot(self):
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    def _reset_pool(self, pool):
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def analyze(self, text, timeout=NLP_TIMEOUT, queue_timeout=NLP_QUEUE_TIMEOUT, inline=None):
+        """
+        Analyzes one journal text and returns a PipelineResult.
+
+        Raises NLPBusyError if no slot frees up within `queue_timeout` seconds
+        (None waits indefinitely) and NLPTimeoutError if the analysis takes
+        longer than `timeout`. With `inline` (or NLP_INLINE) the pipeline runs
+        in the calling thread instead, which is what the debug server wants.
+        """
+        if self.inline if inline is None else inline:
+            return text_pipeline.run(text)
+
+        # Retried submits are answered from this process's cache without any IPC
+        cached = text_pipeline.cached_result(text)
+        if cached is not None:
+            return cached
+
+        if not self._acquire_slot(queue_timeout):
+            raise NLPBusyError("NLP workers are busy, please retry shortly.")
+        pool = self._get_pool()
+        try:
+            future = pool.submit(_run_in_worker, text)
+        except BrokenProcessPool:
+            self._release_slot()
+            self._reset_pool(pool)
+            raise
+        future.add_done_callback(lambda _: self._release_slot())
+
+        try:
+            outputs, timings = future.result(timeout=timeout)
+        except FuturesTimeoutError:
+            future.cancel()
+            raise NLPTimeoutError(f"Analysis did not finish within {timeout} seconds.")
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM); start a fresh pool for the next call
+            self._reset_pool(pool)
+            raise
+
+        text_pipeline.remember(text, outputs)
+        text_pipeline.record_timings(timings)
+        return PipelineResult(outputs, timings)
+
+    def stats(self):
+        return {
+            "workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "in_flight": self._in_flight,
+            "inline": self.inline,
+        }
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait)
+
+
+nlp_executor = NLPExecutor()
@@ -1,41 +1,65 @@
-import whisper
-import soundfile as sf
+"""
+Local Whisper transcription.
+
+whisper (and with it torch), soundfile and librosa are imported on first use,
+so importing this module is cheap. The web app never calls it directly: it
+runs in the transcription worker process (nlp/transcriber.py), which loads
+the model once.
+"""
+import os
+import threading
 import numpy as np
-import librosa
 
-# Load model once
-whisper_model = whisper.load_model("base")
+WHISPER_MODEL = os.getenv("WHISPER_MODEL", "base")
+
+whisper_model = None
+_model_lock = threading.Lock()
+
+def get_whisper_model():
+    """Loads the Whisper model on first use (once per process)."""
+    global whisper_model
+    with _model_lock:
+        if whisper_model is None:
+            import whisper
+            whisper_model = whisper.load_model(WHISPER_MODEL)
+    return whisper_model
 
 def transcribe_audio_local(audio_file_path):
-    try:
-        if not audio_file_path.lower().endswith(".wav"):
-            print("ERROR: Only WAV files supported without ffmpeg.")
-            return ""
+    """
+    Returns the text spoken in a WAV file, or "" if it contains no speech.
 
-        # Read WAV
-        audio, sr = sf.read(audio_file_path)
+    Errors (unreadable audio, missing soundfile/librosa, Whisper failures) are
+    raised to the caller, so a queued job can retry them; ValueError means the
+    file can never be transcribed.
+    """
+    if not audio_file_path.lower().endswith(".wav"):
+        raise ValueError("Only WAV files are supported without ffmpeg.")
 
-        # Convert stereo -> mono
-        if len(audio.shape) > 1:
-            audio = np.mean(audio, axis=1)
+    import soundfile as sf
+    import librosa
 
-        # Resample to 16kHz
-        if sr != 16000:
-            audio = librosa.resample(audio, orig_sr=sr, target_sr=16000)
+    # Read WAV
+    audio, sr = sf.read(audio_file_path)
+    if len(audio) == 0:
+        return ""
 
-        # Convert to float32 (Whisper expects float32)
-        audio = np.asarray(audio, dtype=np.float32)
+    # Convert stereo -> mono
+    if len(audio.shape) > 1:
+        audio = np.mean(audio, axis=1)
 
-        # Whisper requires 1D array
-        if audio.ndim != 1:
-            audio = audio.flatten()
+    # Resample to 16kHz
+    if sr != 16000:
+        audio = librosa.resample(audio, orig_sr=sr, target_sr=16000)
 
-        print(f"DEBUG: audio dtype={audio.dtype}, shape={audio.shape}")
+    # Convert to float32 (Whisper expects float32)
+    audio = np.asarray(audio, dtype=np.float32)
 
-        # Transcribe using numpy array (force dtype float32)
-        result = whisper_model.transcribe(audio)
-        return result.get("text", "")
+    # Whisper requires 1D array
+    if audio.ndim != 1:
+        audio = audio.flatten()
 
-    except Exception as e:
-        print(f"ERROR during Whisper transcription: {e}")
-        return ""
+    print(f"DEBUG: audio dtype={audio.dtype}, shape={audio.shape}")
+
+    # Transcribe using numpy array (force dtype float32)
+    result = get_whisper_model().transcribe(audio)
+    return result.get("text", "").strip()
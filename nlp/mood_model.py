@@ -0,0 +1,210 @@
+"""
+Mood classifier trained on Datasets/Emotion and served from a memory-mapped artifact.
+
+Training uses the same TF-IDF + LogisticRegression setup as
+Datasets/Emotion/accuracy.py. The exported artifact is a directory of .npy
+files that are opened with numpy's mmap_mode, so every gunicorn worker
+shares the same page-cache copy instead of holding its own. Serving only
+needs numpy; scikit-learn is only required to train.
+
+Train and export (from the project root):
+    python -m nlp.mood_model train [--output DIR]
+"""
+import os
+import re
+import json
+import hashlib
+import argparse
+import threading
+import numpy as np
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MOOD_MODEL_DIR = os.getenv("MOOD_MODEL_DIR", os.path.join(PROJECT_ROOT, "artifacts", "mood_model"))
+TRAIN_PATH = os.path.join(PROJECT_ROOT, "Datasets", "Emotion", "train_converted.csv")
+TEST_PATH = os.path.join(PROJECT_ROOT, "Datasets", "Emotion", "test_converted.csv")
+
+# scikit-learn's default token_pattern; stop words are simply absent from the vocabulary
+TOKEN_RE = re.compile(r"(?u)\b\w\w+\b")
+ARTIFACT_VERSION = 1
+
+
+class MoodModel:
+    """
+    A loaded classifier artifact.
+
+    vocabulary: sorted fixed-width UTF-8 byte strings, looked up with searchsorted
+    idf:        float32 (n_features,)
+    coef:       float32 (n_features, n_classes), row-major so a term's weights are contiguous
+    intercept:  float32 (n_classes,)
+    """
+
+    def __init__(self, path, mmap_mode="r"):
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta.get("version") != ARTIFACT_VERSION:
+            raise ValueError(f"Unsupported mood model artifact version: {self.meta.get('version')}")
+
+        self.classes = list(self.meta["classes"])
+        self.sublinear_tf = self.meta["sublinear_tf"]
+        self.vocabulary = np.load(os.path.join(path, "vocabulary.npy"), mmap_mode=mmap_mode)
+        self.idf = np.load(os.path.join(path, "idf.npy"), mmap_mode=mmap_mode)
+        self.coef = np.load(os.path.join(path, "coef.npy"), mmap_mode=mmap_mode)
+        self.intercept = np.load(os.path.join(path, "intercept.npy"), mmap_mode=mmap_mode)
+        self._width = self.vocabulary.dtype.itemsize
+
+    def _lookup(self, tokens):
+        """Maps byte-string tokens to feature indices; returns (positions_in_tokens, feature_ids)."""
+        if not tokens:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+        # Longer tokens cannot be in the vocabulary and would be truncated by the cast below
+        keep = np.fromiter((len(t) <= self._width for t in tokens), dtype=bool, count=len(tokens))
+        candidates = np.array(tokens, dtype=self.vocabulary.dtype)
+        idx = np.searchsorted(self.vocabulary, candidates)
+        idx[idx >= len(self.vocabulary)] = 0
+        hit = keep & (self.vocabulary[idx] == candidates)
+        return np.flatnonzero(hit), idx[hit]
+
+    def decision_function(self, token_lists):
+        """Class scores for documents given as lists of lowercase tokens."""
+        n_docs = len(token_lists)
+        flat = [tok.encode("utf-8") for tokens in token_lists for tok in tokens]
+        doc_of_token = np.repeat(np.arange(n_docs), [len(tokens) for tokens in token_lists])
+        positions, features = self._lookup(flat)
+        docs = doc_of_token[positions]
+
+        scores = np.tile(np.asarray(self.intercept, dtype=np.float64), (n_docs, 1))
+        if len(features) == 0:
+            return scores
+
+        # Term counts per (doc, feature), then TF-IDF with L2 normalisation as TfidfVectorizer does
+        n_features = len(self.vocabulary)
+        pairs, counts = np.unique(docs * n_features + features, return_counts=True)
+        docs, features = pairs // n_features, pairs % n_features
+        tf = 1.0 + np.log(counts) if self.sublinear_tf else counts.astype(np.float64)
+        weights = tf * self.idf[features]
+        norms = np.sqrt(np.bincount(docs, weights=weights ** 2, minlength=n_docs))
+        weights /= norms[docs]
+
+        np.add.at(scores, docs, self.coef[features] * weights[:, None])
+        return scores
+
+    def predict_tokens(self, token_lists):
+        best = np.argmax(self.decision_function(token_lists), axis=1)
+        return [self.classes[i] for i in best]
+
+    def predict(self, texts):
+        return self.predict_tokens([tokenize(text) for text in texts])
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+
+_model = None
+_model_lock = threading.Lock()
+
+def get_model():
+    """Returns the process-wide model, memory-mapping the artifact on first use."""
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                if not os.path.exists(os.path.join(MOOD_MODEL_DIR, "meta.json")):
+                    raise FileNotFoundError(
+                        f"No mood model artifact in {MOOD_MODEL_DIR}. Run: python -m nlp.mood_model train"
+                    )
+                _model = MoodModel(MOOD_MODEL_DIR)
+    return _model
+
+
+def predict_mood(texts):
+    """Predicts 'positive' / 'neutral' / 'negative' for a batch of texts."""
+    return get_model().predict(list(texts))
+
+
+# --- Training / export ---
+
+def _read_dataset(path):
+    import csv
+    with open(path, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    return [r["text"] for r in rows], [r["mood"] for r in rows]
+
+
+def export_model(vectorizer, classifier, output_dir, extra_meta=None):
+    """Writes a fitted TfidfVectorizer + LogisticRegression pair as a mmap-able artifact."""
+    os.makedirs(output_dir, exist_ok=True)
+
+    terms = sorted((term.encode("utf-8"), index) for term, index in vectorizer.vocabulary_.items())
+    order = np.array([index for _, index in terms])
+    vocabulary = np.array([term for term, _ in terms])
+
+    coef = classifier.coef_
+    intercept = classifier.intercept_
+    if coef.shape[0] == 1:
+        # Binary LogisticRegression stores a single row for the positive class
+        coef = np.vstack([-coef, coef])
+        intercept = np.concatenate([-intercept, intercept])
+
+    np.save(os.path.join(output_dir, "vocabulary.npy"), vocabulary)
+    np.save(os.path.join(output_dir, "idf.npy"), vectorizer.idf_[order].astype(np.float32))
+    np.save(os.path.join(output_dir, "coef.npy"), np.ascontiguousarray(coef.T[order], dtype=np.float32))
+    np.save(os.path.join(output_dir, "intercept.npy"), intercept.astype(np.float32))
+
+    fingerprint = hashlib.sha256()
+    for name in ("vocabulary", "idf", "coef", "intercept"):
+        with open(os.path.join(output_dir, f"{name}.npy"), "rb") as f:
+            fingerprint.update(f.read())
+
+    meta = {
+        "version": ARTIFACT_VERSION,
+        # Identifies this exact model; part of the NLP cache key for the classifier backend
+        "fingerprint": fingerprint.hexdigest()[:16],
+        "classes": [str(c) for c in classifier.classes_],
+        "sublinear_tf": bool(vectorizer.sublinear_tf),
+        "n_features": int(len(vocabulary)),
+    }
+    meta.update(extra_meta or {})
+    with open(os.path.join(output_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+
+
+def train(output_dir=MOOD_MODEL_DIR, max_features=5000, C=1.0):
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.linear_model import LogisticRegression
+
+    train_texts, train_labels = _read_dataset(TRAIN_PATH)
+    test_texts, test_labels = _read_dataset(TEST_PATH)
+
+    vectorizer = TfidfVectorizer(stop_words="english", max_features=max_features, dtype=np.float32)
+    classifier = LogisticRegression(max_iter=1000, C=C)
+    classifier.fit(vectorizer.fit_transform(train_texts), train_labels)
+
+    sklearn_pred = classifier.predict(vectorizer.transform(test_texts))
+    accuracy = float(np.mean(sklearn_pred == np.array(test_labels)))
+    export_model(vectorizer, classifier, output_dir, {"test_accuracy": round(accuracy, 4)})
+
+    # Reload the artifact exactly as the server will and check it agrees with scikit-learn
+    served = MoodModel(output_dir).predict(test_texts)
+    agreement = float(np.mean(np.array(served) == sklearn_pred))
+
+    print(f"Exported mood model to {output_dir}")
+    print(f"  Test accuracy: {accuracy:.4f} ({len(test_texts)} entries)")
+    print(f"  Artifact agrees with scikit-learn on {agreement:.2%} of test entries")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train and export the mood classifier.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    train_cmd = sub.add_parser("train", help="Train on Datasets/Emotion and export the artifact")
+    train_cmd.add_argument("--output", default=MOOD_MODEL_DIR)
+    train_cmd.add_argument("--max-features", type=int, default=5000)
+    train_cmd.add_argument("--C", type=float, default=1.0)
+    args = parser.parse_args()
+
+    if args.command == "train":
+        train(args.output, max_features=args.max_features, C=args.C)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import re
+import time
+import threading
+from nlp.cache import nlp_cache, content_key
+from nlp.analysis import analyze_tokens, analyzer_version, MOOD_ANALYZER
+from nlp.scorer import score_tokens, SCORER_VERSION
+from nlp.task_extractor import iter_tasks, EXTRACTOR_VERSION
+
+WORD_RE = re.compile(r'\w+')
+
+
+class Document:
+    """A journal text normalised and tokenized once, shared by every pipeline stage."""
+    __slots__ = ('text', 'lower', 'tokens')
+
+    def __init__(self, text):
+        self.text = text
+        self.lower = text.lower()
+        self.tokens = WORD_RE.findall(self.lower)
+
+
+# --- Stages ---
+# A stage has a `name` (the key of its output in the result), a `version`
+# (part of the cache key) and a `run(doc)` method.
+
+class MoodStage:
+    name = 'mood'
+
+    def __init__(self, backend=None):
+        self.backend = backend or MOOD_ANALYZER
+
+    @property
+    def version(self):
+        # Read per use: for the classifier it includes the fingerprint of the loaded model
+        return f"{self.backend}:{analyzer_version(self.backend)}"
+
+    def run(self, doc):
+        # The pipeline caches its whole result, so the per-text analysis cache is skipped
+        return analyze_tokens(doc.text, doc.tokens, backend=self.backend)['mood']
+
+
+class ProductivityStage:
+    name = 'productivity'
+    version = SCORER_VERSION
+
+    def run(self, doc):
+        return score_tokens(doc.tokens)
+
+
+class TaskStage:
+    name = 'tasks'
+    version = EXTRACTOR_VERSION
+
+    def run(self, doc):
+        return [task.text for task in iter_tasks(doc.text)]
+
+
+class PipelineResult(dict):
+    """Stage outputs keyed by stage name; `timings` holds per-stage milliseconds for this run."""
+
+    def __init__(self, outputs, timings=None, cached=False):
+        super().__init__(outputs)
+        self.timings = timings or {}
+        self.cached = cached
+
+
+class TextPipeline:
+    """
+    Runs a journal text through pluggable stages, tokenizing it only once.
+
+    Whole results are cached in nlp_cache under the combined stage versions,
+    so a retried submit or a re-run transcript costs a single lookup.
+    """
+
+    def __init__(self, stages=None):
+        self.stages = list(stages) if stages is not None else [MoodStage(), ProductivityStage(), TaskStage()]
+        self._lock = threading.Lock()
+        self._totals = {}
+
+    def add_stage(self, stage):
+        self.stages.append(stage)
+        return self
+
+    @property
+    def version(self):
+        return "|".join(f"{stage.name}:{stage.version}" for stage in self.stages)
+
+    def _key(self, text):
+        return content_key("pipeline", self.version, text)
+
+    def cached_result(self, text):
+        """Returns the cached result for the text, or None."""
+        key = self._key(text)
+        found = nlp_cache.get_many([key])
+        return PipelineResult(found[key], cached=True) if key in found else None
+
+    def remember(self, text, outputs):
+        """Caches outputs computed elsewhere (e.g. in a worker process) for the text."""
+        nlp_cache.set_many([(self._key(text), dict(outputs))], "pipeline")
+
+    def run(self, text):
+        result = self.cached_result(text)
+        if result is not None:
+            return result
+
+        doc = Document(text)
+        outputs, timings = {}, {}
+        for stage in self.stages:
+            start = time.perf_counter()
+            outputs[stage.name] = stage.run(doc)
+            timings[stage.name] = (time.perf_counter() - start) * 1000
+        self.record_timings(timings)
+
+        self.remember(text, outputs)
+        return PipelineResult(outputs, timings)
+
+    def record_timings(self, timings):
+        """Adds one run's per-stage timings to the cumulative totals."""
+        with self._lock:
+            for name, ms in timings.items():
+                count, total = self._totals.get(name, (0, 0.0))
+                self._totals[name] = (count + 1, total + ms)
+
+    def timings(self):
+        """Cumulative per-stage timings (calls, total and mean milliseconds) for this process."""
+        with self._lock:
+            return {
+                name: {"calls": count, "total_ms": round(total, 3), "mean_ms": round(total / count, 3)}
+                for name, (count, total) in self._totals.items()
+            }
+
+
+text_pipeline = TextPipeline()
@@ -1,30 +1,65 @@
+import os
 import re
+from nlp.cache import cached
 
-def custom_productivity_score(text):
+# Part of the NLP cache key: bump it when scores for the same text can change
+SCORER_VERSION = 2
+
+KEYWORDS_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Datasets", "productivity", "productivity.csv"
+)
+WORD_RE = re.compile(r'\w+')
+
+
+def load_keywords(path=KEYWORDS_PATH):
     """
-    Calculates a productivity score based on the density of "action" keywords
-    and the length of the journal entry.
+    Reads the productivity keyword list. Keywords are comma separated and may be
+    quoted and wrapped in [...], so the file can be edited as a plain list.
+    """
+    with open(path, encoding="utf-8") as f:
+        raw = f.read()
+    keywords = set()
+    for item in re.split(r'[,\n]', raw.strip().strip('[]')):
+        word = item.strip().strip('\'"').strip().lower()
+        if word:
+            keywords.add(word)
+    return frozenset(keywords)
+
+
+# Loaded once; membership tests against a frozenset keep scoring a single pass
+# over the tokens however many keywords the list grows to.
+PRODUCTIVITY_KEYWORDS = load_keywords()
+
+
+def score_tokens(words, keywords=PRODUCTIVITY_KEYWORDS):
+    """
+    Calculates the productivity score from an already lowercased token list.
     """
-    text = text.lower()
-    productivity_keywords = [
-        'complete', 'completed', 'finished', 'done', 'achieved', 'accomplished', 'organized',
-        'planned', 'worked', 'progress', 'improve', 'improved', 'fixed', 'solved', 'resolved',
-        'created', 'built', 'started', 'developed', 'designed', 'reviewed', 'prepared', 'submitted'
-    ]
-    
-    # Count how many productivity keywords are in the text
-    keyword_count = sum(text.count(word) for word in productivity_keywords)
-    
-    words = re.findall(r'\w+', text)
     word_count = len(words)
-    
     if word_count == 0:
         return 0.0
-        
+
+    # Count how many tokens are productivity keywords (exact, whole-word matches)
+    keyword_count = sum(1 for word in words if word in keywords)
+
     # Calculate keyword density and add a bonus for longer entries
     keyword_density = keyword_count / word_count
     length_bonus = min(word_count / 100, 0.3) # Bonus caps out at 0.3
-    
+
     # The final score is the sum, capped at a max of 1.0
     score = min(keyword_density + length_bonus, 1.0)
     return round(score, 3)
+
+
+@cached("productivity", SCORER_VERSION)
+def custom_productivity_score(text):
+    """
+    Calculates a productivity score based on the density of "action" keywords
+    and the length of the journal entry.
+    """
+    return score_tokens(WORD_RE.findall(text.lower()))
+
+
+def custom_productivity_scores(texts):
+    """Scores a batch of texts; returns one score per text, in the same order."""
+    return [custom_productivity_score(text) for text in texts]
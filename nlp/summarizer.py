@@ -1,28 +1,71 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Union
 import statistics
 import random
 
 
-def generate_rule_based_summary(entries: List[Dict[str, Any]]) -> Dict[str, Any]:
+def summary_stats(entries: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Computes the stats document from entry dictionaries in Python. The storage
+    backends compute the same document server-side (get_summary_stats); this is
+    for callers that already hold a list of entries.
+    """
+    mood_counts = {"positive": 0, "neutral": 0, "negative": 0}
+    productivity_scores = []
+    total_tasks = 0
+    completed_tasks = 0
+
+    for entry in entries:
+        mood = entry.get('mood', 'neutral').lower()
+        productivity = float(entry.get('productivity', 0))
+
+        # Count mood
+        if mood in mood_counts:
+            mood_counts[mood] += 1
+        else:
+            mood_counts["neutral"] += 1  # default to neutral if invalid mood given
+
+        productivity_scores.append(productivity)
+
+        # Count tasks
+        tasks = entry.get('tasks', [])
+        total_tasks += len(tasks)
+        completed_tasks += sum(1 for t in tasks if t.get('completed', False))
+
+    return {
+        "entries": len(entries),
+        "moods": mood_counts,
+        "productivity_mean": statistics.mean(productivity_scores) if productivity_scores else 0,
+        "productivity_pstdev": statistics.pstdev(productivity_scores) if len(productivity_scores) > 1 else 0,
+        "tasks_total": total_tasks,
+        "tasks_completed": completed_tasks,
+    }
+
+
+def generate_rule_based_summary(stats: Union[Dict[str, Any], List[Dict[str, Any]]]) -> Dict[str, Any]:
     """
     Generates an advanced, rule-based summary with deeper insights and
     personalized recommendations like movies, shows, books, and activities.
 
     Args:
-        entries (List[Dict[str, Any]]): List of journal entry dictionaries.
-            Each entry contains:
-              - 'mood': str -> 'positive', 'neutral', or 'negative'
-              - 'productivity': float between 0 and 1
-              - 'tasks': list of dicts with {'task': str, 'completed': bool}
+        stats: The stats document from get_summary_stats (see
+            database/summary_stats.py):
+              - 'entries': int
+              - 'moods': {'positive': int, 'neutral': int, 'negative': int}
+              - 'productivity_mean', 'productivity_pstdev': float
+              - 'tasks_total', 'tasks_completed': int
+            A list of journal entry dictionaries is also accepted and
+            reduced with summary_stats().
 
     Returns:
         Dict[str, Any]: Structured summary with feedback, stats, and recommendations.
     """
+    if isinstance(stats, list):
+        stats = summary_stats(stats)
 
     # =========================
     # STEP 1. Handle empty input
     # =========================
-    if not entries:
+    if not stats.get("entries"):
         return {
             "positive_aspects": [],
             "negative_aspects": [],
@@ -41,37 +84,16 @@ def generate_rule_based_summary(entries: List[Dict[str, Any]]) -> Dict[str, Any]
     # =========================
     # STEP 2. Collect data
     # =========================
-    mood_counts = {"positive": 0, "neutral": 0, "negative": 0}
-    productivity_scores = []
-    total_tasks = 0
-    completed_tasks = 0
-
-    for entry in entries:
-        mood = entry.get('mood', 'neutral').lower()
-        productivity = float(entry.get('productivity', 0))
-
-        # Count mood
-        if mood in mood_counts:
-            mood_counts[mood] += 1
-        else:
-            mood_counts["neutral"] += 1  # default to neutral if invalid mood given
-
-        productivity_scores.append(productivity)
-
-        # Count tasks
-        tasks = entry.get('tasks', [])
-        total_tasks += len(tasks)
-        completed_tasks += sum(1 for t in tasks if t.get('completed', False))
-
-    num_entries = len(entries)
+    mood_counts = {"positive": 0, "neutral": 0, "negative": 0, **stats["moods"]}
+    total_tasks = stats["tasks_total"]
+    completed_tasks = stats["tasks_completed"]
+    num_entries = stats["entries"]
 
     # =========================
     # STEP 3. Calculate stats
     # =========================
-    avg_productivity = statistics.mean(productivity_scores) if productivity_scores else 0
-    productivity_std_dev = (
-        statistics.pstdev(productivity_scores) if len(productivity_scores) > 1 else 0
-    )
+    avg_productivity = stats["productivity_mean"]
+    productivity_std_dev = stats["productivity_pstdev"]
 
     # Mood trend
     if mood_counts["positive"] > mood_counts["negative"]:
@@ -1,22 +1,72 @@
 import re
+from collections import namedtuple
+from nlp.cache import cached
 
+# Part of the NLP cache key: bump it when extraction for the same text can change
+EXTRACTOR_VERSION = 3
+
+# Matches phrases like "need to do X", "must finish Y"
+_GOAL = r"(?P<goal>need to|have to|must|should|want to|planning to|plan to|aim to|try to)\s+"
+# Matches phrases like "todo: Z" or "to-do: A"
+_TODO = r"(?P<todo>to[- ]do|todo)[^\w]*"
+_TASK = r"(?P<task>.*?)(?:[.!\n]|$)"
+
+# Both task phrasings merged into one alternation and compiled once, so a text is
+# scanned a single time and overlapping phrasings cannot yield the same task twice.
+TASK_RE = re.compile(rf"\b(?:{_GOAL}|{_TODO}){_TASK}", re.IGNORECASE)
+# A phrase of the other kind inside a match ("need to finish my todo: buy milk",
+# "have to do the dishes") is found by rescanning just that match with the other
+# kind's pattern, so the results are those of the old extractor, which ran each
+# phrasing over the whole text separately.
+_OTHER_RE = {
+    "goal": re.compile(rf"\b{_TODO}{_TASK}", re.IGNORECASE),
+    "todo": re.compile(rf"\b{_GOAL}{_TASK}", re.IGNORECASE),
+}
+_WHITESPACE_RE = re.compile(r"\s+")
+
+# A task with the [start, end) character span it was found at in the source text
+Task = namedtuple("Task", ["text", "start", "end"])
+
+
+def _matches(text):
+    """TASK_RE matches in text, each followed by the matches of the other phrasing that overlap it."""
+    for match in TASK_RE.finditer(text):
+        yield match
+        kind = "goal" if match.group("goal") is not None else "todo"
+        yield from _OTHER_RE[kind].finditer(text, match.start() + 1, match.end())
+
+
+def iter_tasks(text):
+    """
+    Lazily yields Task tuples in the order they appear in the text (a nested
+    task right after the task containing it), skipping duplicates (compared
+    case-insensitively after whitespace normalisation).
+    """
+    seen = set()
+    for match in _matches(text):
+        raw = match.group("task")
+        # Clean up the extracted task text
+        stripped = raw.rstrip().rstrip('.!').rstrip()
+        lead = len(raw) - len(raw.lstrip())
+        task = _WHITESPACE_RE.sub(" ", stripped.strip())
+        if not task:
+            continue
+        key = task.casefold()
+        if key in seen:
+            continue
+        seen.add(key)
+        start = match.start("task") + lead
+        yield Task(task, start, match.start("task") + len(stripped))
+
+
+def extract_task_spans(text):
+    """Returns the tasks in the text together with their character spans."""
+    return list(iter_tasks(text))
+
+
+@cached("tasks", EXTRACTOR_VERSION)
 def extract_tasks(text):
     """
     Extracts potential tasks from text using a list of common patterns.
     """
-    # Patterns to identify phrases that likely indicate a task
-    task_patterns = [
-        # Matches phrases like "need to do X", "must finish Y"
-        r"\b(?:need to|have to|must|should|want to|planning to|plan to|aim to|try to)\s+(.*?)(?:[.!\n]|$)",
-        # Matches phrases like "todo: Z" or "to-do: A"
-        r"\b(?:to[- ]do|todo)[^\w]*(.*?)(?:[.!\n]|$)"
-    ]
-    tasks = []
-    for pattern in task_patterns:
-        matches = re.findall(pattern, text, re.IGNORECASE)
-        for match in matches:
-            # Clean up the extracted task text
-            task = match.strip().rstrip('.!')
-            if task:
-                tasks.append(task)
-    return tasks
+    return [task.text for task in iter_tasks(text)]
@@ -0,0 +1,98 @@
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturesTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+WHISPER_WORKERS = int(os.getenv("WHISPER_WORKERS", 1))
+# Seconds a transcription may take once submitted
+WHISPER_TIMEOUT = float(os.getenv("WHISPER_TIMEOUT", 600))
+WHISPER_INLINE = os.getenv("WHISPER_INLINE", "False").lower() in ["true", "1", "t"]
+
+
+class TranscriptionTimeoutError(TimeoutError):
+    """Raised when a transcription does not finish within its timeout."""
+
+
+def _load_model():
+    """Runs once in each transcription worker: loads torch and the Whisper weights before the first job."""
+    from nlp.media_analyzer import get_whisper_model
+    get_whisper_model()
+
+
+def _transcribe_in_worker(audio_file_path):
+    from nlp.media_analyzer import transcribe_audio_local
+    return transcribe_audio_local(audio_file_path)
+
+
+class Transcriber:
+    """
+    Runs Whisper in a small pool of long-lived worker processes (one by default).
+
+    The web workers never import whisper or torch: the pool is started on the
+    first transcription in each process that needs one, its workers load the
+    model once, and audio file paths are sent to them over the pool's queue.
+    A worker that dies (e.g. OOM) is replaced on the next call.
+    """
+
+    def __init__(self, max_workers=WHISPER_WORKERS, inline=WHISPER_INLINE):
+        self.max_workers = max_workers
+        self.inline = inline
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pool_pid = None
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None or self._pool_pid != os.getpid():
+                # "spawn" keeps the worker free of the parent's threads, sockets and imported modules
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_load_model,
+                )
+                self._pool_pid = os.getpid()
+            return self._pool
+
+    def _reset_pool(self, pool):
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def transcribe(self, audio_file_path, timeout=WHISPER_TIMEOUT, inline=None):
+        """
+        Returns the text of a WAV file ("" if it contains no speech).
+
+        Errors from reading the audio or running Whisper are raised here.
+        Raises TranscriptionTimeoutError if it takes longer than `timeout`.
+        With `inline` (or WHISPER_INLINE) Whisper runs in the calling process,
+        which is what the debug server wants.
+        """
+        if self.inline if inline is None else inline:
+            return _transcribe_in_worker(audio_file_path)
+
+        pool = self._get_pool()
+        try:
+            return pool.submit(_transcribe_in_worker, audio_file_path).result(timeout=timeout)
+        except FuturesTimeoutError:
+            raise TranscriptionTimeoutError(f"Transcription did not finish within {timeout} seconds.")
+        except BrokenProcessPool:
+            self._reset_pool(pool)
+            raise
+
+    def stats(self):
+        return {
+            "workers": self.max_workers,
+            "started": self._pool is not None and self._pool_pid == os.getpid(),
+            "inline": self.inline,
+        }
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait)
+
+
+transcriber = Transcriber()
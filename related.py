@@ -0,0 +1,141 @@
+"""
+"Related entries" for /day_view/<date>: the user's past entries most similar to the day's.
+
+Each entry is turned into a hashed bag-of-words vector once, when it is written
+or when the user's store is first loaded: stop words dropped, log-scaled term
+counts hashed into RELATED_DIM signed buckets, L2-normalized, float32. A user's
+vectors sit in one dense (entries x RELATED_DIM) array, so the cosine similarity
+of the day to every other entry is a single matrix-vector product. Deleting an
+entry moves the last row into its slot, keeping the array compact without a
+rebuild. Stores are cached per process like the search and insights indexes
+(database/entry_indexes.py).
+"""
+import os
+import math
+import threading
+import zlib
+from collections import Counter
+import numpy as np
+import database.db as database
+from database.entry_indexes import EntryIndexCache
+from search import tokenize
+
+RELATED_DIM = int(os.getenv("RELATED_DIM", 256))
+RELATED_COUNT = 5
+# Below this cosine similarity an entry is not shown as related
+RELATED_MIN_SCORE = 0.15
+SNIPPET_LENGTH = 160
+
+
+def _bucket(token):
+    # crc32 is stable across processes, unlike hash()
+    h = zlib.crc32(token.encode("utf-8"))
+    return h % RELATED_DIM, (1.0 if h & 0x80000000 else -1.0)
+
+
+def entry_vector(text, dim=RELATED_DIM):
+    """Normalized hashed vector of an entry's text (all zeros if it has no words)."""
+    vector = np.zeros(dim, dtype=np.float32)
+    for token, count in Counter(tokenize(text)).items():
+        bucket, sign = _bucket(token)
+        vector[bucket] += sign * (1.0 + math.log(count))
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class VectorStore:
+    """One user's entry vectors in a float32 array grown by doubling, rows kept contiguous."""
+
+    def __init__(self, dim=RELATED_DIM):
+        self.dim = dim
+        self.vectors = np.zeros((16, dim), dtype=np.float32)
+        self.ids = []   # row -> entry id
+        self.dates = []  # row -> entry date
+        self.rows = {}  # entry id -> row
+        self.lock = threading.Lock()
+        self.synced_at = 0.0
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, entries):
+        for entry in entries:
+            entry_id = str(entry["_id"])
+            if entry_id in self.rows:
+                continue
+            row = len(self.ids)
+            if row == len(self.vectors):
+                grown = np.zeros((2 * row, self.dim), dtype=np.float32)
+                grown[:row] = self.vectors
+                self.vectors = grown
+            self.vectors[row] = entry_vector(entry.get("text"), self.dim)
+            self.ids.append(entry_id)
+            self.dates.append(entry.get("date"))
+            self.rows[entry_id] = row
+
+    def remove(self, entry_ids):
+        for entry_id in entry_ids:
+            row = self.rows.pop(str(entry_id), None)
+            if row is None:
+                continue
+            last = len(self.ids) - 1
+            if row != last:
+                # Move the last entry into the freed row
+                self.vectors[row] = self.vectors[last]
+                self.ids[row], self.dates[row] = self.ids[last], self.dates[last]
+                self.rows[self.ids[row]] = row
+            self.ids.pop()
+            self.dates.pop()
+
+    def nearest(self, entry_ids, k=RELATED_COUNT, min_score=RELATED_MIN_SCORE):
+        """[(score, entry_id)] of the k entries closest to the mean of entry_ids, from other dates."""
+        rows = [self.rows[str(entry_id)] for entry_id in entry_ids if str(entry_id) in self.rows]
+        if not rows:
+            return []
+        query = self.vectors[rows].sum(axis=0)
+        norm = np.linalg.norm(query)
+        if not norm:
+            return []
+        scores = self.vectors[:len(self.ids)] @ (query / norm)
+        own_dates = {self.dates[row] for row in rows}
+        for row in np.flatnonzero(scores >= min_score):
+            if self.dates[row] in own_dates:
+                scores[row] = -1.0
+        candidates = np.flatnonzero(scores >= min_score)
+        if candidates.size > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k)[:k]]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [(float(scores[row]), self.ids[row]) for row in candidates]
+
+
+related_stores = EntryIndexCache(
+    VectorStore,
+    maxsize=int(os.getenv("RELATED_INDEX_SIZE", 128)),
+    sync_interval=float(os.getenv("RELATED_SYNC_INTERVAL", 30)),
+)
+
+
+def related_entries(user_id, entry_ids, k=RELATED_COUNT):
+    """The user's entries from other days most similar to entry_ids: [{_id, date, mood, snippet, score}]."""
+    if not entry_ids:
+        return []
+    store = related_stores.get(user_id)
+    with store.lock:
+        nearest = store.nearest(entry_ids, k)
+    if not nearest:
+        return []
+    entries = {str(entry["_id"]): entry for entry in database.get_entries_by_ids(user_id, [entry_id for _, entry_id in nearest])}
+    results = []
+    for score, entry_id in nearest:
+        entry = entries.get(entry_id)
+        if entry is None:
+            continue
+        text = entry.get("text") or ""
+        results.append({
+            "_id": entry_id,
+            "date": entry.get("date"),
+            "mood": entry.get("mood"),
+            "snippet": text if len(text) <= SNIPPET_LENGTH else text[:SNIPPET_LENGTH].rsplit(" ", 1)[0] + "…",
+            "score": round(score, 2),
+        })
+    return results
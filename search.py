@@ -0,0 +1,240 @@
+"""
+Full-text search over a user's journal entries for /api/search.
+
+Each user has an in-process inverted index (term -> entry rows and term
+counts) with numpy arrays of entry lengths, dates and a deleted-row mask.
+It is built once from the user's entries and kept current by the write
+events, like the insights index (database/entry_indexes.py). A query scores
+only the postings of its own terms with BM25, filters by date range and
+pages with a (score, entry id) keyset cursor; just the page's entries are
+then read back for their text and highlight spans.
+"""
+import os
+import re
+import math
+import threading
+from collections import Counter
+from datetime import datetime
+import numpy as np
+import database.db as database
+from database.entry_indexes import EntryIndexCache, date_ordinal
+from database.prompt_stats import STOP_WORD_SET
+
+TOKEN_RE = re.compile(r"\w+")
+# Standard BM25 parameters
+K1 = 1.2
+B = 0.75
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 50
+# Scores are compared as integers in millionths so cursors round-trip exactly
+SCORE_SCALE = 1_000_000
+
+
+def tokenize(text):
+    return [token for token in TOKEN_RE.findall((text or "").lower()) if token not in STOP_WORD_SET]
+
+
+def query_terms(query):
+    return list(dict.fromkeys(tokenize(query)))
+
+
+def highlight_spans(text, terms):
+    """[start, end) character offsets in text of every token matching one of terms."""
+    terms = set(terms)
+    return [[match.start(), match.end()] for match in TOKEN_RE.finditer(text or "")
+            if match.group().lower() in terms]
+
+
+def encode_cursor(score, entry_id):
+    return f"{score}_{entry_id}"
+
+
+def parse_cursor(cursor):
+    """(score, entry_id) from a cursor made by encode_cursor. Raises ValueError if malformed."""
+    score, sep, entry_id = (cursor or "").partition("_")
+    if not sep or not entry_id:
+        raise ValueError(f"Invalid search cursor: {cursor!r}")
+    return int(score), entry_id
+
+
+def parse_date(value):
+    """'YYYY-MM-DD' as a day number, None if empty. Raises ValueError if malformed."""
+    if not value:
+        return None
+    return datetime.strptime(value, '%Y-%m-%d').toordinal()
+
+
+class SearchIndex:
+    """One user's inverted index. Row attributes live in numpy arrays grown by doubling."""
+
+    def __init__(self):
+        self.postings = {}  # term -> ([row, ...], [count, ...])
+        self._arrays = {}   # term -> (rows, counts) as numpy arrays, until the term gets a new posting
+        self.ids = []       # row -> entry id
+        self.rows = {}      # entry id -> row (live entries only)
+        self.lengths = np.zeros(64, dtype=np.float32)
+        self.dates = np.zeros(64, dtype=np.int32)
+        self.alive = np.zeros(64, dtype=bool)
+        self.total_length = 0.0
+        self.lock = threading.Lock()
+        self.synced_at = 0.0
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _grow(self, size):
+        if size <= len(self.alive):
+            return
+        capacity = max(size, 2 * len(self.alive))
+        for name in ("lengths", "dates", "alive"):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def add(self, entries):
+        """Indexes entries that are not in the index yet."""
+        for entry in entries:
+            entry_id = str(entry["_id"])
+            if entry_id in self.rows:
+                continue
+            tokens = tokenize(entry.get("text"))
+            row = len(self.ids)
+            self._grow(row + 1)
+            self.ids.append(entry_id)
+            self.rows[entry_id] = row
+            self.lengths[row] = len(tokens)
+            self.dates[row] = date_ordinal(entry.get("date"))
+            self.alive[row] = True
+            self.total_length += len(tokens)
+            for term, count in Counter(tokens).items():
+                rows, tfs = self.postings.setdefault(term, ([], []))
+                rows.append(row)
+                tfs.append(count)
+                self._arrays.pop(term, None)
+
+    def remove(self, entry_ids):
+        for entry_id in entry_ids:
+            row = self.rows.pop(str(entry_id), None)
+            if row is not None:
+                self.alive[row] = False
+                self.total_length -= float(self.lengths[row])
+        # Rebuild without deleted rows once they are a quarter of the index
+        if len(self.ids) > 64 and (len(self.ids) - len(self.rows)) * 4 > len(self.ids):
+            self._compact()
+
+    def _compact(self):
+        keep = np.flatnonzero(self.alive[:len(self.ids)])
+        old_to_new = np.full(len(self.ids), -1, dtype=np.int64)
+        old_to_new[keep] = np.arange(len(keep))
+        for term in list(self.postings):
+            rows, tfs = self._postings(term)
+            live = old_to_new[rows] >= 0
+            if not live.any():
+                del self.postings[term]
+                continue
+            self.postings[term] = (old_to_new[rows[live]].tolist(), tfs[live].tolist())
+        self._arrays = {}
+        self.ids = [self.ids[row] for row in keep]
+        self.rows = {entry_id: row for row, entry_id in enumerate(self.ids)}
+        self.lengths = self.lengths[keep].copy()
+        self.dates = self.dates[keep].copy()
+        self.alive = np.ones(len(keep), dtype=bool)
+        self._grow(64)
+
+    def _postings(self, term):
+        arrays = self._arrays.get(term)
+        if arrays is None:
+            rows, tfs = self.postings[term]
+            arrays = self._arrays[term] = (np.array(rows, dtype=np.int64), np.array(tfs, dtype=np.float32))
+        return arrays
+
+    def search(self, terms, date_from=None, date_to=None, after=None, limit=SEARCH_PAGE_SIZE):
+        """
+        Ranks live entries matching any of terms by BM25, best first, ties newest first.
+        date_from/date_to are inclusive day numbers, after a (score, entry_id) cursor.
+        Returns ([(score, entry_id), ...], more) where more says another page exists.
+        """
+        count = len(self.rows)
+        if not count or not terms:
+            return [], False
+        size = len(self.ids)
+        average_length = max(self.total_length / count, 1.0)
+        scores = np.zeros(size, dtype=np.float64)
+        for term in terms:
+            if term not in self.postings:
+                continue
+            rows, tfs = self._postings(term)
+            live = self.alive[rows]
+            rows, tfs = rows[live], tfs[live]
+            if not rows.size:
+                continue
+            idf = math.log(1 + (count - rows.size + 0.5) / (rows.size + 0.5))
+            norm = K1 * (1 - B + B * self.lengths[rows] / average_length)
+            scores[rows] += idf * tfs * (K1 + 1) / (tfs + norm)
+
+        matched = scores > 0
+        if date_from is not None:
+            matched &= self.dates[:size] >= date_from
+        if date_to is not None:
+            matched &= self.dates[:size] <= date_to
+        candidates = np.flatnonzero(matched)
+        points = np.rint(scores[candidates] * SCORE_SCALE).astype(np.int64)
+
+        if after is not None:
+            after_score, after_id = after
+            before = points < after_score
+            for i in np.flatnonzero(points == after_score):
+                before[i] = self.ids[candidates[i]] < after_id
+            candidates, points = candidates[before], points[before]
+
+        # Narrow to the best limit + 1 scores (keeping ties) before the exact sort
+        if candidates.size > limit + 1:
+            threshold = np.partition(points, -(limit + 1))[-(limit + 1)]
+            keep = points >= threshold
+            candidates, points = candidates[keep], points[keep]
+        ranked = sorted(((int(point), self.ids[row]) for point, row in zip(points, candidates)), reverse=True)
+        return ranked[:limit], len(ranked) > limit
+
+
+search_indexes = EntryIndexCache(
+    SearchIndex,
+    maxsize=int(os.getenv("SEARCH_INDEX_SIZE", 256)),
+    sync_interval=float(os.getenv("SEARCH_SYNC_INTERVAL", 30)),
+)
+
+
+def search_entries(user_id, query, cursor=None, date_from=None, date_to=None, limit=SEARCH_PAGE_SIZE):
+    """
+    One page of the user's entries matching query, best first:
+    {"results": [{_id, date, mood, productivity, score, text, spans}], "next_cursor": str or None}.
+    Raises ValueError for a malformed cursor or date.
+    """
+    after = parse_cursor(cursor) if cursor else None
+    date_from, date_to = parse_date(date_from), parse_date(date_to)
+    limit = max(1, min(int(limit), SEARCH_MAX_PAGE_SIZE))
+    terms = query_terms(query)
+
+    index = search_indexes.get(user_id)
+    with index.lock:
+        ranked, more = index.search(terms, date_from, date_to, after, limit)
+    if not ranked:
+        return {"results": [], "next_cursor": None}
+
+    entries = {str(entry["_id"]): entry for entry in database.get_entries_by_ids(user_id, [entry_id for _, entry_id in ranked])}
+    results = []
+    for score, entry_id in ranked:
+        entry = entries.get(entry_id)
+        if entry is None:  # deleted by another process since the index last synced
+            continue
+        results.append({
+            "_id": entry_id,
+            "date": entry.get("date"),
+            "mood": entry.get("mood"),
+            "productivity": entry.get("productivity"),
+            "score": round(score / SCORE_SCALE, 4),
+            "text": entry.get("text"),
+            "spans": highlight_spans(entry.get("text"), terms),
+        })
+    next_cursor = encode_cursor(*ranked[-1]) if more else None
+    return {"results": results, "next_cursor": next_cursor}
@@ -1,6 +1,2 @@
-
-def productivity_score(text):
-    keywords = ['completed', 'organized', 'productive', 'focus', 'achieved', 'goal']
-    words = text.lower().split()
-    score = sum(word in words for word in keywords)
-    return min(score / 5, 1.0)
+# Kept for backwards compatibility: productivity scoring lives in nlp.scorer
+from nlp.scorer import custom_productivity_score as productivity_score